@@ -0,0 +1,58 @@
+"""Throughput and ratio of the CSV compressions.
+
+The tables of an example dataset are repeated to reach the requested number
+of rows and exported through the DataFrameConnector with each compression.
+
+Usage:
+  compression.py [--example=<name>] [--scale=<n>]
+
+Options:
+  -h --help          Show this screen.
+  --example <name>   The example dataset to use [default: nba].
+  --scale <n>        How many times to repeat the rows of each table [default: 100].
+"""
+import os
+import tempfile
+import time
+
+from docopt import docopt
+from formats import load
+
+from metad.connectors import DataFrameConnector
+from metad.formats import open_text
+
+COMPRESSIONS = [None, "gzip", "zstd", "lz4"]
+
+
+def main():
+    args = docopt(__doc__)
+    connector = DataFrameConnector(load(args["--example"], int(args["--scale"])))
+
+    uncompressed = None
+    for compression in COMPRESSIONS:
+        with tempfile.TemporaryDirectory() as path_to_output:
+            try:
+                start = time.time()
+                connector.export(path_to_output, compression=compression)
+                write_time = time.time() - start
+            except ImportError as error:
+                print("%-5s skipped: %s" % (compression, error))
+                continue
+
+            size = 0
+            start = time.time()
+            for table in connector.metadata.data["tables"]:
+                path = os.path.join(path_to_output, table["path"])
+                size += os.path.getsize(path)
+                with open_text(path, "rt", compression) as fin:
+                    fin.read()
+            read_time = time.time() - start
+
+        uncompressed = uncompressed or size
+        print("%-5s %8.1f MiB  ratio %5.2f  write %6.1f MiB/s  read %6.1f MiB/s" % (
+            compression or "none", size / 2 ** 20, uncompressed / size,
+            uncompressed / 2 ** 20 / write_time, uncompressed / 2 ** 20 / read_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Write and read throughput of the export formats.
+
+The tables of an example dataset are repeated to reach the requested number
+of rows, exported through the DataFrameConnector in each format and read
+back with pandas.
+
+Usage:
+  formats.py [--example=<name>] [--scale=<n>]
+
+Options:
+  -h --help          Show this screen.
+  --example <name>   The example dataset to use [default: nba].
+  --scale <n>        How many times to repeat the rows of each table [default: 100].
+"""
+import os
+import tempfile
+import time
+
+import pandas as pd
+from docopt import docopt
+
+from metad import MetaData
+from metad.connectors import DataFrameConnector
+
+READERS = {
+    "csv": pd.read_csv,
+    "parquet": pd.read_parquet,
+    "feather": pd.read_feather,
+}
+
+
+def load(example, scale):
+    path_to_example = os.path.join(os.path.dirname(__file__), "..", "examples", example)
+    metadata = MetaData.from_json(os.path.join(path_to_example, "metadata.json"))
+    tables = {}
+    for table in metadata.data["tables"]:
+        dataframe = pd.read_csv(os.path.join(path_to_example, "%s.csv" % table["name"]))
+        tables[table["name"]] = pd.concat([dataframe] * scale, ignore_index=True)
+    return tables
+
+
+def main():
+    args = docopt(__doc__)
+    tables = load(args["--example"], int(args["--scale"]))
+    connector = DataFrameConnector(tables)
+    number_of_rows = sum(len(dataframe) for dataframe in tables.values())
+    print("%s rows in %s tables" % (number_of_rows, len(tables)))
+
+    for format, read in READERS.items():
+        with tempfile.TemporaryDirectory() as path_to_output:
+            start = time.time()
+            connector.export(path_to_output, format=format)
+            write_time = time.time() - start
+
+            size = 0
+            start = time.time()
+            for table in connector.metadata.data["tables"]:
+                path = os.path.join(path_to_output, table["path"])
+                size += os.path.getsize(path)
+                read(path)
+            read_time = time.time() - start
+
+        print("%-8s %8.1f MiB  write %8.0f rows/s  read %8.0f rows/s" % (
+            format, size / 2 ** 20, number_of_rows / write_time, number_of_rows / read_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Synthetic relational schemas and data for the benchmarks.
+
+The tables form a random DAG: each table references on average
+`foreign_keys` of the tables generated before it, through one column per
+column of their primary key, so a fraction `composite_keys` of the tables
+and of the foreign keys which reference them are composite. The data is
+referentially consistent: every foreign key value exists in its parent.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# the MySQL stand-in is shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from mysql_standin import StandInConnection  # noqa: E402
+
+# (field metadata, MySQL type) of the regular columns, used in turn
+COLUMN_TYPES = [
+    ({"data_type": "numerical", "data_subtype": "integer"}, "int"),
+    ({"data_type": "numerical", "data_subtype": "float"}, "double"),
+    ({"data_type": "categorical"}, "varchar"),
+    ({"data_type": "datetime"}, "datetime"),
+    ({"data_type": "categorical", "data_subtype": "boolean"}, "bit(1)"),
+    ({"data_type": "text"}, "text"),
+]
+
+CONSTRAINT_TYPES = ["lineage", "derivable", "validity", "hard"]
+
+WORDS = np.array(["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"])
+
+
+def _key(table):
+    key = table["primary_key"]
+    return [key] if isinstance(key, str) else key
+
+
+def generate_metadata(tables=100, fields=10, foreign_keys=1.0, composite_keys=0.1,
+                      constraints=0, seed=0):
+    """Generate the metadata of a synthetic relational schema.
+
+    Args:
+        tables (int): The number of tables.
+        fields (int): The number of regular (non-key) fields of each table.
+        foreign_keys (float): The average number of foreign keys per table.
+        composite_keys (float): The fraction of tables whose primary key has
+            two columns.
+        constraints (int): The number of constraints.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        dict: The metadata, valid according to `MetaData.validate`.
+    """
+    random = np.random.RandomState(seed)
+    data = {"tables": [], "foreign_keys": [], "constraints": []}
+    for i in range(tables):
+        name = "table_%s" % i
+        table = {"id": name, "name": name, "primary_key": "id",
+                 "fields": [{"name": "id", "data_type": "id"}]}
+        if random.rand() < composite_keys:
+            table["primary_key"] = ["id", "part"]
+            table["fields"].append({"name": "part", "data_type": "id"})
+
+        parents = set()
+        if i:
+            number_of_parents = min(random.poisson(foreign_keys), i)
+            parents = random.choice(i, number_of_parents, replace=False)
+        for j in sorted(parents):
+            parent = data["tables"][j]
+            columns = ["%s_%s" % (parent["name"], column) for column in _key(parent)]
+            table["fields"].extend({"name": column, "data_type": "id"} for column in columns)
+            foreign_key = {"table": name, "field": columns,
+                           "ref_table": parent["id"], "ref_field": _key(parent)}
+            if isinstance(parent["primary_key"], str):
+                foreign_key["field"] = columns[0]
+                foreign_key["ref_field"] = parent["primary_key"]
+            data["foreign_keys"].append(foreign_key)
+
+        for j in range(fields):
+            field = {"name": "field_%s" % j}
+            field.update(COLUMN_TYPES[j % len(COLUMN_TYPES)][0])
+            table["fields"].append(field)
+
+        data["tables"].append(table)
+
+    for i in range(constraints):
+        picked = [data["tables"][j] for j in random.choice(tables, 2)]
+        data["constraints"].append({
+            "constraint_type": CONSTRAINT_TYPES[i % len(CONSTRAINT_TYPES)],
+            "fields_under_consideration": [
+                {"table": picked[0]["id"], "field": picked[0]["fields"][-1]["name"]}],
+            "related_fields": [
+                {"table": picked[1]["id"], "field": picked[1]["fields"][-1]["name"]}],
+        })
+
+    return data
+
+
+def _values(field, rows, random):
+    data_type = field.get("data_type")
+    data_subtype = field.get("data_subtype")
+    if data_subtype == "integer":
+        return random.randint(0, 1000, rows)
+    if data_subtype == "float":
+        return random.rand(rows)
+    if data_subtype == "boolean":
+        return random.rand(rows) < 0.5
+    if data_type == "datetime":
+        seconds = random.randint(0, 10 ** 9, rows).astype("int64")
+        return pd.to_datetime(seconds, unit="s")
+    if data_type == "text":
+        return np.char.add(np.char.add(WORDS[random.randint(0, len(WORDS), rows)], " "),
+                           WORDS[random.randint(0, len(WORDS), rows)])
+    return WORDS[random.randint(0, len(WORDS), rows)]
+
+
+def generate_tables(metadata, rows=1000, seed=0):
+    """Generate referentially consistent data for synthetic metadata.
+
+    Args:
+        metadata (dict): Metadata created by `generate_metadata`.
+        rows (int): The number of rows of each table.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        dict: The DataFrame of each table, by name.
+    """
+    random = np.random.RandomState(seed)
+    references = {}
+    for foreign_key in metadata["foreign_keys"]:
+        references.setdefault(foreign_key["table"], []).append(foreign_key)
+
+    tables = {}
+    for table in metadata["tables"]:
+        columns = {}
+        key = _key(table)
+        if len(key) == 1:
+            columns["id"] = np.arange(rows)
+        else:
+            columns["id"] = np.arange(rows) // 2
+            columns["part"] = np.arange(rows) % 2
+
+        for foreign_key in references.get(table["id"], []):
+            parent = tables[foreign_key["ref_table"]]
+            picked = random.randint(0, len(parent), rows)
+            fields = foreign_key["field"]
+            ref_fields = foreign_key["ref_field"]
+            if isinstance(fields, str):
+                fields, ref_fields = [fields], [ref_fields]
+            for field, ref_field in zip(fields, ref_fields):
+                columns[field] = parent[ref_field].values[picked]
+
+        for field in table["fields"]:
+            if field["name"] not in columns:
+                columns[field["name"]] = _values(field, rows, random)
+
+        tables[table["name"]] = pd.DataFrame(
+            columns, columns=[field["name"] for field in table["fields"]])
+
+    return tables
+
+
+def to_standin(metadata, tables, database="benchmark", latency=0):
+    """Serve synthetic metadata and data through a MySQL stand-in connection.
+
+    Args:
+        metadata (dict): Metadata created by `generate_metadata`.
+        tables (dict): The DataFrames created by `generate_tables`.
+        database (str): The name of the database.
+        latency (float): Seconds to sleep on each query.
+
+    Returns:
+        mysql_standin.StandInConnection: The connection.
+    """
+    mysql_types = {("id", None): "int"}
+    for field, mysql_type in COLUMN_TYPES:
+        mysql_types[(field["data_type"], field.get("data_subtype"))] = mysql_type
+
+    standin_tables = {}
+    for table in metadata["tables"]:
+        key = _key(table)
+        columns = []
+        for field in table["fields"]:
+            mysql_type = mysql_types[(field["data_type"], field.get("data_subtype"))]
+            columns.append((field["name"], mysql_type, "PRI" if field["name"] in key else ""))
+        dataframe = tables[table["name"]]
+        standin_tables[table["name"]] = {
+            "columns": columns,
+            "rows": list(dataframe.itertuples(index=False, name=None)),
+        }
+
+    foreign_keys = []
+    for i, foreign_key in enumerate(metadata["foreign_keys"]):
+        fields = foreign_key["field"]
+        ref_fields = foreign_key["ref_field"]
+        if isinstance(fields, str):
+            fields, ref_fields = [fields], [ref_fields]
+        for field, ref_field in zip(fields, ref_fields):
+            foreign_keys.append(("fk_%s" % i, foreign_key["table"], field,
+                                 foreign_key["ref_table"], ref_field))
+
+    return StandInConnection(database, standin_tables, foreign_keys, latency)
@@ -0,0 +1,83 @@
+"""Schema introspection of the MySQLConnector: bulk queries vs one query per table.
+
+Usage:
+  introspection.py [--tables=<n>] [--fields=<n>] [--latency=<ms>]
+
+Options:
+  -h --help         Show this screen.
+  --tables <n>      The number of tables [default: 1000].
+  --fields <n>      The number of fields per table [default: 10].
+  --latency <ms>    The simulated round-trip latency of each query [default: 1].
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+
+from docopt import docopt
+
+from metad.connectors import MySQLConnector
+
+# the MySQL stand-in is shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from mysql_standin import StandInConnection, connect  # noqa: E402
+
+TYPES = ["int", "varchar", "datetime", "double", "text"]
+
+
+class PerTableConnector(MySQLConnector):
+    """The previous introspection path, which queries the columns table by table."""
+
+    def _tables(self, cursor):
+        tables = []
+        for table_name in self._table_names(cursor):
+            cursor.execute("""
+                SELECT *
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE
+                    table_name = '%s' AND
+                    table_schema = '%s'
+                ORDER BY ORDINAL_POSITION""" % (table_name, self.database))
+            table_metadata = self._table_metadata(table_name, cursor.fetchall())
+            table_metadata["id"] = table_name
+            tables.append(table_metadata)
+        return tables
+
+
+def generate(number_of_tables, number_of_fields):
+    tables = defaultdict(dict)
+    foreign_keys = []
+    for i in range(number_of_tables):
+        columns = [("id", "int", "PRI")]
+        for j in range(1, number_of_fields):
+            columns.append(("field_%s" % j, TYPES[j % len(TYPES)], ""))
+        if i:
+            columns.append(("parent_id", "int", "MUL"))
+            foreign_keys.append(
+                ("fk_%s" % i, "table_%s" % i, "parent_id", "table_%s" % (i // 2), "id"))
+        tables["table_%s" % i] = {"columns": columns, "rows": []}
+    return tables, foreign_keys
+
+
+def measure(connector_class, tables, foreign_keys, latency):
+    connection = StandInConnection("benchmark", tables, foreign_keys, latency)
+    start = time.time()
+    connector = connect(connection, connector_class)
+    return connector.metadata, connection.queries, time.time() - start
+
+
+def main():
+    args = docopt(__doc__)
+    tables, foreign_keys = generate(int(args["--tables"]), int(args["--fields"]))
+    latency = float(args["--latency"]) / 1000
+
+    expected, queries, seconds = measure(PerTableConnector, tables, foreign_keys, latency)
+    print("per table: %6s queries %8.3f s" % (queries, seconds))
+    metadata, queries, seconds = measure(MySQLConnector, tables, foreign_keys, latency)
+    print("bulk:      %6s queries %8.3f s" % (queries, seconds))
+    assert metadata.data == expected.data
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Serialization and parsing time of the JSON backends.
+
+The previous `to_json`, which serialized the document twice with the
+standard library, is measured as the baseline.
+
+Usage:
+  json_backends.py [--tables=<n>] [--fields=<n>] [--runs=<n>]
+
+Options:
+  -h --help        Show this screen.
+  --tables <n>     The number of tables [default: 10000].
+  --fields <n>     The number of fields per table [default: 20].
+  --runs <n>       The number of runs of each operation [default: 3].
+"""
+import json
+import os
+import tempfile
+
+from docopt import docopt
+from json_cache import measure
+from memory import generate
+
+from metad import MetaData, jsonio
+
+
+def to_json_twice(metadata, path_to_json):
+    with open(path_to_json, "wt") as fp:
+        json.dump(metadata.data, fp, indent=2)
+    return json.dumps(metadata.data, indent=2)
+
+
+def main():
+    args = docopt(__doc__)
+    runs = int(args["--runs"])
+    metadata = MetaData()
+    metadata.data = json.loads(generate(int(args["--tables"]), int(args["--fields"])))
+
+    with tempfile.TemporaryDirectory() as path_to_output:
+        path_to_json = os.path.join(path_to_output, "metadata.json")
+        expected = to_json_twice(metadata, path_to_json)
+        print("%.1f MiB" % (os.path.getsize(path_to_json) / 2 ** 20))
+        baseline = measure(lambda: to_json_twice(metadata, path_to_json), runs)
+        print("%-8s to_json %8.3f s" % ("baseline", baseline))
+
+        for backend in jsonio.BACKENDS:
+            try:
+                jsonio.set_backend(backend)
+            except ImportError:
+                print("%-8s not installed" % backend)
+                continue
+
+            assert metadata.to_json(path_to_json) == expected
+            pretty = measure(lambda: metadata.to_json(path_to_json), runs)
+            compact = measure(lambda: metadata.to_json(path_to_json, compact=True), runs)
+            load = measure(lambda: MetaData.from_json(path_to_json), runs)
+            print("%-8s to_json %8.3f s  compact %8.3f s  from_json (compact) %8.3f s" % (
+                backend, pretty, compact, load))
+
+
+if __name__ == '__main__':
+    main()
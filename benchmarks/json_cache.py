@@ -0,0 +1,54 @@
+"""Load time of large metadata files with and without the sidecar cache.
+
+Usage:
+  json_cache.py [--tables=<n>] [--fields=<n>] [--runs=<n>]
+
+Options:
+  -h --help        Show this screen.
+  --tables <n>     The number of tables [default: 1000].
+  --fields <n>     The number of fields per table [default: 100].
+  --runs <n>       The number of loads of each kind [default: 5].
+"""
+import os
+import statistics
+import tempfile
+import time
+
+from docopt import docopt
+from memory import generate
+
+from metad import MetaData
+
+
+def measure(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return statistics.median(times)
+
+
+def load_and_validate(path_to_json):
+    MetaData.from_json(path_to_json).validate()
+
+
+def main():
+    args = docopt(__doc__)
+    runs = int(args["--runs"])
+    with tempfile.TemporaryDirectory() as path_to_output:
+        path_to_json = os.path.join(path_to_output, "metadata.json")
+        with open(path_to_json, "wt") as fout:
+            fout.write(generate(int(args["--tables"]), int(args["--fields"])))
+        print("%.1f MiB" % (os.path.getsize(path_to_json) / 2 ** 20))
+
+        plain = measure(lambda: load_and_validate(path_to_json), runs)
+        cold = measure(lambda: MetaData.from_json(path_to_json, cache=True), 1)
+        warm = measure(lambda: MetaData.from_json(path_to_json, cache=True), runs)
+        print("from_json + validate: %8.3f s" % plain)
+        print("cache (cold):         %8.3f s" % cold)
+        print("cache (warm):         %8.3f s  %.1fx" % (warm, plain / warm))
+
+
+if __name__ == '__main__':
+    main()
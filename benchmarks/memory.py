@@ -0,0 +1,68 @@
+"""Memory usage of the dictionary and object model representations.
+
+Usage:
+  memory.py [--tables=<n>] [--fields=<n>]
+
+Options:
+  -h --help        Show this screen.
+  --tables <n>     The number of tables [default: 1000].
+  --fields <n>     The number of fields per table [default: 100].
+"""
+import json
+import tracemalloc
+
+from docopt import docopt
+
+from metad import MetaData
+
+DATA_TYPES = [
+    {"data_type": "id"},
+    {"data_type": "numerical", "data_subtype": "integer"},
+    {"data_type": "numerical", "data_subtype": "float"},
+    {"data_type": "categorical"},
+    {"data_type": "datetime"},
+]
+
+
+def generate(number_of_tables, number_of_fields):
+    tables = []
+    for i in range(number_of_tables):
+        fields = []
+        for j in range(number_of_fields):
+            field = {"name": "field_%s" % j}
+            field.update(DATA_TYPES[j % len(DATA_TYPES)])
+            fields.append(field)
+        tables.append({
+            "id": "table_%s" % i,
+            "name": "table_%s" % i,
+            "primary_key": "field_0",
+            "fields": fields
+        })
+    return json.dumps({"tables": tables, "foreign_keys": [], "constraints": []})
+
+
+def measure(function):
+    tracemalloc.start()
+    result = function()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    args = docopt(__doc__)
+    document = generate(int(args["--tables"]), int(args["--fields"]))
+
+    data, dict_size = measure(lambda: json.loads(document))
+    metadata = MetaData()
+    metadata.data = data
+    dataset, model_size = measure(metadata.to_model)
+    assert dataset.to_dict() == data
+
+    print("dict:  %8.1f MiB" % (dict_size / 2 ** 20))
+    print("model: %8.1f MiB" % (model_size / 2 ** 20))
+    print("ratio: %8.2fx" % (dict_size / model_size))
+
+
+if __name__ == '__main__':
+    main()
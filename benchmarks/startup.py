@@ -0,0 +1,56 @@
+"""Start-up time of `import metad` and of the CLI.
+
+Each command runs in a fresh interpreter and the median wall-clock time is
+reported. The validation is measured with an empty (cold) and a populated
+(warm) validator cache.
+
+Usage:
+  startup.py [--runs=<n>]
+
+Options:
+  -h --help     Show this screen.
+  --runs <n>    The number of runs of each command [default: 10].
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "examples", "nba", "metadata.json")
+
+COMMANDS = [
+    ("python", ["-c", "pass"], False),
+    ("import metad", ["-c", "import metad"], False),
+    ("metad describe", ["-m", "metad", "describe", EXAMPLE], False),
+    ("metad validate (cold)", ["-m", "metad", "validate", "--processes=1", EXAMPLE], True),
+    ("metad validate (warm)", ["-m", "metad", "validate", "--processes=1", EXAMPLE], False),
+]
+
+
+def run(arguments, environment, runs, cold):
+    times = []
+    for _ in range(runs):
+        if cold:
+            environment["METAD_CACHE_DIR"] = tempfile.mkdtemp()
+        start = time.time()
+        subprocess.run([sys.executable] + arguments, env=environment,
+                       stdout=subprocess.DEVNULL, check=True)
+        times.append(time.time() - start)
+    return statistics.median(times)
+
+
+def main():
+    args = docopt(__doc__)
+    runs = int(args["--runs"])
+    environment = dict(os.environ, METAD_CACHE_DIR=tempfile.mkdtemp())
+    for name, arguments, cold in COMMANDS:
+        seconds = run(arguments, dict(environment), runs, cold)
+        print("%-24s %8.1f ms" % (name, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""Benchmark suite of the metadata operations and connectors.
+
+Each benchmark runs on a synthetic schema and data created by `generator`
+and reports the median of its runs. The results can be saved to a JSON file
+and compared with a previous one: the benchmarks which got slower by more
+than the threshold are reported as regressions and the script exits with
+status 1.
+
+Usage:
+  suite.py [options] [<benchmark>...]
+  suite.py --list
+
+Options:
+  -h --help                  Show this screen.
+  --list                     List the benchmarks.
+  --tables=<n>               The number of tables [default: 200].
+  --fields=<n>               The number of regular fields per table [default: 10].
+  --foreign-keys=<n>         The average number of foreign keys per table [default: 1.5].
+  --composite-keys=<ratio>   The fraction of tables with composite keys [default: 0.2].
+  --constraints=<n>          The number of constraints [default: 50].
+  --rows=<n>                 The number of rows per table [default: 1000].
+  --runs=<n>                 The number of runs of each benchmark [default: 5].
+  --save=<path>              Save the results to a JSON file.
+  --compare=<path>           Compare the results with a saved JSON file.
+  --threshold=<ratio>        The slowdown reported as a regression [default: 1.2].
+"""
+import contextlib
+import copy
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from docopt import docopt
+from generator import generate_metadata, generate_tables, to_standin
+from mysql_standin import connect
+
+import metad
+from metad import MetaData
+from metad.connectors import DataFrameConnector
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(function):
+    """Register a benchmark.
+
+    The function receives the `Workload` and returns the callable to time,
+    so that the setup is not measured.
+    """
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+class Workload():
+    """The synthetic schema and data shared by the benchmarks."""
+
+    def __init__(self, tables, fields, foreign_keys, composite_keys, constraints, rows):
+        self.metadata = generate_metadata(
+            tables, fields, foreign_keys, composite_keys, constraints)
+        self.rows = rows
+        self._tables = None
+        self.directory = tempfile.mkdtemp()
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            self._tables = generate_tables(self.metadata, self.rows)
+        return self._tables
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def close(self):
+        shutil.rmtree(self.directory)
+
+
+@benchmark
+def validate(workload):
+    metadata = MetaData()
+    metadata.data = copy.deepcopy(workload.metadata)
+    return metadata.validate
+
+
+def _add(workload, batch):
+    def add():
+        metadata = MetaData()
+        with metadata.batch() if batch else contextlib.suppress():
+            for table in workload.metadata["tables"]:
+                metadata.add_table(table)
+            for foreign_key in workload.metadata["foreign_keys"]:
+                metadata.add_foreign_key(foreign_key)
+            for constraint in workload.metadata["constraints"]:
+                metadata.add_constraint(constraint)
+
+    return add
+
+
+@benchmark
+def add_incremental(workload):
+    return _add(workload, batch=False)
+
+
+@benchmark
+def add_batch(workload):
+    return _add(workload, batch=True)
+
+
+@benchmark
+def to_json(workload):
+    metadata = MetaData()
+    metadata.data = workload.metadata
+    return lambda: metadata.to_json(workload.path("to_json.json"))
+
+
+@benchmark
+def to_json_compact(workload):
+    metadata = MetaData()
+    metadata.data = workload.metadata
+    return lambda: metadata.to_json(workload.path("to_json.json"), compact=True)
+
+
+def _write_json(workload, name):
+    metadata = MetaData()
+    metadata.data = workload.metadata
+    path_to_json = workload.path(name)
+    metadata.to_json(path_to_json)
+    return path_to_json
+
+
+@benchmark
+def from_json(workload):
+    path_to_json = _write_json(workload, "from_json.json")
+    return lambda: MetaData.from_json(path_to_json)
+
+
+@benchmark
+def from_json_cache(workload):
+    path_to_json = _write_json(workload, "from_json_cache.json")
+    MetaData.from_json(path_to_json, cache=True)
+    return lambda: MetaData.from_json(path_to_json, cache=True)
+
+
+@benchmark
+def graph_queries(workload):
+    def query():
+        metadata = MetaData()
+        metadata.data = workload.metadata
+        graph = metadata.get_graph()
+        graph.topological_order()
+        graph.cycles()
+        source = workload.metadata["tables"][0]["id"]
+        for table in workload.metadata["tables"]:
+            graph.ancestors(table["id"])
+            graph.join_path(source, table["id"])
+
+    return query
+
+
+@benchmark
+def validate_data(workload):
+    metadata = MetaData()
+    metadata.data = copy.deepcopy(workload.metadata)
+    path_to_dataset = workload.path("validate_data")
+    os.makedirs(path_to_dataset)
+    for table in metadata.data["tables"]:
+        table["path"] = "%s.csv" % table["name"]
+        workload.tables[table["name"]].to_csv(
+            os.path.join(path_to_dataset, table["path"]), index=False)
+    return lambda: metadata.validate_data(path_to_dataset)
+
+
+@benchmark
+def load_tables(workload):
+    metadata = MetaData()
+    metadata.data = copy.deepcopy(workload.metadata)
+    path_to_dataset = workload.path("load_tables")
+    os.makedirs(path_to_dataset)
+    for table in metadata.data["tables"]:
+        table["path"] = "%s.csv" % table["name"]
+        workload.tables[table["name"]].to_csv(
+            os.path.join(path_to_dataset, table["path"]), index=False)
+
+    def load():
+        loader = metadata.get_loader(path_to_dataset)
+        for table in metadata.data["tables"]:
+            loader.load(table["name"])
+
+    return load
+
+
+@benchmark
+def dataframe_analyze(workload):
+    tables = workload.tables
+    return lambda: DataFrameConnector(tables)
+
+
+@benchmark
+def dataframe_discover(workload):
+    tables = workload.tables
+    return lambda: DataFrameConnector(tables, discover_keys=True)
+
+
+@benchmark
+def dataframe_profile(workload):
+    tables = workload.tables
+    return lambda: DataFrameConnector(tables, profile=True)
+
+
+@benchmark
+def dataframe_export(workload):
+    connector = DataFrameConnector(workload.tables)
+    return lambda: connector.export(workload.path("dataframe_export"))
+
+
+@benchmark
+def dataframe_subset(workload):
+    connector = DataFrameConnector(workload.tables)
+    connector.metadata.data = workload.metadata
+    return lambda: connector.export_subset(workload.path("dataframe_subset"), fraction=0.01)
+
+
+@benchmark
+def mysql_introspect(workload):
+    connection = to_standin(workload.metadata, workload.tables)
+    return lambda: connect(connection)
+
+
+@benchmark
+def mysql_export(workload):
+    connector = connect(to_standin(workload.metadata, workload.tables))
+    return lambda: connector.export(workload.path("mysql_export"))
+
+
+@benchmark
+def mysql_export_incremental(workload):
+    # a nightly export in which nothing changed since the previous one
+    connector = connect(to_standin(workload.metadata, workload.tables), incremental=True)
+    connector.export(workload.path("mysql_export_incremental"))
+    return lambda: connector.export(workload.path("mysql_export_incremental"))
+
+
+@benchmark
+def mysql_subset(workload):
+    connector = connect(to_standin(workload.metadata, workload.tables))
+    return lambda: connector.export_subset(workload.path("mysql_subset"), fraction=0.01)
+
+
+def measure(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def compare(results, previous, threshold):
+    """Print the ratio to the previous results and return the regressions."""
+    regressions = []
+    for name, seconds in results.items():
+        if name not in previous:
+            continue
+        ratio = seconds / previous[name]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("%-20s %10.4f s  %10.4f s  %6.2fx%s" % (
+            name, previous[name], seconds, ratio, flag))
+    return regressions
+
+
+def main():
+    args = docopt(__doc__)
+    if args["--list"]:
+        print("\n".join(BENCHMARKS))
+        return
+
+    names = args["<benchmark>"] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit("Unknown benchmarks: %s" % ", ".join(unknown))
+
+    parameters = OrderedDict([
+        ("tables", int(args["--tables"])),
+        ("fields", int(args["--fields"])),
+        ("foreign_keys", float(args["--foreign-keys"])),
+        ("composite_keys", float(args["--composite-keys"])),
+        ("constraints", int(args["--constraints"])),
+        ("rows", int(args["--rows"])),
+    ])
+    runs = int(args["--runs"])
+
+    workload = Workload(**parameters)
+    results = OrderedDict()
+    try:
+        for name in names:
+            results[name] = measure(BENCHMARKS[name](workload), runs)
+            print("%-20s %10.4f s" % (name, results[name]))
+    finally:
+        workload.close()
+
+    if args["--save"]:
+        with open(args["--save"], "wt") as fout:
+            json.dump({
+                "metad": metad.__version__,
+                "python": platform.python_version(),
+                "parameters": parameters,
+                "runs": runs,
+                "results": results,
+            }, fout, indent=2)
+
+    if args["--compare"]:
+        with open(args["--compare"], "rt") as fin:
+            previous = json.load(fin)
+        if previous["parameters"] != parameters:
+            print("Warning: the results were saved with other parameters: %s" % (
+                previous["parameters"], ))
+
+        print()
+        print("%-20s %12s  %12s" % ("", "previous", "current"))
+        regressions = compare(results, previous["results"], float(args["--threshold"]))
+        if regressions:
+            sys.exit("%s regressions: %s" % (len(regressions), ", ".join(regressions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,22 +2,67 @@
 
 Usage:
   metad describe <json>
-  metad validate <jsons>...
-  metad rdr --database=<database>
+  metad validate [--processes=<n>] [--data] <jsons>...
+  metad count-rows [--max-workers=<n>] [--update] <json>
+  metad rdr --database=<database> [--chunk-size=<rows>] [--max-workers=<n>]
+            [--partition-rows=<rows>] [--format=<format>] [--compression=<method>] [--profile]
+            [--incremental] [--change-detection=<method>]
+            [--sample-fraction=<f> | --sample-rows=<n>] [--sample-tables=<names>]
+            [--sample-children] [--seed=<n>]
   metad mysql --host=<host> --port=<port> --user=<user> --password=<password> --database=<database>
+              [--chunk-size=<rows>] [--max-workers=<n>] [--partition-rows=<rows>]
+              [--format=<format>] [--compression=<method>] [--profile]
+              [--incremental] [--change-detection=<method>]
+              [--sample-fraction=<f> | --sample-rows=<n>] [--sample-tables=<names>]
+              [--sample-children] [--seed=<n>]
 
 Options:
-  -h --help              Show this screen.
-  --host <host>          The MySQL host.
-  --port <port>          The MySQL port.
-  --user <user>          The MySQL username.
-  --password <password>  The MySQL password.
-  --database <database>  The MySQL database name.
+  -h --help                Show this screen.
+  --processes <n>          The number of processes used to validate the files
+                           (default: the number of CPUs).
+  --data                   Also check the referential integrity of the table
+                           files, relative to the JSON file.
+  --update                 Store the number of rows of the tables in the JSON file.
+  --host <host>            The MySQL host.
+  --port <port>            The MySQL port.
+  --user <user>            The MySQL username.
+  --password <password>    The MySQL password.
+  --database <database>    The MySQL database name.
+  --chunk-size <rows>      Stream the tables, writing this many rows at a time.
+  --max-workers <n>        The number of tables to export (default: 1) or to count
+                           (default: the number of CPUs) concurrently.
+  --partition-rows <rows>  Split tables with more rows into primary key ranges
+                           which are exported concurrently, by more than one
+                           of the --max-workers.
+  --format <format>        The format of the table files: csv, parquet or
+                           feather [default: csv].
+  --compression <method>   Compress the CSV files with gzip, zstd or lz4.
+  --profile                Store the statistics of the values of the fields,
+                           computed while the tables are exported.
+  --incremental            Skip the tables which didn't change since the last
+                           export and resume an interrupted one.
+  --change-detection <method>  Detect the changes of the tables with checksum or
+                           update_time [default: checksum].
+  --sample-fraction <f>    Export a sample of this fraction of the rows, with
+                           the rows which they reference.
+  --sample-rows <n>        Export a sample of this many rows of each table,
+                           with the rows which they reference.
+  --sample-tables <names>  The comma separated tables which are sampled
+                           (default: the tables which nothing references).
+  --sample-children        Also export the rows which reference the sample.
+  --seed <n>               The seed of the sample [default: 0].
 """
+import os
+import sys
+
 from docopt import docopt
 
 from metad import MetaData
-from metad.connectors import MySQLConnector
+
+
+def _optional_int(value):
+    if value:
+        return int(value)
 
 
 def describe(args):
@@ -25,32 +70,125 @@ def describe(args):
     print(str(metadata))
 
 
+def _validate_file(path_to_json, data=False):
+    from fastjsonschema import JsonSchemaException
+
+    try:
+        metadata = MetaData.from_json(path_to_json)
+        metadata.validate()
+        if data:
+            path_to_dataset = os.path.join(
+                os.path.dirname(path_to_json), metadata.data.get("path", ""))
+            problems = metadata.validate_data(path_to_dataset)
+            if problems:
+                return path_to_json, "; ".join(problem["message"] for problem in problems)
+    except JsonSchemaException as error:
+        return path_to_json, error.message
+    except (AssertionError, ValueError, OSError) as error:
+        return path_to_json, str(error)
+    except Exception as error:
+        return path_to_json, "%s: %s" % (type(error).__name__, error)
+    return path_to_json, None
+
+
+def _validate_files(paths, processes, data=False):
+    if processes == 1 or len(paths) == 1:
+        for path_to_json in paths:
+            yield _validate_file(path_to_json, data)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_validate_file, path, data) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
 def validate(args):
-    for path_to_json in args["<jsons>"]:
-        print("Validating %s..." % path_to_json)
-        MetaData.from_json(path_to_json).validate()
+    processes = _optional_int(args["--processes"]) or os.cpu_count()
+    failed = 0
+    results = _validate_files(args["<jsons>"], processes, args["--data"])
+    for path_to_json, error in results:
+        if error:
+            failed += 1
+            print("FAIL %s: %s" % (path_to_json, error))
+        else:
+            print("PASS %s" % path_to_json)
+
+    print("%s files validated, %s failed." % (len(args["<jsons>"]), failed))
+    if failed:
+        sys.exit(1)
+
+
+def count_rows(args):
+    path_to_json = args["<json>"]
+    metadata = MetaData.from_json(path_to_json)
+    path_to_dataset = os.path.join(os.path.dirname(path_to_json), metadata.data.get("path", ""))
+    counts = metadata.count_rows(path_to_dataset, _optional_int(args["--max-workers"]))
+    for table_name, number_of_rows in counts.items():
+        print("%s %s" % (table_name, number_of_rows))
+    if args["--update"]:
+        metadata.to_json(path_to_json)
+
+
+def _export(connector, args):
+    if args["--sample-fraction"] is None and args["--sample-rows"] is None:
+        connector.export(args["--database"], format=args["--format"],
+                         compression=args["--compression"])
+        return
+
+    tables = args["--sample-tables"]
+    connector.export_subset(
+        args["--database"],
+        tables=tables.split(",") if tables else None,
+        fraction=float(args["--sample-fraction"]) if args["--sample-fraction"] else None,
+        size=_optional_int(args["--sample-rows"]),
+        seed=int(args["--seed"]),
+        children=args["--sample-children"],
+        format=args["--format"],
+        compression=args["--compression"],
+    )
 
 
 def mysql(args):
+    # the connectors pull in pandas and pymysql, so they are only
+    # imported by the commands which need them
+    from metad.connectors import MySQLConnector
+
     connector = MySQLConnector(
         host=args["--host"],
         port=args["--port"],
         user=args["--user"],
         password=args["--password"],
         database=args["--database"],
+        chunk_size=_optional_int(args["--chunk-size"]),
+        max_workers=_optional_int(args["--max-workers"]) or 1,
+        partition_rows=_optional_int(args["--partition-rows"]),
+        profile=args["--profile"],
+        incremental=args["--incremental"],
+        change_detection=args["--change-detection"],
     )
-    connector.export(args["--database"])
+    _export(connector, args)
 
 
 def rdr(args):
+    from metad.connectors import MySQLConnector
+
     connector = MySQLConnector(
         host='relational.fit.cvut.cz',
         port=3306,
         user='guest',
         password='relational',
         database=args["--database"],
+        chunk_size=_optional_int(args["--chunk-size"]),
+        max_workers=_optional_int(args["--max-workers"]) or 1,
+        partition_rows=_optional_int(args["--partition-rows"]),
+        profile=args["--profile"],
+        incremental=args["--incremental"],
+        change_detection=args["--change-detection"],
     )
-    connector.export(args["--database"])
+    _export(connector, args)
 
 
 def main():
@@ -59,6 +197,8 @@ def main():
         describe(args)
     elif args["validate"]:
         validate(args)
+    elif args["count-rows"]:
+        count_rows(args)
     elif args["mysql"]:
         mysql(args)
     elif args["rdr"]:
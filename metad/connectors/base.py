@@ -1,6 +1,9 @@
+import copy
 import os
 
 from metad import MetaData
+from metad.connectors import subset
+from metad.formats import OutputFormat
 
 
 class BaseConnector():
@@ -8,19 +11,117 @@ class BaseConnector():
     def __init__(self):
         self.metadata = MetaData()
 
-    def export(self, path_to_output):
+    def export(self, path_to_output, format="csv", compression=None):
         """Export the relational dataset.
 
         This exports the relational dataset to the output directory. It
-        write the metadata to a JSON file and stores the tables as CSV files
-        where the name of the file is the table name.
+        stores the tables as files where the name of the file is the table
+        name and writes the metadata, including the path to each file and
+        the number of rows written to it, to a JSON file.
 
         Args:
             path_to_output (str): The path to the output directory.
+            format (str): The format of the table files, which is one of
+                `csv` (default), `parquet` or `feather`. The columnar
+                formats require `pyarrow`.
+            compression (str, optional): Compress the CSV files while they
+                are written, using `gzip`, `zstd` (requires `zstandard`) or
+                `lz4` (requires `lz4`). The compression is recorded in the
+                table entries of the metadata.
         """
+        output_format = OutputFormat(format, compression)
         os.makedirs(path_to_output, exist_ok=True)
+        for table in self.metadata.data["tables"]:
+            table["path"] = output_format.file_name(table["name"])
+            if compression:
+                table["compression"] = compression
+            else:
+                table.pop("compression", None)
+        self.export_tables(path_to_output, format, compression)
         self.export_metadata(os.path.join(path_to_output, "metadata.json"))
-        self.export_tables(path_to_output)
+
+    def export_subset(self, path_to_output, tables=None, fraction=None, size=None, seed=0,
+                      children=False, format="csv", compression=None):
+        """Export a referentially consistent subset of the relational dataset.
+
+        A seeded random sample of the rows of some tables is exported with
+        the rows they reference through the foreign keys, and optionally the
+        rows which reference them, so that no foreign key of the subset is
+        broken (see `metad.connectors.subset`). The rows are fetched with
+        `sample_rows` and `lookup_rows`. The files and the metadata are
+        written like `export` does, without the `stats` of the fields, which
+        describe the whole tables, and without changing the metadata of the
+        connector.
+
+        Args:
+            path_to_output (str): The path to the output directory.
+            tables (list, optional): The names of the tables which are
+                sampled. Defaults to the tables which no foreign key
+                references.
+            fraction (float, optional): The fraction of the rows of each
+                sampled table which are selected.
+            size (int, optional): The number of rows of each sampled table
+                which are selected, instead of a fraction.
+            seed (int): The seed of the random samples (default: 0).
+            children (bool): Whether to export the rows which reference the
+                sampled rows too. Defaults to False.
+            format (str): The format of the table files (default: `csv`).
+            compression (str, optional): The compression of the CSV files.
+
+        Returns:
+            dict: The number of rows of each table in the subset, by name.
+        """
+        output_format = OutputFormat(format, compression)
+        rows = subset.subset(self.metadata, self.sample_rows, self.lookup_rows, tables,
+                             fraction, size, seed, children)
+
+        os.makedirs(path_to_output, exist_ok=True)
+        metadata = MetaData()
+        metadata.data = copy.deepcopy(self.metadata.data)
+        for table in metadata.data["tables"]:
+            table["path"] = output_format.file_name(table["name"])
+            if compression:
+                table["compression"] = compression
+            else:
+                table.pop("compression", None)
+            for field in table["fields"]:
+                field.pop("stats", None)
+
+            writer = output_format.open(os.path.join(path_to_output, table["path"]), table)
+            writer.write(rows[table["name"]])
+            writer.close()
+            table["number_of_rows"] = writer.number_of_rows
+
+        metadata.to_json(os.path.join(path_to_output, "metadata.json"))
+        return {table["name"]: table["number_of_rows"] for table in metadata.data["tables"]}
+
+    def sample_rows(self, table, fraction=None, size=None, seed=0):
+        """Get a random sample of the rows of a table.
+
+        Args:
+            table (dict): The table metadata.
+            fraction (float, optional): The fraction of the rows.
+            size (int, optional): The number of rows, instead of a fraction.
+            seed (int): The seed of the sample.
+
+        Returns:
+            pandas.DataFrame: The rows.
+        """
+        raise NotImplementedError()
+
+    def lookup_rows(self, table, columns, values):
+        """Get the rows of a table whose columns have some values.
+
+        Args:
+            table (dict): The table metadata.
+            columns (list): The names of the columns.
+            values (pandas.DataFrame): The distinct values, in the columns
+                of the same names, none of them missing.
+
+        Returns:
+            pandas.DataFrame: The rows which have any of the values.
+        """
+        raise NotImplementedError()
 
     def export_metadata(self, path_to_json):
         """Write the metadata to a JSON file.
@@ -30,10 +131,15 @@ class BaseConnector():
         """
         raise NotImplementedError()
 
-    def export_tables(self, path_to_output):
-        """Write the tables to CSV files.
+    def export_tables(self, path_to_output, format="csv", compression=None):
+        """Write the tables to files.
+
+        The number of rows written to the file of each table is stored in
+        its `number_of_rows`.
 
         Args:
             path_to_output (str): The path to the output directory.
+            format (str): The format of the files (default: `csv`).
+            compression (str, optional): The compression of the files.
         """
         raise NotImplementedError()
@@ -1,8 +1,11 @@
-import copy
 import os
 import uuid
 
+import pandas as pd
+
+from metad.connectors import discovery, inference, profiling
 from metad.connectors.base import BaseConnector
+from metad.formats import OutputFormat
 
 
 class DataFrameConnector(BaseConnector):
@@ -10,50 +13,67 @@ class DataFrameConnector(BaseConnector):
 
     The DataFrameConnector allows you to import data from pandas
     DataFrames. It automatically populates the tables and fields; it also
-    infers the data types from the data.
+    infers the data types from a sample of the data (see
+    `metad.connectors.inference`).
     """
 
-    _FIELD_TEMPLATES = {
-        'i': {
-            'data_type': 'numerical',
-            'data_subtype': 'integer',
-        },
-        'f': {
-            'data_type': 'numerical',
-            'data_subtype': 'float',
-        },
-        'O': {
-            'data_type': 'categorical',
-        },
-        'b': {
-            'data_type': 'boolean',
-        },
-        'M': {
-            'data_type': 'datetime',
-        }
-    }
-
-    def __init__(self, tables):
+    def __init__(self, tables, sample_size=inference.SAMPLE_SIZE, discover_keys=False,
+                 profile=False):
         """Create a new DataFrameConnector.
 
         Args:
             tables (dict): A dictionary mapping from table names to pandas
             DataFrames.
+            sample_size (int, optional): The number of rows of each
+            DataFrame used to infer the data types. If None, all the rows
+            are used. Defaults to 10000.
+            discover_keys (bool): Whether to look for the primary keys and
+            the foreign keys of the tables in the data (see
+            `metad.connectors.discovery`). Defaults to False.
+            profile (bool): Whether to compute the statistics of the values
+            of each field, stored in its `stats` (see
+            `metad.connectors.profiling`). Defaults to False.
         """
         super().__init__()
         self.tables = tables
-        self.metadata.set_tables(self._analyze_tables())
+        self.sample_size = sample_size
+        with self.metadata.batch():
+            for table in self._analyze_tables():
+                self.metadata.add_table(table, deepcopy=False)
+        if discover_keys:
+            discovery.discover(self.metadata, self.tables)
+        if profile:
+            for table_name, dataframe in self.tables.items():
+                profiling.profile(dataframe, self.metadata.get_table(table_name))
 
     def export_metadata(self, path_to_json):
         self.metadata.to_json(path_to_json)
 
-    def export_tables(self, path_to_output):
+    def export_tables(self, path_to_output, format="csv", compression=None):
+        output_format = OutputFormat(format, compression)
         for table_name, dataframe in self.tables.items():
-            dataframe.to_csv(
-                os.path.join(
-                    path_to_output,
-                    "%s.csv" %
-                    table_name), index=False)
+            writer = output_format.open(
+                os.path.join(path_to_output, output_format.file_name(table_name)),
+                self.metadata.get_table(table_name))
+            writer.write(dataframe)
+            writer.close()
+            self.metadata.get_table(table_name)["number_of_rows"] = writer.number_of_rows
+
+    def sample_rows(self, table, fraction=None, size=None, seed=0):
+        dataframe = self.tables[table["name"]]
+        if size is not None:
+            size = min(size, len(dataframe))
+        # the sampled rows are kept in the order of the table
+        return dataframe.sample(n=size, frac=fraction, random_state=seed).sort_index()
+
+    def lookup_rows(self, table, columns, values):
+        dataframe = self.tables[table["name"]]
+        if len(columns) == 1:
+            found = dataframe[columns[0]].isin(values[columns[0]])
+        else:
+            found = pd.MultiIndex.from_frame(dataframe[columns]).isin(
+                pd.MultiIndex.from_frame(values))
+        return dataframe[found]
 
     def _analyze_tables(self):
         table_metadata = []
@@ -66,11 +86,5 @@ class DataFrameConnector(BaseConnector):
         return table_metadata
 
     def _analyze_fields(self, dataframe):
-        fields = []
-        for field in dataframe.columns:
-            dtype = dataframe[field].dtype
-            field_metadata = self._FIELD_TEMPLATES.get(dtype.kind)
-            field_metadata = copy.deepcopy(field_metadata)
-            field_metadata["name"] = field
-            fields.append(field_metadata)
-        return fields
+        dataframe = inference.sample(dataframe, self.sample_size)
+        return [inference.infer_field(field, values) for field, values in dataframe.items()]
@@ -0,0 +1,364 @@
+"""Discovery of the primary keys and foreign keys of a set of tables.
+
+Primary keys are the first columns (by preference: ids, then columns named
+like ids, then integers and categorical values) which are unique and have
+no missing values in a sample of the table, confirmed on the whole column.
+When no single column qualifies, pairs of the leftmost candidates are tried.
+
+Foreign keys are inclusion dependencies between a column of a table and the
+primary key of another one. Every key value is reduced to a 64-bit hash,
+and all the key and column hashes are sampled with the same threshold:
+since a hash below the threshold is kept by every column which contains its
+value, the sample of a child column is contained in the sample of its
+parent key. An inverted index from the sampled hashes of the keys to the
+keys gives the candidate parents of each column without comparing it to
+every key, and each candidate is confirmed exactly by looking up all the
+hashes of the column in the sorted hashes of the key. The fraction of the
+column values found in the key is recorded as the `confidence` of the
+foreign key. When a column is contained in several keys, the key of the
+table it is named after (like `user_id` for `users.id`) wins. Columns
+which are neither ids nor named like ids, and the columns of composite
+keys, are only related to the tables they are named after, since small
+integers and codes are contained in many keys by chance.
+
+Composite primary keys are matched with the columns of the same names,
+possibly prefixed with the name of the table, in the other tables.
+"""
+import itertools
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from metad.connectors import inference
+
+SAMPLE_SIZE = 1000
+MIN_CONFIDENCE = 0.95
+
+# below this many sampled hashes, a column is compared with every key
+_MIN_SAMPLE = 16
+
+# the sample of a column may contain a little less than the whole column
+_SAMPLE_MARGIN = 0.9
+
+_MAX_COMPOSITE_CANDIDATES = 8
+
+
+def _is_key_candidate(field):
+    data_type = field.get("data_type")
+    data_subtype = field.get("data_subtype")
+    if data_type == "numerical":
+        return data_subtype == "integer"
+    return data_type == "id" or (data_type == "categorical" and data_subtype != "boolean")
+
+
+def _normalize(values):
+    # represent the same values in the same way in every table
+    kind = values.dtype.kind
+    if kind in "iub" or (kind == "f" and np.all(np.mod(values, 1) == 0)):
+        return values.astype("int64")
+    if kind in "fM":
+        return values
+    return values.astype(str)
+
+
+def _hashes(dataframe, columns):
+    """Get the sorted, distinct hashes of the non-null rows of some columns."""
+    if len(columns) == 1:
+        values = _normalize(dataframe[columns[0]].dropna())
+        hashes = pd.util.hash_array(np.asarray(values), categorize=False)
+    else:
+        values = dataframe[columns].dropna()
+        normalized = pd.DataFrame({column: _normalize(values[column]) for column in columns})
+        hashes = pd.util.hash_pandas_object(normalized, index=False, categorize=False).values
+    return np.unique(hashes)
+
+
+def _is_unique(values):
+    if values.isnull().values.any():
+        return False
+    if isinstance(values, pd.Series):
+        return values.is_unique
+    return not values.duplicated().any()
+
+
+def _key_preference(field):
+    if field.get("data_type") == "id":
+        return 0
+    return 1 if inference.is_id_name(field["name"]) else 2
+
+
+def discover_primary_key(dataframe, fields, sample_size=inference.SAMPLE_SIZE):
+    """Find a primary key of a table.
+
+    Args:
+        dataframe (pandas.DataFrame): The rows of the table.
+        fields (list): The field metadata of the table.
+        sample_size (int, optional): The number of rows checked before the
+            whole column, to discard most columns quickly. If None, all the
+            rows are checked at once.
+
+    Returns:
+        str or list: The name of the key column, or of the key columns, or
+        None if the table has no key.
+    """
+    candidates = [field for field in fields if _is_key_candidate(field)]
+    candidates.sort(key=_key_preference)
+    sample = inference.sample(dataframe, sample_size)
+    for field in candidates:
+        if _is_unique(sample[field["name"]]) and _is_unique(dataframe[field["name"]]):
+            return field["name"]
+
+    # the columns of composite keys usually come first
+    names = [field["name"] for field in fields if _is_key_candidate(field)]
+    for columns in itertools.combinations(names[:_MAX_COMPOSITE_CANDIDATES], 2):
+        columns = list(columns)
+        if _is_unique(sample[columns]) and _is_unique(dataframe[columns]):
+            return columns
+
+    return None
+
+
+def _contained(hashes, key_hashes):
+    positions = np.searchsorted(key_hashes, hashes).clip(max=len(key_hashes) - 1)
+    return float(np.mean(key_hashes[positions] == hashes))
+
+
+def _table_names(table):
+    name = table["name"].lower()
+    return (name, name[:-1]) if name.endswith("s") else (name, )
+
+
+def _sampled(hashes, threshold):
+    return hashes[:np.searchsorted(hashes, threshold, side="right")]
+
+
+class _KeyIndex():
+    """Index of the single-column keys by sampled hash and by name.
+
+    Args:
+        keys (list): Tuples of (table, key columns, key hashes).
+        threshold (numpy.uint64): The hashes up to this one are sampled.
+        tables (list): All the tables, with a key or not.
+    """
+
+    def __init__(self, keys, threshold, tables=()):
+        self.keys = keys
+        self.threshold = threshold
+        self.table_names = set(
+            name for table in tables for name in _table_names(table))
+        self.by_table_name = defaultdict(list)
+        self.by_column = defaultdict(list)
+        self.composite = defaultdict(list)
+        hashes = [np.empty(0, dtype=np.uint64)]
+        positions = [np.empty(0, dtype=np.intp)]
+        for position, (table, columns, key_hashes) in enumerate(keys):
+            if len(columns) > 1:
+                # the child columns are named like the key, possibly after the table
+                for prefix in ("", ) + tuple(name + "_" for name in _table_names(table)):
+                    names = [prefix + column for column in columns]
+                    self.composite[names[0]].append((position, names))
+            else:
+                for name in _table_names(table):
+                    self.by_table_name[name].append(position)
+                self.by_column[columns[0].lower()].append(position)
+                sampled = _sampled(key_hashes, threshold)
+                hashes.append(sampled)
+                positions.append(np.full(len(sampled), position, dtype=np.intp))
+
+        hashes = np.concatenate(hashes)
+        order = np.argsort(hashes, kind="stable")
+        self.hashes = hashes[order]
+        self.positions = np.concatenate(positions)[order]
+        self.single = set(self.positions.tolist())
+
+    def candidates(self, hashes, min_confidence):
+        """Get the keys which may contain the given hashes."""
+        sampled = _sampled(hashes, self.threshold)
+        if len(sampled) < _MIN_SAMPLE:
+            return self.single
+
+        start = np.searchsorted(self.hashes, sampled, side="left")
+        lengths = np.searchsorted(self.hashes, sampled, side="right") - start
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        matches = self.positions[np.repeat(start, lengths) + offsets]
+        counts = np.bincount(matches, minlength=len(self.keys))
+        minimum = len(sampled) * min_confidence * _SAMPLE_MARGIN
+        return set(np.flatnonzero(counts >= minimum).tolist())
+
+    def composite_candidates(self, columns, own_key):
+        """Get the composite keys which some columns may reference.
+
+        Yields:
+            tuple: The position of the key and the names of the columns.
+        """
+        columns = set(columns)
+        seen = set()
+        for column in columns:
+            for position, names in self.composite.get(column, ()):
+                if position in seen or not columns.issuperset(names):
+                    continue
+                if set(names) <= set(own_key):
+                    continue
+                seen.add(position)
+                yield position, names
+
+    def named(self, column):
+        """Get the keys of the tables a column is named after.
+
+        That is `<table>_<key>`, `<table>_id` or `<table>Id`, with the name
+        of the table in singular or plural.
+        """
+        column = column.lower()
+        named = set()
+        for end in range(1, len(column)):
+            for position in self.by_table_name.get(column[:end].rstrip("_"), ()):
+                suffix = column[end:].lstrip("_")
+                if suffix in ("id", self.keys[position][1][0].lower()):
+                    named.add(position)
+        return named
+
+    def names_table(self, column):
+        """Whether a column is named `<table>_id` or `<table>Id` after any table."""
+        column = column.lower()
+        return any(
+            column[:end].rstrip("_") in self.table_names and column[end:].lstrip("_") == "id"
+            for end in range(1, len(column))
+        )
+
+
+def _best_parent(dataframe, field, index, min_confidence, named_only=False):
+    """Find the key which contains the values of a column.
+
+    A column named after tables only references their keys. The others
+    reference, unless `named_only`, the keys with the same name as the
+    column and, for the columns named like ids, any other key.
+
+    Returns:
+        tuple: The table, key column and confidence, or None.
+    """
+    column = field["name"]
+    groups = [index.named(column)]
+    if groups[0] or index.names_table(column):
+        named_only = True
+    if not named_only:
+        groups.append(set(index.by_column.get(column.lower(), ())))
+    groups = [group for group in groups if group]
+    is_id = field.get("data_type") == "id" or inference.is_id_name(column)
+    if not (groups or is_id and not named_only):
+        return None
+
+    hashes = _hashes(dataframe, [column])
+    if len(hashes) < 2:
+        return None
+
+    candidates = index.candidates(hashes, min_confidence)
+    if is_id and not named_only:
+        groups.append(candidates)
+
+    for group in groups:
+        best = None
+        for position in sorted(group & candidates):
+            parent, columns, key_hashes = index.keys[position]
+            confidence = _contained(hashes, key_hashes)
+            rank = (confidence, -len(key_hashes))
+            if confidence >= min_confidence and (best is None or rank > best[0]):
+                best = (rank, parent, columns[0], confidence)
+        if best is not None:
+            return best[1:]
+
+    return None
+
+
+def discover(metadata, tables, sample_size=SAMPLE_SIZE, min_confidence=MIN_CONFIDENCE):
+    """Discover the primary keys and foreign keys of a set of tables.
+
+    The tables without a `primary_key` get the one found by
+    `discover_primary_key`, and the foreign keys found between the columns
+    and the primary keys are added to the metadata with `add_foreign_key`.
+    The columns of the keys which are found are marked as ids.
+
+    Args:
+        metadata (MetaData): The metadata of the tables.
+        tables (dict): The DataFrame of each table, by name.
+        sample_size (int): The number of hashes sampled from the largest
+            key, which bounds the size of the inverted index per key.
+        min_confidence (float): The minimum fraction of the values of a
+            column which must be found in a key for them to be related.
+
+    Returns:
+        list: The foreign keys which were added.
+    """
+    keys = []
+    for name, dataframe in tables.items():
+        table = metadata.get_table(name)
+        if table.get("primary_key") is None:
+            primary_key = discover_primary_key(dataframe, table["fields"])
+            if primary_key is None:
+                continue
+            table["primary_key"] = primary_key
+            _mark_ids(table, primary_key)
+        columns = table["primary_key"]
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        keys.append((table, columns, _hashes(dataframe, columns)))
+
+    if not keys:
+        return []
+
+    largest = max(len(hashes) for _, _, hashes in keys)
+    ratio = sample_size / max(largest, 1)
+    threshold = np.uint64(2 ** 64 - 1 if ratio >= 1 else int(ratio * 2 ** 64))
+    index = _KeyIndex(keys, threshold, [metadata.get_table(name) for name in tables])
+
+    found = []
+    for name, dataframe in tables.items():
+        table = metadata.get_table(name)
+        own_key = table.get("primary_key")
+        own_key = [own_key] if isinstance(own_key, str) else list(own_key or [])
+
+        # a column of a composite key may reference the table it is named after
+        related = set(own_key) if len(own_key) == 1 else set()
+        for position, child_columns in index.composite_candidates(dataframe.columns, own_key):
+            parent, columns, key_hashes = keys[position]
+            confidence = _contained(_hashes(dataframe, child_columns), key_hashes)
+            if confidence >= min_confidence:
+                found.append((table, child_columns, parent, columns, confidence))
+                related.update(child_columns)
+
+        for field in table["fields"]:
+            column = field["name"]
+            if column in related or not _is_key_candidate(field):
+                continue
+            named_only = column in own_key
+            best = _best_parent(dataframe, field, index, min_confidence, named_only)
+            if best is not None:
+                parent, ref_field, confidence = best
+                found.append((table, column, parent, ref_field, confidence))
+
+    foreign_keys = []
+    with metadata.batch():
+        for table, field, parent, ref_field, confidence in found:
+            foreign_key = {
+                "table": table["id"],
+                "field": field,
+                "ref_table": parent["id"],
+                "ref_field": ref_field,
+                "confidence": round(confidence, 4),
+            }
+            metadata.add_foreign_key(foreign_key)
+            foreign_keys.append(foreign_key)
+
+        for table, field, _, _, _ in found:
+            _mark_ids(table, field)
+
+    return foreign_keys
+
+
+def _mark_ids(table, columns):
+    columns = [columns] if isinstance(columns, str) else columns
+    for field in table["fields"]:
+        if field["name"] in columns:
+            field["data_type"] = "id"
+            # integer ids keep their subtype, which gives their type
+            if field.get("data_subtype") != "integer":
+                field.pop("data_subtype", None)
@@ -0,0 +1,166 @@
+"""Inference of the field metadata from the values of a column.
+
+The type of each column is inferred from a bounded random sample of its
+rows, using vectorized pandas operations, so the time it takes doesn't
+depend on the size of the table. On top of the type of the column, the
+values are used to detect:
+
+    * ids: columns named `id` or `*_id` (or holding UUIDs) whose sampled
+      values are unique.
+    * booleans: `bool` columns, and object columns of booleans or of the
+      strings `true`/`false`.
+    * unsigned integers, like the signed ones.
+    * integers stored as floats because of missing values.
+    * numbers and datetimes stored as strings.
+    * text: strings which are long, or which are mostly unique and made of
+      several words. Other strings are categorical.
+"""
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_SIZE = 10000
+
+# strings which look like dates or times, checked before trying to parse them
+_DATETIME = re.compile(r"\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}|\s*\d{1,2}:\d{2}")
+_UUID = re.compile(
+    r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$")
+
+# strings which may be numbers, checked before trying to parse them
+_NUMBER = re.compile(r"\s*[-+.\d]")
+_LEADING_ZERO = re.compile(r"\s*0\d")
+_SPACES = re.compile(r"\s+")
+_ID_NAME = re.compile(r"(^|_)[iI][dD]$|[a-z]Id$")
+
+_BOOLEAN_STRINGS = {"true", "false"}
+
+_TEXT_LENGTH = 50
+
+# fields of the columns by dtype kind, refined using the values
+_TEMPLATES = {
+    "b": {"data_type": "categorical", "data_subtype": "boolean"},
+    "i": {"data_type": "numerical", "data_subtype": "integer"},
+    "u": {"data_type": "numerical", "data_subtype": "integer"},
+    "f": {"data_type": "numerical", "data_subtype": "float"},
+    "M": {"data_type": "datetime"},
+    "O": {"data_type": "categorical"},
+    "S": {"data_type": "categorical"},
+    "U": {"data_type": "categorical"},
+}
+
+
+def sample(dataframe, sample_size=SAMPLE_SIZE, seed=0):
+    """Take a random sample of the rows of a DataFrame.
+
+    The positions of the rows are drawn with replacement, so that sampling
+    takes the same time whatever the size of the DataFrame, and then
+    deduplicated, so that the sample of a unique column is unique too. The
+    rows are kept in their original order.
+
+    Args:
+        dataframe (pandas.DataFrame): The DataFrame.
+        sample_size (int, optional): The maximum number of rows. If None,
+            or if the DataFrame is not larger, it is returned as it is.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        pandas.DataFrame: The sample.
+    """
+    if sample_size is None or len(dataframe) <= sample_size:
+        return dataframe
+    rows = np.random.RandomState(seed).randint(0, len(dataframe), sample_size)
+    return dataframe.iloc[np.unique(rows)]
+
+
+def is_id_name(name):
+    """Tell whether the name of a column looks like the name of an id."""
+    return isinstance(name, str) and bool(_ID_NAME.search(name))
+
+
+def _is_unique(values):
+    return len(pd.unique(values)) == len(values)
+
+
+def _infer_numbers(name, values, is_unique=None):
+    if values.dtype.kind == "f" and not np.all(np.mod(values, 1) == 0):
+        return {"data_type": "numerical", "data_subtype": "float"}
+    if is_id_name(name) and (_is_unique(values) if is_unique is None else is_unique):
+        return {"data_type": "id", "data_subtype": "integer"}
+    return {"data_type": "numerical", "data_subtype": "integer"}
+
+
+def _all_match(pattern, strings):
+    return all(pattern.match(string) for string in strings)
+
+
+def _infer_strings(name, values):
+    # the checks run in Python on the distinct values, which are usually
+    # few, and are weighted by their counts when it matters
+    codes, distinct = pd.factorize(values)
+    counts = np.bincount(codes)
+    strings = [str(value) for value in distinct]
+    is_unique = len(strings) == len(values)
+    if all(string.lower() in _BOOLEAN_STRINGS for string in strings):
+        return {"data_type": "categorical", "data_subtype": "boolean"}
+
+    # numbers with leading zeros, like zip codes, are kept as strings
+    if _all_match(_NUMBER, strings) and not any(map(_LEADING_ZERO.match, strings)):
+        numbers = pd.to_numeric(np.array(strings, dtype=object), errors="coerce")
+        if not np.isnan(numbers.astype(float)).any():
+            return _infer_numbers(name, numbers, is_unique)
+
+    if is_unique and (is_id_name(name) or _all_match(_UUID, strings)):
+        return {"data_type": "id"}
+
+    if _all_match(_DATETIME, strings):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            datetimes = pd.to_datetime(strings, errors="coerce")
+        if datetimes.notnull().all():
+            return {"data_type": "datetime"}
+
+    weights = counts / len(values)
+    if np.dot([len(string) for string in strings], weights) >= _TEXT_LENGTH:
+        return {"data_type": "text"}
+    if len(strings) > len(values) / 2:
+        words = [len(_SPACES.findall(string)) >= 2 for string in strings]
+        if np.dot(words, weights) > 0.5:
+            return {"data_type": "text"}
+    return {"data_type": "categorical"}
+
+
+def infer_field(name, values):
+    """Infer the metadata of a field from its values.
+
+    Args:
+        name (str): The name of the field.
+        values (pandas.Series): The values, usually a sample of them.
+
+    Returns:
+        dict: The field metadata, with its `name`, `data_type` and, for
+        numerical, boolean and integer id fields, `data_subtype`.
+    """
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        field = {"data_type": "categorical"}
+    elif dtype.kind not in _TEMPLATES:
+        # timedeltas, complex numbers, periods, intervals, ...
+        field = {"data_type": "other"}
+    else:
+        field = dict(_TEMPLATES[dtype.kind])
+        if values.hasnans:
+            values = values.dropna()
+        values = values.to_numpy()
+        if not len(values) or dtype.kind in "bM":
+            pass
+        elif dtype.kind in "iuf":
+            field = _infer_numbers(name, values)
+        elif pd.api.types.infer_dtype(values, skipna=False) == "boolean":
+            field = {"data_type": "categorical", "data_subtype": "boolean"}
+        else:
+            field = _infer_strings(name, values)
+
+    field["name"] = name
+    return field
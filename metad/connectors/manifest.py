@@ -0,0 +1,164 @@
+"""Manifest of the tables exported to a directory.
+
+An incremental export records what it wrote for each table in the manifest,
+`manifest.json` in the output directory:
+
+    * the `fingerprint` of the table in the database before it was read,
+      like its `CHECKSUM TABLE` or its `UPDATE_TIME`.
+    * the `path` of the file, relative to the directory, its `size` and
+      its `sha256` hash.
+    * the `number_of_rows` written and, when the table was profiled, the
+      `stats` of its fields.
+    * while a table split into key ranges is being exported, the ranges
+      and the number of rows of each one which is done.
+
+The manifest is replaced atomically after each table or key range, so an
+export which is interrupted resumes from the last one which was completed,
+with the same key ranges. A table is skipped when its fingerprint didn't
+change and its file is still the one which was written, with the same size
+and hash. A table which changes while it is read gets the fingerprint from
+before, so it is exported again the next time.
+"""
+import hashlib
+import os
+
+from metad import jsonio
+
+MANIFEST = "manifest.json"
+
+VERSION = 1
+
+_BLOCK_SIZE = 1 << 20
+
+
+def file_hash(path):
+    """Get the SHA-256 hash of a file, as a hexadecimal string."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _range_key(key_range):
+    return "%s-%s" % tuple(key_range)
+
+
+class ExportManifest():
+    """The manifest of an output directory.
+
+    Args:
+        path_to_output (str): The output directory. The manifest which is
+            already there, if any, is loaded.
+    """
+
+    def __init__(self, path_to_output):
+        self.path_to_output = path_to_output
+        self.path = os.path.join(path_to_output, MANIFEST)
+        self.tables = {}
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as fin:
+                data = jsonio.loads(fin.read())
+            # the manifests of other versions are ignored, exporting everything
+            if data.get("version") == VERSION:
+                self.tables = data["tables"]
+
+    def _entry(self, table_name, fingerprint):
+        entry = self.tables.get(table_name)
+        if fingerprint is None or entry is None or entry["fingerprint"] != fingerprint:
+            return None
+        return entry
+
+    def restore(self, table, fingerprint, path, profile=False):
+        """Restore the results of a table which didn't change since it was exported.
+
+        Args:
+            table (dict): The table metadata, which receives the recorded
+                `number_of_rows` and `stats`.
+            fingerprint (dict): The current fingerprint of the table, or
+                None if it is unknown.
+            path (str): The path of the file of the table, relative to the
+                output directory.
+            profile (bool): Whether the statistics of the fields are needed.
+
+        Returns:
+            bool: Whether the table can be skipped.
+        """
+        entry = self._entry(table["name"], fingerprint)
+        if entry is None or entry.get("path") != path or (profile and "stats" not in entry):
+            return False
+        path_to_file = os.path.join(self.path_to_output, path)
+        if not os.path.exists(path_to_file) or os.path.getsize(path_to_file) != entry["size"]:
+            return False
+        # the files which were modified in place keep their size
+        if file_hash(path_to_file) != entry["sha256"]:
+            return False
+
+        table["number_of_rows"] = entry["number_of_rows"]
+        for field in table["fields"]:
+            if field["name"] in entry.get("stats", {}):
+                field["stats"] = entry["stats"][field["name"]]
+        return True
+
+    def key_ranges(self, table_name, fingerprint):
+        """Get the key ranges of a table whose export was interrupted.
+
+        Returns:
+            list: The (start, stop) tuples of the ranges, or None if the
+            export of the table didn't start with this fingerprint.
+        """
+        entry = self._entry(table_name, fingerprint)
+        if entry is None or "ranges" not in entry:
+            return None
+        return [tuple(key_range) for key_range in entry["ranges"]]
+
+    def record_key_ranges(self, table_name, fingerprint, key_ranges):
+        """Record the key ranges of a table which starts to be exported."""
+        self.tables[table_name] = {
+            "fingerprint": fingerprint,
+            "ranges": [list(key_range) for key_range in key_ranges],
+            "parts": {},
+        }
+        self.save()
+
+    def part(self, table_name, fingerprint, key_range, path_to_part):
+        """Get the number of rows of a key range which was already exported.
+
+        Returns:
+            int: The number of rows, or None if the range must be exported.
+        """
+        entry = self._entry(table_name, fingerprint)
+        if entry is None or not os.path.exists(path_to_part):
+            return None
+        return entry.get("parts", {}).get(_range_key(key_range))
+
+    def record_part(self, table_name, fingerprint, key_range, number_of_rows):
+        """Record that a key range of a table was exported."""
+        entry = self._entry(table_name, fingerprint)
+        if entry is None or "parts" not in entry:
+            entry = self.tables[table_name] = {"fingerprint": fingerprint, "parts": {}}
+        entry["parts"][_range_key(key_range)] = number_of_rows
+        self.save()
+
+    def record(self, table, fingerprint, path):
+        """Record that a table was exported, with its file and results."""
+        path_to_file = os.path.join(self.path_to_output, path)
+        entry = {
+            "fingerprint": fingerprint,
+            "path": path,
+            "size": os.path.getsize(path_to_file),
+            "sha256": file_hash(path_to_file),
+            "number_of_rows": table["number_of_rows"],
+        }
+        stats = {field["name"]: field["stats"] for field in table["fields"] if "stats" in field}
+        if stats:
+            entry["stats"] = stats
+        self.tables[table["name"]] = entry
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically."""
+        path_to_temporary = self.path + ".tmp"
+        with open(path_to_temporary, "wt", encoding="utf-8") as fout:
+            fout.write(jsonio.dumps({"version": VERSION, "tables": self.tables}))
+        os.replace(path_to_temporary, self.path)
@@ -1,11 +1,130 @@
 import os
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy as np
 import pandas as pd
 import pymysql
 
 from metad import MetaData
+from metad.connectors import profiling
 from metad.connectors.base import BaseConnector
+from metad.connectors.manifest import ExportManifest
+from metad.formats import OutputFormat
+
+CHANGE_DETECTIONS = ("checksum", "update_time")
+
+# the number of values, or of ranges, in the queries of the subsets
+LOOKUP_BATCH_SIZE = 1000
+
+# consecutive integer keys are selected by a range from this many keys on
+_MIN_RANGE = 16
+
+
+def _dataframe(rows, column_names, fields):
+    """Build a DataFrame from fetched rows, with the types of their fields.
+
+    The types which pandas infers depend on the values, so the chunks of a
+    table would be written differently: integers become floats in the chunks
+    with a missing value, and datetimes lose their time in the chunks where
+    they are all at midnight. The types are inferred by pandas, and only the
+    columns which would be written differently are converted: the integer
+    fields with missing values get the nullable integer type, and the
+    datetimes which pandas doesn't write like their `str` are kept as they
+    are fetched, so every value is written the same way whichever chunk it
+    is in. The boolean fields, whose bit(1) columns are fetched as bytes,
+    get the nullable boolean type.
+
+    Args:
+        rows (list): The rows, as tuples.
+        column_names (list): The names of the columns.
+        fields (dict): The field metadata, by name.
+
+    Returns:
+        pandas.DataFrame: The rows.
+    """
+    dataframe = pd.DataFrame(list(rows), columns=column_names)
+    for position, (name, dtype) in enumerate(zip(column_names, dataframe.dtypes.tolist())):
+        field = fields.get(name, {})
+        if field.get("data_subtype") == "integer":
+            if dtype.kind not in "iu":
+                dataframe[name] = _integers([row[position] for row in rows])
+        elif field.get("data_subtype") == "boolean":
+            if dtype.kind != "b":
+                dataframe[name] = _booleans([row[position] for row in rows])
+        elif field.get("data_type") == "datetime":
+            if dtype.kind != "M" or not _is_written_like_str(dataframe[name]):
+                dataframe[name] = pd.Series([row[position] for row in rows], dtype=object)
+    return dataframe
+
+
+def _integers(values):
+    try:
+        return pd.array(values, dtype="Int64")
+    except (TypeError, OverflowError):
+        # unsigned values above the range of int64
+        return pd.Series(values, dtype=object)
+
+
+def _is_written_like_str(column):
+    # pandas writes the datetimes like their str, with their time and without
+    # microseconds, unless they are all at midnight or some have microseconds
+    values = column.to_numpy()
+    values = values[~np.isnat(values)]
+    return bool((values.astype("datetime64[s]") == values).all()
+                and (values.astype("datetime64[D]") != values).any())
+
+
+def _booleans(values):
+    # the bit(1) columns are fetched as b"\x00" or b"\x01"
+    return pd.array([
+        value == b"\x01" if isinstance(value, bytes) else value
+        for value in values
+    ], dtype="boolean")
+
+
+def _python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _is_integer(values):
+    kind = values.dtype.kind
+    return kind in "iu" or (kind == "f" and bool(np.all(np.mod(values, 1) == 0)))
+
+
+def _lookup_conditions(columns, values):
+    """Get the conditions which select the rows with some values, in batches.
+
+    The values of a single integer column which are consecutive are selected
+    by ranges, and the other values by `IN` lists.
+
+    Yields:
+        tuple: The condition and its arguments.
+    """
+    names = ", ".join("`%s`" % column for column in columns)
+    if len(columns) == 1 and _is_integer(values[columns[0]]):
+        numbers = np.unique(values[columns[0]].to_numpy().astype(np.int64))
+        runs = np.split(numbers, np.flatnonzero(np.diff(numbers) != 1) + 1)
+        ranges = [(int(run[0]), int(run[-1])) for run in runs if len(run) >= _MIN_RANGE]
+        for start in range(0, len(ranges), LOOKUP_BATCH_SIZE):
+            batch = ranges[start:start + LOOKUP_BATCH_SIZE]
+            yield (" or ".join(["%s between %%s and %%s" % names] * len(batch)),
+                   [bound for key_range in batch for bound in key_range])
+        keys = [(int(number), ) for run in runs if len(run) < _MIN_RANGE for number in run]
+    else:
+        keys = [
+            tuple(_python(value) for value in row)
+            for row in values[columns].itertuples(index=False, name=None)
+        ]
+
+    placeholder = ", ".join(["%s"] * len(columns))
+    if len(columns) > 1:
+        names, placeholder = "(%s)" % names, "(%s)" % placeholder
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        batch = keys[start:start + LOOKUP_BATCH_SIZE]
+        yield ("%s in (%s)" % (names, ", ".join([placeholder] * len(batch))),
+               [value for key in batch for value in key])
 
 
 class MySQLConnector(BaseConnector):
@@ -16,7 +135,9 @@ class MySQLConnector(BaseConnector):
     constraints from the schema table.
     """
 
-    def __init__(self, host, port, user, password, database):
+    def __init__(self, host, port, user, password, database, chunk_size=None, max_workers=1,
+                 partition_rows=None, profile=False, incremental=False,
+                 change_detection="checksum", connection_factory=None):
         """Create a new MySQLConnector.
 
         Args:
@@ -25,51 +146,409 @@ class MySQLConnector(BaseConnector):
             user (str): The username for accessing the instance.
             password (str): The password for accessing the instance.
             database (str): The name of the database to export.
+            chunk_size (int, optional): If given, the tables are exported
+            through an unbuffered server-side cursor and written to the CSV
+            files this many rows at a time, so the memory usage does not
+            depend on the size of the tables. By default, each table is
+            fetched at once.
+            max_workers (int): The number of tables which are exported
+            concurrently, each one through its own connection (default: 1).
+            partition_rows (int, optional): If given, tables with more rows
+            than this and a single integer primary key are split into
+            primary key ranges of about this many rows, which are exported
+            concurrently and then concatenated in key order. Tables without
+            such a key are read in a single scan. Requires `max_workers`
+            above 1.
+            profile (bool): Whether to compute the statistics of the values
+            of each field while the tables are exported, stored in its
+            `stats` (see `metad.connectors.profiling`). The profiles of the
+            key ranges of a table are merged. Defaults to False.
+            incremental (bool): Whether to keep a manifest of the exported
+            tables in the output directory (see
+            `metad.connectors.manifest`), skip the tables which didn't
+            change since they were exported there and resume an interrupted
+            export from the last table, or key range, which was completed.
+            Defaults to False.
+            change_detection (str): How the changes of the tables are
+            detected by incremental exports: `checksum` (default) compares
+            the result of `CHECKSUM TABLE`, which reads the tables on the
+            server but is exact, and `update_time` their `UPDATE_TIME`, which
+            is free but unknown for the tables which the server doesn't track
+            and which are then always exported.
+            connection_factory (callable, optional): Called without arguments
+            to open each connection to the instance, instead of
+            `pymysql.connect` with the arguments above.
+
+        Raises:
+            ValueError: If the change detection method is not supported, or
+                if `partition_rows` is given without `max_workers`.
         """
+        if change_detection not in CHANGE_DETECTIONS:
+            raise ValueError("Unknown change detection %s, expected one of %s" % (
+                change_detection, ", ".join(CHANGE_DETECTIONS)))
+        if partition_rows and max_workers <= 1:
+            # the key ranges are only read by the concurrent export
+            raise ValueError("partition_rows requires max_workers above 1")
         super().__init__()
         self.database = database
-        self.db = pymysql.connect(
-            host=host,
-            port=port,
-            user=user,
-            passwd=password,
-            db=database,
-            charset='utf8'
-        )
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.partition_rows = partition_rows
+        self.profile = profile
+        self.incremental = incremental
+        self.change_detection = change_detection
+        self._connection_args = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "passwd": password,
+            "db": database,
+            "charset": 'utf8'
+        }
+        self._connection_factory = connection_factory
+        self.db = self._connect()
         self._load_metadata()
 
     def __del__(self):
-        self.db.close()
+        # no connection is opened when the arguments are invalid
+        if hasattr(self, "db"):
+            self.db.close()
+
+    def _connect(self):
+        if self._connection_factory is not None:
+            return self._connection_factory()
+        return pymysql.connect(**self._connection_args)
 
     def _load_metadata(self):
         cursor = self.db.cursor(pymysql.cursors.DictCursor)
         self.metadata = MetaData()
-        self.metadata.set_tables(self._tables(cursor))
-        self.metadata.set_foreign_keys(self._foreign_keys(cursor))
+        with self.metadata.batch():
+            for table in self._tables(cursor):
+                self.metadata.add_table(table, deepcopy=False)
+            for foreign_key in self._foreign_keys(cursor):
+                self.metadata.add_foreign_key(foreign_key, deepcopy=False)
         cursor.close()
 
     def export_metadata(self, path_to_json):
-        self.metadata.to_json(path_to_json)
+        self.metadata.to_json(path_to_json + ".tmp")
+        os.replace(path_to_json + ".tmp", path_to_json)
+
+    def export_tables(self, path_to_output, format="csv", compression=None):
+        """Write the tables to files, each one replaced atomically when it is complete.
+
+        When the export is `incremental`, the tables which didn't change
+        since they were exported to the same files are skipped, and the
+        others are recorded in the manifest as soon as they are written.
+        """
+        output_format = OutputFormat(format, compression)
+        tables = self.metadata.data["tables"]
+        manifest, fingerprints = None, {}
+        if self.incremental:
+            manifest = ExportManifest(path_to_output)
+            fingerprints = self._fingerprints()
+            tables = [
+                table for table in tables
+                if not manifest.restore(table, fingerprints.get(table["name"]),
+                                        output_format.file_name(table["name"]), self.profile)
+            ]
+
+        if self.max_workers <= 1:
+            for table in tables:
+                file_name = output_format.file_name(table["name"])
+                table["number_of_rows"], table_profile = self._export_table(
+                    self.db, output_format, table, os.path.join(path_to_output, file_name))
+                if table_profile is not None:
+                    table_profile.store(table)
+                if manifest is not None:
+                    manifest.record(table, fingerprints.get(table["name"]), file_name)
+            return
+
+        self._export_concurrently(output_format, tables, path_to_output, manifest, fingerprints)
+
+    def _export_concurrently(self, output_format, tables, path_to_output, manifest,
+                             fingerprints):
+        # Start with the largest tables so that they don't end up running
+        # alone after all the small ones are done.
+        statistics = self._table_statistics()
+        tables = sorted(
+            tables,
+            key=lambda table: statistics.get(table["name"], (0, 0))[0],
+            reverse=True
+        )
+
+        # the tasks of each table which are not done, its parts and results
+        tasks, states = [], {}
+        for table in tables:
+            path_to_file = os.path.join(path_to_output, output_format.file_name(table["name"]))
+            fingerprint = fingerprints.get(table["name"])
+            state = states[table["name"]] = {
+                "remaining": 0, "number_of_rows": 0, "profile": None, "parts": []}
+            number_of_rows = statistics.get(table["name"], (0, 0))[1]
+            # an interrupted export resumes with its ranges, since the
+            # estimate of the number of rows may have changed
+            key_ranges = None
+            if manifest is not None:
+                key_ranges = manifest.key_ranges(table["name"], fingerprint)
+            if key_ranges is None:
+                key_ranges = self._key_ranges(table, number_of_rows)
+                if key_ranges and manifest is not None and fingerprint is not None:
+                    manifest.record_key_ranges(table["name"], fingerprint, key_ranges)
+            if not key_ranges:
+                tasks.append((output_format, table, path_to_file, None, True))
+                state["remaining"] = 1
+                continue
+
+            for i, key_range in enumerate(key_ranges):
+                path_to_part = "%s.part%s" % (path_to_file, i)
+                state["parts"].append(path_to_part)
+                # the profile of a table needs all its rows to be read again
+                done = None
+                if manifest is not None and not self.profile:
+                    done = manifest.part(table["name"], fingerprint, key_range, path_to_part)
+                if done is None:
+                    tasks.append((output_format, table, path_to_part, key_range, i == 0))
+                    state["remaining"] += 1
+                else:
+                    state["number_of_rows"] += done
+
+        def finish(table):
+            state = states[table["name"]]
+            file_name = output_format.file_name(table["name"])
+            if state["parts"]:
+                path_to_file = os.path.join(path_to_output, file_name)
+                output_format.concatenate(state["parts"], path_to_file + ".tmp", table)
+                os.replace(path_to_file + ".tmp", path_to_file)
+                for path_to_part in state["parts"]:
+                    os.remove(path_to_part)
+            table["number_of_rows"] = state["number_of_rows"]
+            if state["profile"] is not None:
+                state["profile"].store(table)
+            if manifest is not None:
+                manifest.record(table, fingerprints.get(table["name"]), file_name)
 
-    def export_tables(self, path_to_output):
-        for table in self.metadata.data["tables"]:
-            cursor = self.db.cursor(pymysql.cursors.Cursor)
-            cursor.execute("select * from `" + table["name"] + "`;")
+        for table in tables:
+            if not states[table["name"]]["remaining"]:
+                finish(table)
+
+        local = threading.local()
+        connections = []
+
+        def export_table(task):
+            if not hasattr(local, "db"):
+                local.db = self._connect()
+                connections.append(local.db)
+            return self._export_table(local.db, *task)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(export_table, task): task for task in tasks}
+                # the results are gathered, and the tables finished, as they come
+                for future in as_completed(futures):
+                    _, table, _, key_range, _ = futures[future]
+                    try:
+                        number_of_rows, table_profile = future.result()
+                    except BaseException:
+                        # don't start the tasks which are left
+                        for other in futures:
+                            other.cancel()
+                        raise
+                    state = states[table["name"]]
+                    state["number_of_rows"] += number_of_rows
+                    if table_profile is not None:
+                        if state["profile"] is not None:
+                            table_profile = state["profile"].merge(table_profile)
+                        state["profile"] = table_profile
+                    if manifest is not None and key_range is not None:
+                        manifest.record_part(table["name"], fingerprints.get(table["name"]),
+                                             key_range, number_of_rows)
+                    state["remaining"] -= 1
+                    if not state["remaining"]:
+                        finish(table)
+        finally:
+            for db in connections:
+                db.close()
+
+    def _fingerprints(self):
+        """Get what identifies the content of each table, to detect its changes.
+
+        Returns:
+            dict: The fingerprint of each table, by name, as a dictionary
+            with its `checksum` or its `update_time`, or None if the server
+            doesn't know it.
+        """
+        table_names = [table["name"] for table in self.metadata.data["tables"]]
+        if not table_names:
+            return {}
+
+        cursor = self.db.cursor(pymysql.cursors.Cursor)
+        if self.change_detection == "checksum":
+            cursor.execute("CHECKSUM TABLE %s;" % ", ".join(
+                "`%s`" % table_name for table_name in table_names))
+            # the tables are named `database.table`
+            fingerprints = {
+                table_name[len(self.database) + 1:]:
+                    None if checksum is None else {"checksum": checksum}
+                for table_name, checksum in cursor.fetchall()
+            }
+        else:
+            cursor.execute("""
+                SELECT TABLE_NAME, UPDATE_TIME
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = %s""", (self.database, ))
+            fingerprints = {
+                table_name: None if update_time is None else {
+                    "update_time": update_time.isoformat()}
+                for table_name, update_time in cursor.fetchall()
+            }
+        cursor.close()
+        return fingerprints
+
+    def _query(self, table, query, args=None):
+        # the rows get the types of the fields, like those of the export
+        cursor = self.db.cursor(pymysql.cursors.Cursor)
+        cursor.execute(query, args)
+        column_names = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        cursor.close()
+        fields = {field["name"]: field for field in table["fields"]}
+        return _dataframe(rows, column_names, fields)
+
+    def sample_rows(self, table, fraction=None, size=None, seed=0):
+        # the sequence of RAND(seed) is the same in every query
+        if fraction is not None:
+            return self._query(
+                table, "select * from `%s` where rand(%%s) < %%s;" % table["name"],
+                (seed, fraction))
+        return self._query(
+            table, "select * from `%s` order by rand(%%s) limit %%s;" % table["name"],
+            (seed, size))
+
+    def lookup_rows(self, table, columns, values):
+        chunks = [
+            self._query(table, "select * from `%s` where %s;" % (table["name"], condition), args)
+            for condition, args in _lookup_conditions(columns, values)
+        ]
+        if not chunks:
+            return pd.DataFrame(columns=[field["name"] for field in table["fields"]])
+        return pd.concat(chunks, ignore_index=True)
+
+    def _table_statistics(self):
+        cursor = self.db.cursor(pymysql.cursors.Cursor)
+        cursor.execute("""
+            SELECT TABLE_NAME, DATA_LENGTH, TABLE_ROWS
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s""", (self.database, ))
+        statistics = {
+            table_name: (size or 0, number_of_rows or 0)
+            for table_name, size, number_of_rows in cursor.fetchall()
+        }
+        cursor.close()
+        return statistics
+
+    def _key_ranges(self, table, number_of_rows):
+        """Split a table into ranges of its primary key.
+
+        Tables are only split if they have an estimated number of rows above
+        `partition_rows` and a primary key made of a single integer field.
+
+        Returns:
+            list: The (start, stop) tuples of the key ranges, where `stop`
+            is exclusive, or None if the table should be read in one scan.
+        """
+        primary_key = table.get("primary_key")
+        if not self.partition_rows or number_of_rows <= self.partition_rows:
+            return None
+        if not isinstance(primary_key, str):
+            return None
+
+        cursor = self.db.cursor(pymysql.cursors.Cursor)
+        cursor.execute("select min(`%s`), max(`%s`) from `%s`;" % (
+            primary_key, primary_key, table["name"]))
+        low, high = cursor.fetchone()
+        cursor.close()
+        if not isinstance(low, int) or not isinstance(high, int):
+            return None
+
+        number_of_ranges = min(-(-number_of_rows // self.partition_rows), high - low + 1)
+        step = -(-(high - low + 1) // number_of_ranges)
+        return [(start, min(start + step, high + 1)) for start in range(low, high + 1, step)]
+
+    def _export_table(self, db, output_format, table, path_to_file, key_range=None, header=True):
+        """Export a table, or a range of its primary key, to a file.
+
+        Returns:
+            tuple: The number of rows written and, if `profile` is set, the
+            `TableProfile` of the rows.
+        """
+        if self.chunk_size:
+            cursor = db.cursor(pymysql.cursors.SSCursor)
+        else:
+            cursor = db.cursor(pymysql.cursors.Cursor)
+
+        # the file is written aside and replaced once complete, so that an
+        # interrupted export never leaves a truncated file
+        path_to_temporary = path_to_file + ".tmp"
+        try:
+            if key_range:
+                primary_key = table["primary_key"]
+                cursor.execute(
+                    "select * from `%s` where `%s` >= %%s and `%s` < %%s order by `%s`;" % (
+                        table["name"], primary_key, primary_key, primary_key),
+                    key_range
+                )
+            else:
+                cursor.execute("select * from `" + table["name"] + "`;")
             column_names = [column[0] for column in cursor.description]
-            rows = [list(row) for row in cursor.fetchall()]
-            df = pd.DataFrame(rows, columns=column_names)
-            df.to_csv(
-                os.path.join(
-                    path_to_output,
-                    "%s.csv" %
-                    table["name"]),
-                index=False)
+            fields = {field["name"]: field for field in table["fields"]}
+
+            writer = output_format.open(path_to_temporary, table, header=header)
+            try:
+                table_profile = profiling.TableProfile() if self.profile else None
+                first = True
+                while True:
+                    if self.chunk_size:
+                        rows = cursor.fetchmany(self.chunk_size)
+                    else:
+                        rows = cursor.fetchall()
+                    if not rows and not first:
+                        break
+
+                    dataframe = _dataframe(rows, column_names, fields)
+                    writer.write(dataframe)
+                    if table_profile is not None:
+                        table_profile.update(dataframe)
+                    first = False
+                    if not self.chunk_size:
+                        break
+            finally:
+                writer.close()
+        except BaseException:
+            if os.path.exists(path_to_temporary):
+                os.remove(path_to_temporary)
+            raise
+        finally:
+            # an unbuffered cursor reads the rows which are left when closed,
+            # so that the connection can be used again
             cursor.close()
 
+        os.replace(path_to_temporary, path_to_file)
+        return writer.number_of_rows, table_profile
+
     def _tables(self, cursor):
+        # Fetch the columns of all the tables at once instead of issuing
+        # one query per table.
+        cursor.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_TYPE, COLUMN_KEY
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE table_schema = %s
+            ORDER BY TABLE_NAME, ORDINAL_POSITION""", (self.database, ))
+        columns = defaultdict(list)
+        for row in cursor.fetchall():
+            columns[row["TABLE_NAME"]].append(row)
+
         tables = []
         for table_name in self._table_names(cursor):
-            table_metadata = self._table_metadata(cursor, table_name)
+            table_metadata = self._table_metadata(table_name, columns[table_name])
             table_metadata["id"] = table_name  # table names are unique
             tables.append(table_metadata)
         return tables
@@ -122,18 +601,11 @@ class MySQLConnector(BaseConnector):
             table_names.append(list(row.values())[0])
         return table_names
 
-    def _table_metadata(self, cursor, table_name):
-        cursor.execute("""
-            SELECT *
-            FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE
-                table_name = '%s' AND
-                table_schema = '%s'
-            ORDER BY ORDINAL_POSITION""" % (table_name, self.database))
+    def _table_metadata(self, table_name, columns):
         fields = []
         primary_key = []
-        for row in cursor.fetchall():
-            data_type = self._get_dtype(row["DATA_TYPE"]).copy()
+        for row in columns:
+            data_type = self._get_dtype(row["DATA_TYPE"], row["COLUMN_TYPE"]).copy()
             if row["COLUMN_KEY"] == "PRI":
                 primary_key.append(row["COLUMN_NAME"])
             data_type["name"] = row["COLUMN_NAME"]
@@ -154,13 +626,14 @@ class MySQLConnector(BaseConnector):
             "fields": fields
         }
 
-    def _get_dtype(self, mysql_dtype):
-        if mysql_dtype in set(["int", "tinyint", "smallint"]):
+    def _get_dtype(self, mysql_dtype, column_type=None):
+        if mysql_dtype in set(["int", "tinyint", "smallint", "mediumint", "bigint"]):
             return {
                 'data_type': 'numerical',
                 'data_subtype': 'integer',
             }
-        if mysql_dtype in set(["bit", "binary"]):
+        # a single bit is a flag, wider bits and binary strings are other data
+        if mysql_dtype == "bit" and column_type in (None, "bit(1)"):
             return {
                 'data_type': 'categorical',
                 'data_subtype': 'boolean',
@@ -174,7 +647,7 @@ class MySQLConnector(BaseConnector):
             return {
                 'data_type': 'datetime',
             }
-        if mysql_dtype in set(["float", "double", "bigint", "mediumint", "decimal"]):
+        if mysql_dtype in set(["float", "double", "decimal"]):
             return {
                 'data_type': 'numerical',
                 'data_subtype': 'float',
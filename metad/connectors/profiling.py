@@ -0,0 +1,370 @@
+"""Statistics of the values of the fields of a table.
+
+The statistics of each column are computed in a single pass over the rows,
+chunk by chunk, by a `ColumnProfile`, and stored in the `stats` of the
+field. Profiles only keep a bounded summary of the values, so the memory
+they take doesn't depend on the number of rows, and profiles of different
+parts of a table can be merged, for instance when the parts are read by
+parallel workers:
+
+    * the number of null and non-null values, and the smallest and largest
+      value (datetimes in ISO 8601 format), are exact.
+    * the number of distinct values is estimated with HyperLogLog, with a
+      relative error of about 1.6% using 4 KiB per column.
+    * the most frequent values are tracked with the Misra-Gries algorithm,
+      whose counts are lower bounds of the true ones, off by less than the
+      number of values divided by the number of counters.
+    * the minimum, maximum and mean length of strings are exact.
+"""
+import datetime
+import decimal
+import heapq
+
+import numpy as np
+import pandas as pd
+
+TOP_K = 10
+
+# the number of values tracked to find the top ones
+_COUNTERS = 100
+
+# 2 ** 12 registers of 6 bits, stored as bytes
+HLL_PRECISION = 12
+
+# the floats which hold integers are cast to int64 within its range
+_INT64_MIN = float(np.iinfo(np.int64).min)
+
+
+class HyperLogLog():
+    """Estimate the number of distinct values of 64-bit hashes.
+
+    Args:
+        precision (int): The base 2 logarithm of the number of registers.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        """Add the hashes of some values, as a numpy array of uint64."""
+        if not len(hashes):
+            return
+        bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # the position of the leftmost 1 in the remaining bits
+        _, exponents = np.frexp(rest.astype(np.float64))
+        ranks = np.where(rest == 0, bits + 1, bits - exponents + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        assert self.precision == other.precision, "Different HyperLogLog precisions"
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Get the estimated number of distinct values."""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * size and empty:
+            # linear counting is more accurate for small cardinalities
+            estimate = size * np.log(size / empty)
+        return int(round(estimate))
+
+
+class TopValues():
+    """Track the most frequent values with the Misra-Gries algorithm.
+
+    Args:
+        counters (int): The number of values which are tracked.
+    """
+
+    def __init__(self, counters=_COUNTERS):
+        self.counters = counters
+        self.counts = {}
+
+    def update(self, counts):
+        """Add the number of occurrences of some values, as a dict."""
+        for value, count in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self._prune()
+
+    def update_arrays(self, values, counts):
+        """Add the number of occurrences of some values, as numpy arrays.
+
+        The counts are summarized the same way before they are added, which
+        keeps the error bound of the merged summary, so that only a bounded
+        number of values are converted to Python objects.
+
+        Args:
+            values (numpy.ndarray): The distinct values.
+            counts (numpy.ndarray): The number of occurrences of each value.
+        """
+        if len(counts) > self.counters:
+            excess = np.partition(counts, len(counts) - self.counters - 1)[
+                len(counts) - self.counters - 1]
+            kept = counts > excess
+            values, counts = values[kept], counts[kept] - excess
+        self.update(dict(zip(list(values), counts.tolist())))
+
+    def _prune(self):
+        if len(self.counts) <= self.counters:
+            return
+        # subtracting the count of the first value which doesn't fit keeps
+        # every count a lower bound of the true one
+        excess = heapq.nlargest(self.counters + 1, self.counts.values())[-1]
+        self.counts = {
+            value: count - excess for value, count in self.counts.items() if count > excess
+        }
+
+    def merge(self, other):
+        self.update(other.counts)
+        return self
+
+    def top(self, k=TOP_K):
+        """Get the k most frequent values, as (value, count) tuples."""
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+
+def _to_python(value):
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+def _to_json(value):
+    value = _to_python(value)
+    if isinstance(value, (pd.Timestamp, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, float) and not np.isfinite(value):
+        # JSON has no infinite values
+        return str(value)
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class ColumnProfile():
+    """The statistics of the values of a column.
+
+    Args:
+        top_k (int): The number of most frequent values which are reported.
+        precision (int): The precision of the HyperLogLog estimator.
+    """
+
+    def __init__(self, top_k=TOP_K, precision=HLL_PRECISION):
+        self.top_k = top_k
+        self.count = 0
+        self.null_count = 0
+        self.min = None
+        self.max = None
+        self.lengths = None
+        self.distinct = HyperLogLog(precision)
+        self.top_values = TopValues(max(_COUNTERS, top_k * 10))
+
+    def update(self, values):
+        """Add the values of a chunk of rows.
+
+        Args:
+            values (pandas.Series): The values.
+        """
+        dtype = values.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in "biufM":
+            self._update_array(values.to_numpy())
+        elif dtype.kind in "biu" and hasattr(dtype, "numpy_dtype"):
+            # nullable integers and booleans
+            missing = values.isna().to_numpy()
+            self.null_count += int(np.count_nonzero(missing))
+            self._update_array(values[~missing].to_numpy(dtype=dtype.numpy_dtype))
+        else:
+            self._update_objects(values)
+
+    def _update_array(self, array):
+        # numbers, booleans and datetimes, without the overhead of pandas
+        kind = array.dtype.kind
+        if kind in "fM":
+            present = ~np.isnat(array) if kind == "M" else ~np.isnan(array)
+            self.null_count += len(array) - int(np.count_nonzero(present))
+            array = array[present]
+        if not len(array):
+            return
+        self.count += len(array)
+        if kind == "f":
+            # the infinite values are counted, but they have no place in the
+            # range, which is written to JSON, nor in the sketches
+            array = array[np.isfinite(array)]
+            if not len(array):
+                return
+
+        low, high = array.min(), array.max()
+        in_range = kind == "f" and _INT64_MIN <= low and high < -_INT64_MIN
+        if in_range and np.all(np.mod(array, 1) == 0):
+            # integers stored as floats because of missing values
+            array = array.astype("int64")
+            low, high = array.min(), array.max()
+
+        self._update_range(low, high)
+        hashable = array
+        if kind == "M":
+            hashable = array.view("int64")
+        elif kind == "b":
+            hashable = array.astype("int64")
+        self.distinct.update(pd.util.hash_array(hashable, categorize=False))
+        self.top_values.update_arrays(*np.unique(array, return_counts=True))
+
+    def _update_objects(self, values):
+        present = values.notnull()
+        count = int(present.sum())
+        self.null_count += len(values) - count
+        if not count:
+            return
+        self.count += count
+        values = values[present]
+        inferred = pd.api.types.infer_dtype(values, skipna=False)
+        if inferred != "string":
+            values = values.map(_to_python)
+
+        try:
+            self._update_range(values.min(), values.max())
+        except TypeError:
+            # values of different types which can't be compared
+            pass
+        self.distinct.update(pd.util.hash_array(
+            np.asarray(values.astype(str), dtype=object), categorize=False))
+        counts = values.value_counts()
+        self.top_values.update_arrays(counts.index.to_numpy(dtype=object), counts.to_numpy())
+        if inferred == "string":
+            lengths = values.str.len()
+            self._update_lengths(
+                int(lengths.min()), int(lengths.max()), int(lengths.sum()), count)
+
+    def _update_range(self, low, high):
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+
+    def _update_lengths(self, low, high, total, count):
+        if self.lengths is None:
+            self.lengths = [low, high, 0, 0]
+        self.lengths = [min(self.lengths[0], low), max(self.lengths[1], high),
+                        self.lengths[2] + total, self.lengths[3] + count]
+
+    def merge(self, other):
+        """Add the statistics of another profile of the same column.
+
+        Returns:
+            ColumnProfile: This profile.
+        """
+        self.count += other.count
+        self.null_count += other.null_count
+        if other.count and other.min is not None:
+            try:
+                self._update_range(other.min, other.max)
+            except TypeError:
+                pass
+        if other.lengths is not None:
+            self._update_lengths(*other.lengths)
+        self.distinct.merge(other.distinct)
+        self.top_values.merge(other.top_values)
+        return self
+
+    def to_dict(self):
+        """Get the statistics, as the `stats` of a field of the metadata."""
+        stats = {"count": self.count, "null_count": self.null_count}
+        if not self.count:
+            return stats
+
+        stats["distinct_count"] = min(self.distinct.estimate(), self.count)
+        for key, value in (("min", self.min), ("max", self.max)):
+            if value is not None:
+                stats[key] = _to_json(value)
+        # values seen once are not frequent, whichever they are
+        stats["top_values"] = [
+            {"value": _to_json(value), "count": int(count)}
+            for value, count in self.top_values.top(self.top_k) if count > 1
+        ]
+        if self.lengths is not None:
+            stats["length"] = {
+                "min": self.lengths[0],
+                "max": self.lengths[1],
+                "mean": round(self.lengths[2] / self.lengths[3], 3),
+            }
+        return stats
+
+
+class TableProfile():
+    """The profiles of the columns of a table.
+
+    Args:
+        top_k (int): The number of most frequent values which are reported.
+    """
+
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.columns = {}
+
+    def update(self, dataframe):
+        """Add a chunk of the rows of the table.
+
+        Args:
+            dataframe (pandas.DataFrame): The rows.
+        """
+        for column, values in dataframe.items():
+            if column not in self.columns:
+                self.columns[column] = ColumnProfile(self.top_k)
+            self.columns[column].update(values)
+
+    def merge(self, other):
+        """Add the profiles of another part of the table.
+
+        Returns:
+            TableProfile: This profile.
+        """
+        for column, profile in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(profile)
+            else:
+                self.columns[column] = profile
+        return self
+
+    def store(self, table):
+        """Store the statistics in the `stats` of the fields of a table.
+
+        Args:
+            table (dict): The table metadata.
+        """
+        for field in table["fields"]:
+            if field["name"] in self.columns:
+                field["stats"] = self.columns[field["name"]].to_dict()
+
+
+def profile(dataframe, table, chunk_size=None, top_k=TOP_K):
+    """Profile the rows of a table and store the statistics of its fields.
+
+    Args:
+        dataframe (pandas.DataFrame): The rows of the table.
+        table (dict): The table metadata.
+        chunk_size (int, optional): Profile this many rows at a time, to
+            bound the memory used by the intermediate results.
+        top_k (int): The number of most frequent values which are reported.
+
+    Returns:
+        TableProfile: The profile.
+    """
+    table_profile = TableProfile(top_k)
+    chunk_size = chunk_size or max(len(dataframe), 1)
+    # an empty table is profiled too, to count its values
+    for start in range(0, max(len(dataframe), 1), chunk_size):
+        table_profile.update(dataframe.iloc[start:start + chunk_size])
+    table_profile.store(table)
+    return table_profile
@@ -0,0 +1,164 @@
+"""Referentially consistent subsets of the tables.
+
+A subset starts from a seeded random sample of the rows of some root tables,
+by default the tables which no foreign key references, and follows the
+foreign keys of the metadata:
+
+    * the parent rows which the selected rows reference are always added,
+      so that no foreign key of the subset is broken.
+    * when `children` is set, the rows which reference the sampled rows, and
+      recursively their own children, are added too, with their parents.
+      The children of the parent rows are not followed, which would pull most
+      of the database through the tables shared by many rows.
+
+The rows are never compared one by one: the values of the keys which are
+followed are reduced to hashes, as in `metad.integrity`, so that each value
+is requested from a table once, and the connectors fetch the rows which have
+any of the requested values at once, like with batched `IN` queries or
+`isin`. The tables are processed breadth first until no new row is found,
+which also ends the cycles of foreign keys.
+"""
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metad.integrity import hash_keys, key_strings
+
+_EMPTY = np.empty(0, dtype=np.uint64)
+
+
+def _columns(fields):
+    return [fields] if isinstance(fields, str) else list(fields)
+
+
+def _row_hashes(dataframe, columns):
+    # unlike the keys, the rows are hashed with their missing values
+    strings = pd.DataFrame({
+        position: key_strings(dataframe[column]) for position, column in enumerate(columns)
+    })
+    return pd.util.hash_pandas_object(strings, index=False, categorize=False).values
+
+
+def _first(hashes, seen):
+    """Get the mask of the first occurrence of each hash which was not seen."""
+    mask = np.zeros(len(hashes), dtype=bool)
+    _, first = np.unique(hashes, return_index=True)
+    mask[first] = True
+    return mask & ~np.isin(hashes, seen)
+
+
+class _Selection():
+    """The rows selected from a table, identified by their primary key."""
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = _columns(table.get("primary_key") or [])
+        self.chunks = []
+        self.seen = _EMPTY
+
+    def add(self, rows):
+        """Add some rows and return those which were not selected yet."""
+        if not len(rows):
+            return rows
+        hashes = _row_hashes(rows, self.columns or list(rows.columns))
+        new = _first(hashes, self.seen)
+        rows = rows[new]
+        self.seen = np.union1d(self.seen, hashes[new])
+        self.chunks.append(rows)
+        return rows
+
+    def rows(self):
+        if not self.chunks:
+            return pd.DataFrame(columns=[field["name"] for field in self.table["fields"]])
+        return pd.concat(self.chunks, ignore_index=True)
+
+
+def subset(metadata, sample, lookup, tables=None, fraction=None, size=None, seed=0,
+           children=False):
+    """Select a subset of the rows of the tables which keeps their foreign keys.
+
+    Args:
+        metadata (MetaData): The metadata of the tables.
+        sample (callable): Called with a table, the `fraction`, the `size`
+            and the `seed`, returns a random sample of its rows.
+        lookup (callable): Called with a table, some of its columns and a
+            DataFrame of distinct values of these columns, returns the rows
+            of the table which have any of these values.
+        tables (list, optional): The names of the tables which are sampled.
+            Defaults to the tables which are not referenced by any foreign
+            key, or to all the tables if they all are.
+        fraction (float, optional): The fraction of the rows of each sampled
+            table which are selected.
+        size (int, optional): The number of rows of each sampled table which
+            are selected, instead of a fraction.
+        seed (int): The seed of the random samples.
+        children (bool): Whether to add the rows which reference the sampled
+            rows too. Defaults to False.
+
+    Returns:
+        OrderedDict: The rows of each table, by name, as a DataFrame. The
+        tables which are not reached are empty.
+    """
+    assert (fraction is None) != (size is None), "Either a fraction or a size is required"
+    graph = metadata.get_graph()
+    by_id = {table["id"]: table for table in metadata.data["tables"]}
+    if tables is None:
+        roots = [table for table in metadata.data["tables"] if not graph.children(table["id"])]
+        roots = roots or metadata.data["tables"]
+    else:
+        roots = [metadata.get_table(table_name) for table_name in tables]
+        for table_name, table in zip(tables, roots):
+            assert table is not None, "Unknown table %s" % table_name
+
+    selections = OrderedDict(
+        (table["id"], _Selection(table)) for table in metadata.data["tables"])
+    # the hashes of the values already requested from each key
+    requested = {}
+    # the rows found for each table, and direction, which were not followed
+    # yet: the rows which reach a table through several keys are followed
+    # together
+    pending = OrderedDict()
+
+    def add(table, rows, downward):
+        if len(rows):
+            pending.setdefault((table["id"], downward), []).append(rows)
+
+    def follow(rows, columns, table, key_columns):
+        missing, hashes = hash_keys(rows, columns)
+        key = (table["id"], tuple(key_columns))
+        new = _first(hashes, requested.get(key, _EMPTY))
+        if not new.any():
+            return None
+        requested[key] = np.union1d(requested.get(key, _EMPTY), hashes[new])
+        values = rows[columns].iloc[np.flatnonzero(~missing)[new]]
+        values.columns = key_columns
+        return lookup(table, key_columns, values.reset_index(drop=True))
+
+    for table in roots:
+        add(table, sample(table, fraction, size, seed), True)
+
+    while pending:
+        (table_id, downward), chunks = pending.popitem(last=False)
+        table = by_id[table_id]
+        rows = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+        rows = selections[table_id].add(rows)
+        if not len(rows):
+            continue
+
+        for foreign_key in metadata.get_foreign_keys(table_id, view=True):
+            columns = _columns(foreign_key["field"])
+            ref_columns = _columns(foreign_key["ref_field"])
+            if foreign_key["table"] == table_id:
+                parent = by_id[foreign_key["ref_table"]]
+                parent_rows = follow(rows, columns, parent, ref_columns)
+                if parent_rows is not None:
+                    add(parent, parent_rows, False)
+            if children and downward and foreign_key["ref_table"] == table_id:
+                child = by_id[foreign_key["table"]]
+                child_rows = follow(rows, ref_columns, child, columns)
+                if child_rows is not None:
+                    add(child, child_rows, True)
+
+    return OrderedDict(
+        (selection.table["name"], selection.rows()) for selection in selections.values())
@@ -0,0 +1,563 @@
+"""Output formats for the tables exported by the connectors.
+
+Each format is implemented by a writer class which receives the rows of a
+table as a sequence of pandas DataFrames, so that the connectors can stream
+large tables chunk by chunk. The columnar formats (Parquet and Arrow IPC /
+Feather) require `pyarrow` and derive the type of each column from the
+`data_type` and `data_subtype` of the corresponding field in the metadata,
+whatever the values of the first rows.
+
+CSV files can be compressed while they are written with gzip, or with zstd
+and lz4 when the `zstandard` and `lz4` packages are installed.
+
+`read_table` reads the files of every format back, chunk by chunk, and
+`count_rows` counts their rows without parsing them.
+"""
+import datetime
+import gzip
+import mmap
+import os
+import shutil
+
+import numpy as np
+
+
+def _newline(mode):
+    # newlines are not translated in text mode, and binary mode takes none
+    return "" if "t" in mode else None
+
+
+def _open_zstd(path, mode):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("The zstd compression requires zstandard")
+    return zstandard.open(path, mode, newline=_newline(mode))
+
+
+def _open_lz4(path, mode):
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError("The lz4 compression requires lz4")
+    return lz4.frame.open(path, mode, newline=_newline(mode))
+
+
+def _open_gzip(path, mode):
+    return gzip.open(path, mode, compresslevel=6, newline=_newline(mode))
+
+
+COMPRESSIONS = {
+    "gzip": ("gz", _open_gzip),
+    "zstd": ("zst", _open_zstd),
+    "lz4": ("lz4", _open_lz4),
+}
+
+
+def open_text(path, mode="rt", compression=None):
+    """Open a text file, compressing or decompressing it on the fly.
+
+    Args:
+        path (str): The path to the file.
+        mode (str): Either `rt` (default) or `wt`.
+        compression (str, optional): One of `gzip`, `zstd` or `lz4`.
+
+    Returns:
+        file: The file object. Newlines are not translated.
+    """
+    if not compression:
+        return open(path, mode, newline="")
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression %s, expected one of %s" % (
+            compression, ", ".join(sorted(COMPRESSIONS))))
+    return COMPRESSIONS[compression][1](path, mode)
+
+
+class CSVWriter():
+    """Write a table to a CSV file."""
+
+    extension = "csv"
+
+    def __init__(self, path, table=None, header=True, compression=None):
+        """Create a new CSVWriter.
+
+        Args:
+            path (str): The path to the output file.
+            table (dict, optional): The table metadata. Unused for CSV.
+            header (bool): Whether to write the header row (default: True).
+            compression (str, optional): The compression of the file.
+        """
+        self.header = header
+        self.fout = open_text(path, "wt", compression)
+        self.number_of_rows = 0
+
+    def write(self, dataframe):
+        dataframe.to_csv(self.fout, header=self.header, index=False)
+        self.header = False
+        self.number_of_rows += len(dataframe)
+
+    def close(self):
+        self.fout.close()
+
+    @classmethod
+    def concatenate(cls, paths, path, table=None, compression=None):
+        """Concatenate files written by this writer into a single file.
+
+        Compressed files are concatenated as they are, since a sequence of
+        gzip members, zstd frames or lz4 frames is a valid compressed file.
+
+        Args:
+            paths (list): The paths to the files, in order. Only the first
+                one is expected to contain the header row.
+            path (str): The path to the output file.
+            table (dict, optional): The table metadata.
+            compression (str, optional): The compression of the files.
+        """
+        with open(path, "wb") as fout:
+            for path_to_part in paths:
+                with open(path_to_part, "rb") as fin:
+                    shutil.copyfileobj(fin, fout)
+
+
+def arrow_type(field):
+    """Get the Arrow type which corresponds to a field of the metadata.
+
+    Integers, integer ids included, are stored as `int64`, the other
+    numbers as `float64` and the other ids and fields as strings.
+
+    Args:
+        field (dict): The field metadata.
+
+    Returns:
+        pyarrow.DataType: The type.
+    """
+    import pyarrow as pa
+
+    data_type = field.get("data_type")
+    data_subtype = field.get("data_subtype")
+    if data_type in ("numerical", "id") and data_subtype == "integer":
+        return pa.int64()
+    if data_type == "numerical":
+        return pa.float64()
+    if data_type == "boolean" or data_subtype == "boolean":
+        return pa.bool_()
+    if data_type == "datetime":
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _timestamp(value):
+    import pandas as pd
+
+    if isinstance(value, datetime.timedelta):
+        # a time of the day
+        return datetime.datetime(1970, 1, 1) + value
+    if isinstance(value, int):
+        # a year
+        return datetime.datetime(value, 1, 1)
+    return pd.Timestamp(value).to_pydatetime()
+
+
+def _to_type(value, type_):
+    import pyarrow as pa
+
+    if isinstance(value, bytes):
+        if pa.types.is_string(type_):
+            return value.decode("utf-8", "backslashreplace")
+        if not pa.types.is_boolean(type_) or value not in (b"\x00", b"\x01"):
+            raise ValueError("%r is not a bit(1) value" % (value, ))
+        # the bit of a bit(1) column
+        return value == b"\x01"
+    if pa.types.is_boolean(type_):
+        if isinstance(value, str):
+            if value.lower() not in ("true", "false"):
+                raise ValueError("%r is not a boolean" % value)
+            return value.lower() == "true"
+        return bool(value)
+    if pa.types.is_integer(type_):
+        number = int(value)
+        if not isinstance(value, str) and number != value:
+            raise ValueError("%r is not an integer" % (value, ))
+        return number
+    if pa.types.is_floating(type_):
+        return float(value)
+    if pa.types.is_timestamp(type_):
+        return _timestamp(value)
+    return str(value)
+
+
+def _is_null(value):
+    import pandas as pd
+
+    missing = pd.isna(value)
+    return isinstance(missing, (bool, np.bool_)) and bool(missing)
+
+
+def to_arrow_array(values, type_):
+    """Convert the values of a column to an Arrow array of a type.
+
+    The values which Arrow doesn't convert by itself, like decimals, the
+    bytes of bit(1) columns, dates and times, are converted one by one.
+    Decimals become floats.
+
+    Args:
+        values (pandas.Series): The values.
+        type_ (pyarrow.DataType): The type of the array.
+
+    Returns:
+        pyarrow.Array: The array.
+    """
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, type=type_, from_pandas=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        values = [None if _is_null(value) else _to_type(value, type_) for value in values]
+        return pa.array(values, type=type_)
+
+
+class ArrowWriter():
+    """Base class for the writers of the formats based on Arrow.
+
+    The schema is given by the fields of the table, with the types of
+    `arrow_type`, so that it doesn't depend on the values of the first
+    DataFrame, which may all be missing. Only the columns without a field
+    get the type inferred by Arrow from the first DataFrame. Every
+    DataFrame is converted to the schema.
+    """
+
+    extension = None
+
+    def __init__(self, path, table=None, header=True, compression=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("The %s format requires pyarrow" % self.extension)
+
+        self.path = path
+        self.fields = {}
+        if table:
+            self.fields = {field["name"]: field for field in table.get("fields", [])}
+        self.schema = None
+        self.writer = None
+        self.number_of_rows = 0
+
+    def _to_arrow(self, dataframe):
+        import pyarrow as pa
+
+        if self.schema is None:
+            types = []
+            for column in dataframe.columns:
+                if column in self.fields:
+                    types.append(arrow_type(self.fields[column]))
+                else:
+                    types.append(pa.array(dataframe[column], from_pandas=True).type)
+            self.schema = pa.schema([
+                (str(column), type_) for column, type_ in zip(dataframe.columns, types)])
+
+        arrays = [
+            to_arrow_array(dataframe[column], type_)
+            for column, type_ in zip(dataframe.columns, self.schema.types)
+        ]
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def write(self, dataframe):
+        table = self._to_arrow(dataframe)
+        if self.writer is None:
+            self.writer = self._open(table.schema)
+        self.writer.write_table(table)
+        self.number_of_rows += len(dataframe)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def _open(self, schema):
+        raise NotImplementedError()
+
+    @classmethod
+    def _read(cls, path):
+        raise NotImplementedError()
+
+    @classmethod
+    def concatenate(cls, paths, path, table=None, compression=None):
+        writer = cls(path, table)
+        for path_to_part in paths:
+            part = cls._read(path_to_part)
+            if writer.writer is None:
+                writer.schema = part.schema
+                writer.writer = writer._open(part.schema)
+            writer.writer.write_table(part.cast(writer.schema))
+        writer.close()
+
+
+class ParquetWriter(ArrowWriter):
+    """Write a table to a Parquet file, one row group per DataFrame."""
+
+    extension = "parquet"
+
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, schema)
+
+    @classmethod
+    def _read(cls, path):
+        import pyarrow.parquet as pq
+        return pq.read_table(path)
+
+
+class FeatherWriter(ArrowWriter):
+    """Write a table to an Arrow IPC (Feather V2) file, one batch per DataFrame."""
+
+    extension = "feather"
+
+    def _open(self, schema):
+        import pyarrow as pa
+        return pa.ipc.new_file(self.path, schema)
+
+    @classmethod
+    def _read(cls, path):
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+
+
+FORMATS = {
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+    "feather": FeatherWriter,
+}
+
+
+def _read_csv(path, columns, chunk_size, compression, names, dtype):
+    import pandas as pd
+
+    with open_text(path, "rt", compression) as fin:
+        chunks = pd.read_csv(fin, usecols=columns, chunksize=chunk_size, dtype=dtype,
+                             header=None if names else "infer", names=names)
+        if chunk_size is None:
+            chunks = [chunks]
+        for chunk in chunks:
+            yield chunk
+
+
+def _read_parquet(path, columns, chunk_size, compression, names, dtype):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    if chunk_size is None:
+        yield parquet_file.read(columns=columns).to_pandas()
+        return
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def _read_feather(path, columns, chunk_size, compression, names, dtype):
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        if chunk_size is None:
+            yield table.to_pandas()
+            return
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            yield batch.to_pandas()
+
+
+READERS = {
+    "csv": _read_csv,
+    "parquet": _read_parquet,
+    "feather": _read_feather,
+}
+
+
+def _extension(path, compression):
+    if compression and path.endswith("." + COMPRESSIONS.get(compression, ("", ))[0]):
+        path = path.rsplit(".", 1)[0]
+    return path.rsplit(".", 1)[-1].lower()
+
+
+def _require_arrow(extension):
+    if extension in ("parquet", "feather"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("The %s format requires pyarrow" % extension)
+
+
+def read_table(path, columns=None, chunk_size=None, compression=None, names=None, dtype=None):
+    """Read a table file, possibly chunk by chunk.
+
+    The format is given by the extension of the file, after the one of the
+    compression, and defaults to CSV.
+
+    Args:
+        path (str): The path to the file.
+        columns (list, optional): Read only these columns.
+        chunk_size (int, optional): Read this many rows at a time. By
+            default, the whole file is read at once.
+        compression (str, optional): The compression of a CSV file.
+        names (list, optional): The names of the columns of a CSV file
+            without a header row.
+        dtype (optional): The dtype of the columns of a CSV file, as taken
+            by `pandas.read_csv`. The other formats keep their own types.
+
+    Returns:
+        iterator: The rows, as pandas DataFrames.
+    """
+    extension = _extension(path, compression)
+    _require_arrow(extension)
+    return READERS.get(extension, _read_csv)(
+        path, columns, chunk_size, compression, names, dtype)
+
+
+# the CSV files are scanned this many bytes at a time
+_CHUNK_BYTES = 1 << 24
+
+_NEWLINE = ord("\n")
+_QUOTE = ord('"')
+
+
+def _count_lines(chunk, quoted):
+    """Count the line ends which are not inside a quoted value.
+
+    Args:
+        chunk (numpy.ndarray): The bytes of a part of a CSV file.
+        quoted (bool): Whether the chunk starts inside a quoted value.
+
+    Returns:
+        tuple: The number of line ends and whether the chunk ends inside a
+        quoted value.
+    """
+    quotes = np.flatnonzero(chunk == _QUOTE)
+    if not len(quotes):
+        return (0 if quoted else int(np.count_nonzero(chunk == _NEWLINE))), quoted
+
+    # a line end is outside the quotes when an even number of them come
+    # before it, counting the escaped quotes (`""`) twice
+    newlines = np.flatnonzero(chunk == _NEWLINE)
+    before = np.searchsorted(quotes, newlines) + quoted
+    return int(np.count_nonzero(before % 2 == 0)), bool((len(quotes) + quoted) % 2)
+
+
+def _csv_chunks(path, compression):
+    if compression:
+        with COMPRESSIONS[compression][1](path, "rb") as fin:
+            while True:
+                content = fin.read(_CHUNK_BYTES)
+                if not content:
+                    break
+                yield np.frombuffer(content, dtype=np.uint8)
+        return
+
+    with open(path, "rb") as fin:
+        if not os.fstat(fin.fileno()).st_size:
+            return
+        with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            for start in range(0, len(content), _CHUNK_BYTES):
+                yield np.frombuffer(content, dtype=np.uint8, offset=start,
+                                    count=min(_CHUNK_BYTES, len(content) - start))
+
+
+def _count_csv_rows(path, compression, header):
+    lines = 0
+    quoted = False
+    last = None
+    for chunk in _csv_chunks(path, compression):
+        count, quoted = _count_lines(chunk, quoted)
+        lines += count
+        last = chunk[-1]
+        del chunk
+
+    if last is None:
+        return 0
+    if last != _NEWLINE:
+        # the last line has no line end
+        lines += 1
+    return max(lines - 1, 0) if header else lines
+
+
+def count_rows(path, compression=None, header=True):
+    """Count the rows of a table file without parsing it.
+
+    CSV files are scanned for the line ends which are not inside quoted
+    values, chunk by chunk, through a memory map when they are not
+    compressed. The number of rows of the other formats is read from their
+    metadata.
+
+    Args:
+        path (str): The path to the file.
+        compression (str, optional): The compression of a CSV file.
+        header (bool): Whether a CSV file has a header row (default: True).
+
+    Returns:
+        int: The number of rows, without the header.
+    """
+    extension = _extension(path, compression)
+    _require_arrow(extension)
+    if extension == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    if extension == "feather":
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return _count_csv_rows(path, compression, header)
+
+
+class OutputFormat():
+    """The format and compression of the exported table files.
+
+    Args:
+        format (str): The name of the format (`csv`, `parquet` or `feather`).
+        compression (str, optional): The compression of the files (`gzip`,
+            `zstd` or `lz4`). Only supported by the `csv` format.
+
+    Raises:
+        ValueError: If the format or compression is not supported.
+    """
+
+    def __init__(self, format="csv", compression=None):
+        if format not in FORMATS:
+            raise ValueError("Unknown format %s, expected one of %s" % (
+                format, ", ".join(sorted(FORMATS))))
+        if compression and format != "csv":
+            raise ValueError("Compression is only supported for the csv format")
+        if compression and compression not in COMPRESSIONS:
+            raise ValueError("Unknown compression %s, expected one of %s" % (
+                compression, ", ".join(sorted(COMPRESSIONS))))
+
+        self.writer_class = FORMATS[format]
+        self.compression = compression or None
+
+    @property
+    def extension(self):
+        if self.compression:
+            return "%s.%s" % (self.writer_class.extension, COMPRESSIONS[self.compression][0])
+        return self.writer_class.extension
+
+    def file_name(self, table_name):
+        """Get the name of the file of a table."""
+        return "%s.%s" % (table_name, self.extension)
+
+    def open(self, path, table=None, header=True):
+        """Open a writer for a table file.
+
+        Args:
+            path (str): The path to the output file.
+            table (dict, optional): The table metadata.
+            header (bool): Whether to write the header row, if the format
+                has one (default: True).
+
+        Returns:
+            A writer with `write(dataframe)` and `close()` methods, which
+            counts the rows written in its `number_of_rows` attribute.
+        """
+        return self.writer_class(path, table, header=header, compression=self.compression)
+
+    def concatenate(self, paths, path, table=None):
+        """Concatenate table files, in order, into a single file."""
+        self.writer_class.concatenate(paths, path, table, compression=self.compression)
@@ -0,0 +1,236 @@
+"""Graph of the relationships between the tables.
+
+The tables are the nodes of the graph, identified by their `id`, and each
+foreign key is an edge from its child table (`table`) to its parent table
+(`ref_table`), whatever the number of fields of the key. The adjacency lists
+are updated in constant time when a table or a foreign key is added, and
+the answers of the queries which traverse the graph are cached until then:
+
+    * `parents`, `children` and `neighbors` read the adjacency lists.
+    * `ancestors` and `descendants` traverse the graph once per table.
+    * `topological_order` and `cycles` come from the strongly connected
+      components of the graph, found once in linear time.
+    * `join_path` searches the shortest path from a table once, after which
+      the path to any other table takes the time of its length.
+"""
+from collections import OrderedDict, deque
+
+from metad.views import read_only
+
+
+class RelationshipGraph():
+    """The tables and the foreign keys between them.
+
+    Args:
+        tables (list): The table dictionaries.
+        foreign_keys (list): The foreign key dictionaries.
+    """
+
+    def __init__(self, tables=(), foreign_keys=()):
+        self._parents = OrderedDict()
+        self._children = OrderedDict()
+        self._foreign_keys = []
+        self._cache = {}
+        for table in tables:
+            self.add_table(table["id"])
+        for foreign_key in foreign_keys:
+            self.add_foreign_key(foreign_key)
+
+    def add_table(self, table_id):
+        """Add a table without relationships, if it is not in the graph."""
+        if table_id not in self._parents:
+            self._parents[table_id] = OrderedDict()
+            self._children[table_id] = OrderedDict()
+            self._cache.clear()
+
+    def add_foreign_key(self, foreign_key):
+        """Add the edge of a foreign key, and its tables if they are new."""
+        child, parent = foreign_key["table"], foreign_key["ref_table"]
+        self.add_table(child)
+        self.add_table(parent)
+        position = len(self._foreign_keys)
+        self._foreign_keys.append(foreign_key)
+        self._parents[child].setdefault(parent, []).append(position)
+        self._children[parent].setdefault(child, []).append(position)
+        self._cache.clear()
+
+    def _cached(self, key, function, *args):
+        if key not in self._cache:
+            self._cache[key] = function(*args)
+        return self._cache[key]
+
+    def _check(self, table_id):
+        assert table_id in self._parents, "Unknown table %s" % table_id
+
+    def parents(self, table_id):
+        """Get the tables referenced by the foreign keys of a table."""
+        self._check(table_id)
+        return list(self._parents[table_id])
+
+    def children(self, table_id):
+        """Get the tables whose foreign keys reference a table."""
+        self._check(table_id)
+        return list(self._children[table_id])
+
+    def neighbors(self, table_id):
+        """Get the parents and then the children of a table, once each."""
+        self._check(table_id)
+        return list(OrderedDict.fromkeys(
+            list(self._parents[table_id]) + list(self._children[table_id])))
+
+    def _reachable(self, table_id, edges):
+        seen = OrderedDict()
+        queue = deque([table_id])
+        while queue:
+            for other in edges[queue.popleft()]:
+                if other not in seen:
+                    seen[other] = None
+                    queue.append(other)
+        return frozenset(seen)
+
+    def ancestors(self, table_id):
+        """Get the tables which a table references, directly or not.
+
+        Returns:
+            frozenset: The ids of the tables. A table in a cycle is one of
+            its own ancestors.
+        """
+        self._check(table_id)
+        return self._cached(("ancestors", table_id), self._reachable, table_id, self._parents)
+
+    def descendants(self, table_id):
+        """Get the tables which reference a table, directly or not.
+
+        Returns:
+            frozenset: The ids of the tables. A table in a cycle is one of
+            its own descendants.
+        """
+        self._check(table_id)
+        return self._cached(
+            ("descendants", table_id), self._reachable, table_id, self._children)
+
+    def _components(self):
+        """Find the strongly connected components with Tarjan's algorithm.
+
+        The search follows the edges from the children to the parents, so
+        the components come out with the parents before their children.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self._parents:
+            if root in index:
+                continue
+            # iterative depth first search, with the parents left to visit
+            work = [(root, iter(self._parents[root]))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, parents = work[-1]
+                for parent in parents:
+                    if parent not in index:
+                        index[parent] = lowlink[parent] = len(index)
+                        stack.append(parent)
+                        on_stack.add(parent)
+                        work.append((parent, iter(self._parents[parent])))
+                        break
+                    if parent in on_stack:
+                        lowlink[node] = min(lowlink[node], index[parent])
+                else:
+                    work.pop()
+                    if work:
+                        lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def topological_order(self):
+        """Get the tables ordered so that the parents come before their children.
+
+        This is the order in which the tables can be loaded without
+        breaking their foreign keys. The tables of a cycle come together,
+        after the parents of all of them.
+
+        Returns:
+            list: The ids of the tables.
+        """
+        order = self._cached("order", lambda: [
+            table_id
+            for component in self._cached("components", self._components)
+            for table_id in self._in_order(component)
+        ])
+        return list(order)
+
+    def _in_order(self, tables):
+        if len(tables) == 1:
+            return tables
+        positions = {table_id: position for position, table_id in enumerate(self._parents)}
+        return sorted(tables, key=positions.get)
+
+    def cycles(self):
+        """Get the groups of tables which reference each other in a cycle.
+
+        Returns:
+            list: The lists of the ids of the tables of each cycle, including
+            the tables which reference themselves.
+        """
+        return [
+            self._in_order(component)
+            for component in self._cached("components", self._components)
+            if len(component) > 1 or component[0] in self._parents[component[0]]
+        ]
+
+    def _search(self, source):
+        # the edge which reaches each table from the source, by breadth first search
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            table_id = queue.popleft()
+            for edges in (self._parents[table_id], self._children[table_id]):
+                for other, positions in edges.items():
+                    if other not in previous:
+                        previous[other] = (table_id, positions[0])
+                        queue.append(other)
+        return previous
+
+    def join_path(self, source, target):
+        """Find the shortest path of foreign keys between two tables.
+
+        The foreign keys can be followed in both directions, from the child
+        to the parent or from the parent to the child. Among the foreign keys
+        between the same tables, the first one is used.
+
+        Args:
+            source (str): The id of the first table.
+            target (str): The id of the last table.
+
+        Returns:
+            list: The steps of the path, as tuples of the id of a table, the
+            id of the next table and the foreign key which joins them, as a
+            read-only view. The list is empty if the tables are the same, and
+            None if they are not connected.
+        """
+        self._check(source)
+        self._check(target)
+        previous = self._cached(("search", source), self._search, source)
+        if target not in previous:
+            return None
+
+        path = []
+        table_id = target
+        while previous[table_id] is not None:
+            other, position = previous[table_id]
+            path.append((other, table_id, read_only(self._foreign_keys[position])))
+            table_id = other
+        path.reverse()
+        return path
@@ -0,0 +1,282 @@
+"""Referential integrity checks of the data of the tables.
+
+`MetaData.validate` checks the structure of the metadata, and `check` the
+data it describes: the files of the tables, given by their `path` or else
+named `<name>.csv` as the connectors write them, are read chunk by chunk
+and only the key columns are kept, so the memory usage doesn't depend on
+the number of columns nor on the size of the chunks.
+
+The check runs in two passes over the tables:
+
+    1. The primary key of each table is checked for missing values and
+       duplicates, and the distinct values of the keys which are referenced
+       by foreign keys (primary or not, composite or not) are collected.
+    2. The values of each foreign key are looked up in the values of the key
+       they reference, and the rows which are not found are orphans.
+
+The values of the keys are compared as text, so that the same key is equal
+in every table and file format (`1` and `1.0` are the same integer), and
+each value, or tuple of values, is reduced to a 64-bit hash. The hashes of
+a key are kept in a sorted array, which takes 8 bytes per distinct value
+and is searched with a binary search. Two different values have the same
+hash with a probability of about `n / 2 ** 64`, which may hide an orphan
+but never reports one which is not.
+
+The tables of each pass are read concurrently, in separate processes, when
+`max_workers` is above 1.
+"""
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metad.formats import read_table
+
+CHUNK_SIZE = 100000
+
+# the number of orphan rows listed in each problem
+MAX_EXAMPLES = 5
+
+_EMPTY = np.empty(0, dtype=np.uint64)
+
+
+def _columns(fields):
+    return [fields] if isinstance(fields, str) else list(fields)
+
+
+def key_strings(values):
+    """Get the values of a key column as text.
+
+    The same key gets the same text whether it was read as an integer, as a
+    float because of missing values or as a string.
+
+    Returns:
+        numpy.ndarray: The strings, as objects.
+    """
+    strings = values.astype(str)
+    if values.dtype.kind not in "iub":
+        strings = strings.str.replace(r"^(-?\d+)\.0+$", r"\1", regex=True)
+    return np.asarray(strings, dtype=object)
+
+
+def hash_keys(dataframe, columns):
+    """Hash the keys of the rows which have no missing value in the columns.
+
+    Returns:
+        tuple: The mask of the rows which have a missing value and the
+        hashes of the other ones.
+    """
+    keys = dataframe[columns]
+    missing = keys.isnull().any(axis=1).values
+    keys = keys[~missing]
+    if len(columns) == 1:
+        hashes = pd.util.hash_array(key_strings(keys[columns[0]]), categorize=False)
+    else:
+        strings = pd.DataFrame({
+            position: key_strings(keys[column])
+            for position, column in enumerate(columns)
+        })
+        hashes = pd.util.hash_pandas_object(strings, index=False, categorize=False).values
+    return missing, hashes
+
+
+def table_path(table):
+    """Get the path of the file of a table, which defaults to `<name>.csv`."""
+    return table.get("path") or "%s.csv" % table["name"]
+
+
+class _Table():
+    """The file of a table and the options to read it."""
+
+    def __init__(self, table, path_to_dataset, chunk_size):
+        self.table = table
+        self.name = table["name"]
+        self.path = os.path.join(path_to_dataset, table_path(table))
+        self.chunk_size = chunk_size
+
+    def chunks(self, columns):
+        names = None
+        if self.table.get("headers") is False:
+            names = [field["name"] for field in self.table["fields"]]
+        for chunk in read_table(self.path, columns=columns, chunk_size=self.chunk_size,
+                                compression=self.table.get("compression"), names=names,
+                                dtype=str):
+            yield chunk
+
+
+def _problem(table, check, columns, rows, message, **details):
+    problem = OrderedDict([
+        ("table", table),
+        ("check", check),
+        ("fields", columns),
+        ("rows", int(rows)),
+    ])
+    problem.update(details)
+    problem["message"] = message
+    return problem
+
+
+def _check_primary_key(table_name, primary_key, missing, hashes):
+    problems = []
+    if missing:
+        problems.append(_problem(
+            table_name, "null_keys", primary_key, missing,
+            "%s rows of %s have a null primary key" % (missing, table_name)))
+    duplicates = int(np.count_nonzero(hashes[1:] == hashes[:-1]))
+    if duplicates:
+        problems.append(_problem(
+            table_name, "duplicate_keys", primary_key, duplicates,
+            "%s rows of %s have a duplicate primary key" % (duplicates, table_name)))
+    return problems
+
+
+def _scan_keys(table, primary_key, referenced):
+    """Check the primary key of a table and collect its referenced keys.
+
+    Args:
+        table (_Table): The table.
+        primary_key (list): The columns of the primary key, possibly empty.
+        referenced (list): The tuples of columns referenced by foreign keys.
+
+    Returns:
+        tuple: The problems and the sorted, distinct hashes of each of the
+        `referenced` keys.
+    """
+    keys = [tuple(primary_key)] if primary_key else []
+    keys += [key for key in referenced if key not in keys]
+    columns = sorted(set(column for key in keys for column in key))
+    missing = dict.fromkeys(keys, 0)
+    hashes = {key: [_EMPTY] for key in keys}
+    for chunk in table.chunks(columns):
+        for key in keys:
+            chunk_missing, chunk_hashes = hash_keys(chunk, list(key))
+            missing[key] += int(chunk_missing.sum())
+            if key != tuple(primary_key):
+                # a referenced key may have duplicates: keep each value once
+                chunk_hashes = np.unique(chunk_hashes)
+            hashes[key].append(chunk_hashes)
+
+    problems = []
+    for key in keys:
+        key_hashes = np.concatenate(hashes[key])
+        if key == tuple(primary_key):
+            key_hashes.sort()
+            problems.extend(_check_primary_key(table.name, primary_key, missing[key], key_hashes))
+        hashes[key] = np.unique(key_hashes)
+
+    return problems, {key: hashes[key] for key in referenced}
+
+
+def _scan_foreign_keys(table, foreign_keys, parents):
+    """Look up the values of the foreign keys of a table in their parents.
+
+    Args:
+        table (_Table): The child table.
+        foreign_keys (list): Tuples of (columns, parent name, parent columns).
+        parents (dict): The sorted hashes of each (parent name, columns) key.
+
+    Returns:
+        list: The problems.
+    """
+    columns = sorted(set(column for key in foreign_keys for column in key[0]))
+    orphans = [0] * len(foreign_keys)
+    examples = [[] for _ in foreign_keys]
+    for chunk in table.chunks(columns):
+        for position, (key, parent, ref_key) in enumerate(foreign_keys):
+            missing, hashes = hash_keys(chunk, key)
+            parent_hashes = parents[(parent, tuple(ref_key))]
+            if len(parent_hashes):
+                found = np.searchsorted(parent_hashes, hashes).clip(max=len(parent_hashes) - 1)
+                orphan = parent_hashes[found] != hashes
+            else:
+                orphan = np.ones(len(hashes), dtype=bool)
+            orphans[position] += int(orphan.sum())
+            needed = MAX_EXAMPLES - len(examples[position])
+            if needed > 0 and orphan.any():
+                rows = chunk[key][~missing][orphan].head(needed)
+                examples[position].extend(
+                    row[0] if len(key) == 1 else list(row)
+                    for row in rows.itertuples(index=False, name=None))
+
+    problems = []
+    for position, (key, parent, ref_key) in enumerate(foreign_keys):
+        if orphans[position]:
+            problems.append(_problem(
+                table.name, "orphans", key, orphans[position],
+                "%s rows of %s reference missing rows of %s" % (
+                    orphans[position], table.name, parent),
+                ref_table=parent, ref_fields=ref_key, examples=examples[position]))
+    return problems
+
+
+def _map(function, arguments, max_workers):
+    if max_workers <= 1 or len(arguments) <= 1:
+        return [function(*argument) for argument in arguments]
+    # parsing holds the GIL, so the tables are read in separate processes
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(function, *zip(*arguments)))
+
+
+def check(metadata, path_to_dataset, chunk_size=CHUNK_SIZE, max_workers=1):
+    """Check the referential integrity of the data of the tables.
+
+    Args:
+        metadata (MetaData): The metadata, which must be valid.
+        path_to_dataset (str): The directory which the `path` of the tables
+            are relative to.
+        chunk_size (int): The number of rows read at a time.
+        max_workers (int): The number of processes which read the tables.
+
+    Returns:
+        list: The problems found, as dictionaries with the `table`, the
+        `check` (`null_keys`, `duplicate_keys` or `orphans`), the `fields`,
+        the number of `rows` and a `message`. Orphans also have the
+        `ref_table`, the `ref_fields` and a few `examples` of the values.
+
+    Raises:
+        OSError: If the file of a table can't be read.
+    """
+    tables = OrderedDict()
+    by_id = {}
+    for table in metadata.data["tables"]:
+        by_id[table["id"]] = table
+        tables[table["name"]] = _Table(table, path_to_dataset, chunk_size)
+
+    referenced = {name: [] for name in tables}
+    foreign_keys = {name: [] for name in tables}
+    for foreign_key in metadata.data.get("foreign_keys", []):
+        child = by_id[foreign_key["table"]]["name"]
+        parent = by_id[foreign_key["ref_table"]]["name"]
+        if child not in tables or parent not in tables:
+            continue
+        ref_key = tuple(_columns(foreign_key["ref_field"]))
+        if ref_key not in referenced[parent]:
+            referenced[parent].append(ref_key)
+        foreign_keys[child].append((_columns(foreign_key["field"]), parent, list(ref_key)))
+
+    arguments = [
+        (table, _columns(table.table.get("primary_key", [])), referenced[name])
+        for name, table in tables.items()
+    ]
+    problems = []
+    parents = {}
+    for (table, _, _), (table_problems, hashes) in zip(
+            arguments, _map(_scan_keys, arguments, max_workers)):
+        problems.extend(table_problems)
+        for key, key_hashes in hashes.items():
+            parents[(table.name, key)] = key_hashes
+
+    # each process only receives the keys which its table references
+    arguments = [
+        (table, foreign_keys[name], {
+            (parent, tuple(ref_key)): parents[(parent, tuple(ref_key))]
+            for _, parent, ref_key in foreign_keys[name]
+        })
+        for name, table in tables.items() if foreign_keys[name]
+    ]
+    for table_problems in _map(_scan_foreign_keys, arguments, max_workers):
+        problems.extend(table_problems)
+
+    return problems
@@ -0,0 +1,183 @@
+"""JSON backends used to read and write metadata files.
+
+The metadata is parsed and serialized with `orjson` or `ujson` when one of
+them is installed, and with the standard `json` module otherwise. The
+backend can be chosen with `set_backend` or the `METAD_JSON_BACKEND`
+environment variable.
+
+The pretty output of `dumps` is always the same, byte for byte, as
+`json.dumps(data, indent=2)`: orjson is used for it only when its output
+can't differ, i.e. when the document has no non-ASCII characters, no floats
+written in exponent notation, no non-finite floats and no integers beyond
+64 bits, and the standard encoder is used otherwise. The compact output
+is not escaped and is only guaranteed to parse back to the same data.
+"""
+import json
+import os
+
+BACKENDS = ("orjson", "ujson", "json")
+
+# digits are all mapped to 0 to look for numbers with plain substring searches
+_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+
+# integers which orjson parses as floats
+_LARGE_INTEGER = b"0" * 20
+
+# floats which json.dumps writes with an exponent but orjson doesn't, or the
+# other way around, like 1e-05 (0.00001) and 1e+16 (1e16)
+_EXPONENT_FLOATS = (b"0e", b"0.0000")
+
+# null values in the compact and pretty output of orjson
+_NULLS = {
+    True: (b":null", b",null", b"[null"),
+    False: (b" null", ),
+}
+
+_backend = {}
+
+
+def _stdlib_loads(content):
+    return json.loads(content)
+
+
+def _stdlib_dumps(data, compact):
+    if compact:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return json.dumps(data, indent=2)
+
+
+def _orjson():
+    import orjson
+
+    def loads(content):
+        if isinstance(content, str):
+            try:
+                content = content.encode("utf-8")
+            except UnicodeEncodeError:
+                return None
+        if _LARGE_INTEGER in content.translate(_DIGITS):
+            return None
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # NaN, Infinity and floats out of range, which json accepts
+            return None
+
+    def dumps(data, compact):
+        try:
+            content = orjson.dumps(data, option=0 if compact else orjson.OPT_INDENT_2)
+        except orjson.JSONEncodeError:
+            return None
+        # orjson writes non-finite floats as null
+        if content == b"null" or any(null in content for null in _NULLS[compact]):
+            return None
+        if not compact:
+            # json.dumps escapes the characters from DEL on
+            if not content.isascii() or b"\x7f" in content:
+                return None
+            digits = content.translate(_DIGITS)
+            if any(pattern in digits for pattern in _EXPONENT_FLOATS):
+                return None
+        return content.decode("utf-8")
+
+    return loads, dumps
+
+
+def _ujson():
+    import ujson
+
+    def loads(content):
+        try:
+            return ujson.loads(content)
+        except ValueError:
+            return None
+
+    def dumps(data, compact):
+        if not compact:
+            return None
+        try:
+            return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False)
+        except (OverflowError, TypeError, ValueError):
+            return None
+
+    return loads, dumps
+
+
+_IMPORTERS = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": lambda: (_stdlib_loads, _stdlib_dumps),
+}
+
+
+def set_backend(name=None):
+    """Choose the JSON backend.
+
+    Args:
+        name (str, optional): One of `orjson`, `ujson` or `json`. By
+            default, the `METAD_JSON_BACKEND` environment variable or else
+            the first backend which is installed.
+
+    Raises:
+        ValueError: If the backend is unknown.
+        ImportError: If the backend was requested by name and is not installed.
+    """
+    name = name or os.environ.get("METAD_JSON_BACKEND")
+    if name and name not in BACKENDS:
+        raise ValueError("Unknown JSON backend %s, expected one of %s" % (
+            name, ", ".join(BACKENDS)))
+
+    for candidate in ([name] if name else BACKENDS):
+        try:
+            loads, dumps = _IMPORTERS[candidate]()
+        except ImportError:
+            if name:
+                raise ImportError("The %s JSON backend is not installed" % name)
+            continue
+
+        _backend.update(name=candidate, loads=loads, dumps=dumps)
+        return
+
+
+def get_backend():
+    """Get the name of the JSON backend in use."""
+    if not _backend:
+        set_backend()
+    return _backend["name"]
+
+
+def loads(content):
+    """Parse a JSON document.
+
+    Args:
+        content (bytes or str): The document. Bytes are decoded as UTF-8.
+
+    Returns:
+        The parsed data.
+    """
+    if not _backend:
+        set_backend()
+    data = _backend["loads"](content)
+    if data is None:
+        data = _stdlib_loads(content)
+    return data
+
+
+def dumps(data, compact=False):
+    """Serialize data to a JSON document.
+
+    Args:
+        data: The data to serialize.
+        compact (bool): If True, the document is written without any
+            whitespace and non-ASCII characters are not escaped. Otherwise
+            it is indented like `json.dumps(data, indent=2)`.
+
+    Returns:
+        str: The document.
+    """
+    if not _backend:
+        set_backend()
+    content = _backend["dumps"](data, compact)
+    if content is None:
+        content = _stdlib_dumps(data, compact)
+    return content
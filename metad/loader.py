@@ -0,0 +1,270 @@
+"""Loading the data of the tables with the types of their fields.
+
+A `TableLoader` opens the file of a table, given by its `path` or else
+named `<name>.csv`, only when the table is requested by name, and gives each
+column the type of its field:
+
+    * categorical fields become pandas categoricals, and boolean ones
+      nullable booleans.
+    * numerical fields become nullable integers or floats, as given by their
+      `data_subtype`. The values which the type can't hold, like the
+      fractions of a field whose subtype was inferred from a sample, keep
+      the float or object type instead.
+    * ids made of integers are stored in the smallest integer type which
+      holds their range, from the `stats` of the field when it was profiled
+      and from the values which are read. Ids with missing values use the
+      nullable integer types. The chunks of a table all get the type of the
+      range in the `stats`, or else `Int64`.
+    * datetimes are parsed when the file is read.
+
+Bytes, like those of the bit(1) columns of MySQL, are read as booleans in the
+boolean fields and as text in the categorical ones. The other columns keep
+the types of the file. The columns are converted
+after they are read, whatever the format, except the categorical columns of
+CSV files, which are parsed as categories directly.
+
+Tables loaded whole are kept in a least recently used cache, up to a budget
+of memory, so that the tables used repeatedly, for instance by the steps of
+a feature pipeline, are parsed once. A cached table serves the projections
+of its columns too, and is read again when its file changes. Tables iterated
+chunk by chunk are not cached; the categories of their categorical columns
+are those of each chunk.
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metad.formats import read_table
+from metad.integrity import table_path
+
+# 1 GiB
+MEMORY_BUDGET = 1 << 30
+
+CHUNK_SIZE = 100000
+
+
+def _dtype(field):
+    """Get the dtype of the values of a categorical or numerical field."""
+    data_type = field.get("data_type")
+    data_subtype = field.get("data_subtype")
+    if data_type == "categorical":
+        return "boolean" if data_subtype == "boolean" else "category"
+    if data_type == "numerical" and data_subtype == "integer":
+        return "Int64"
+    if data_type == "numerical" and data_subtype == "float":
+        return "float64"
+    return None
+
+
+def _csv_dtype(field):
+    # categories are parsed as they are written, keeping codes like `007`,
+    # and the other values are converted after parsing, which is faster
+    return "category" if _dtype(field) == "category" else None
+
+
+def _integer_dtype(low, high, nullable):
+    dtype = np.result_type(np.min_scalar_type(low), np.min_scalar_type(high))
+    if not nullable:
+        return dtype
+    return "%sInt%s" % ("U" if dtype.kind == "u" else "", dtype.itemsize * 8)
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _compact_ids(values, field, chunked=False):
+    present = values.dropna()
+    if len(present) and values.dtype.kind not in "iuf":
+        return values
+    # the chunks without values get the type of the others
+    if not len(present) and not (chunked and field.get("data_subtype") == "integer"):
+        return values
+    if values.dtype.kind == "f" and not np.all(np.mod(present, 1) == 0):
+        return values
+
+    # the range of the whole table keeps the same type in every chunk
+    stats = field.get("stats", {})
+    has_range = _is_integer(stats.get("min")) and _is_integer(stats.get("max"))
+    nullable = len(present) < len(values)
+    if chunked:
+        if not has_range:
+            return values.astype("Int64")
+        nullable = nullable or stats.get("null_count", 1) > 0
+
+    bounds = [int(present.min()), int(present.max())] if len(present) else []
+    if has_range:
+        bounds.extend([stats["min"], stats["max"]])
+    return values.astype(_integer_dtype(min(bounds), max(bounds), nullable))
+
+
+def _decode(value, dtype):
+    if dtype == "boolean":
+        # only the bit of a bit(1) column is a flag, other bytes are kept
+        return value == b"\x01" if value in (b"\x00", b"\x01") else value
+    return value.decode("utf-8", "backslashreplace")
+
+
+def _cast(values, dtype):
+    if values.dtype == object and pd.api.types.infer_dtype(values) == "bytes":
+        values = values.map(lambda value: _decode(value, dtype), na_action="ignore")
+    try:
+        return values.astype(dtype)
+    except (TypeError, ValueError, OverflowError):
+        pass
+
+    # the cast would lose values: numbers keep their type, or become floats
+    if values.dtype.kind in "iuf":
+        return values
+    if dtype in ("Int64", "float64"):
+        try:
+            return values.astype("float64")
+        except (TypeError, ValueError):
+            pass
+    return values.astype(object)
+
+
+def _parse_datetimes(values):
+    try:
+        return pd.to_datetime(values, format="ISO8601")
+    except ValueError:
+        return pd.to_datetime(values)
+
+
+def convert(values, field, chunked=False):
+    """Give the values of a column the type of their field.
+
+    Args:
+        values (pandas.Series): The values, as read from a file.
+        field (dict): The field metadata.
+        chunked (bool): Whether the values are a chunk of the column, whose
+            type must not depend on the values of the chunk.
+
+    Returns:
+        pandas.Series: The converted values.
+    """
+    data_type = field.get("data_type")
+    if data_type == "id":
+        return _compact_ids(values, field, chunked)
+    if data_type == "datetime":
+        return values if values.dtype.kind == "M" else _parse_datetimes(values)
+
+    dtype = _dtype(field)
+    if dtype is None or str(values.dtype) == dtype:
+        return values
+    return _cast(values, dtype)
+
+
+class TableLoader():
+    """Load the data of the tables of some metadata, by name.
+
+    Args:
+        metadata (MetaData): The metadata of the tables.
+        path_to_dataset (str): The directory which the `path` of the tables
+            are relative to.
+        memory_budget (int): The number of bytes of the cached tables.
+    """
+
+    def __init__(self, metadata, path_to_dataset="", memory_budget=MEMORY_BUDGET):
+        self.metadata = metadata
+        self.path_to_dataset = path_to_dataset
+        self.memory_budget = memory_budget
+        self.memory_usage = 0
+        self._cache = OrderedDict()
+
+    def _table(self, table_name):
+        table = self.metadata.get_table(table_name)
+        if table is None:
+            raise ValueError("Unknown table %s" % table_name)
+        return table
+
+    def _read(self, table, columns, chunk_size):
+        fields = {field["name"]: field for field in table["fields"]}
+        names = None
+        if table.get("headers") is False:
+            names = list(fields)
+        dtype = {}
+        for name, field in fields.items():
+            if _csv_dtype(field) is not None and (columns is None or name in columns):
+                dtype[name] = _csv_dtype(field)
+
+        for chunk in read_table(os.path.join(self.path_to_dataset, table_path(table)),
+                                columns=columns, chunk_size=chunk_size,
+                                compression=table.get("compression"), names=names,
+                                dtype=dtype or None):
+            for column in chunk.columns:
+                if column in fields:
+                    chunk[column] = convert(chunk[column], fields[column],
+                                            chunk_size is not None)
+            # the columns are read in the order of the file
+            yield chunk if columns is None else chunk[columns]
+
+    def iter_chunks(self, table_name, columns=None, chunk_size=CHUNK_SIZE):
+        """Read a table chunk by chunk, without caching it.
+
+        Args:
+            table_name (str): The name of the table.
+            columns (list, optional): Read only these columns.
+            chunk_size (int): The number of rows read at a time.
+
+        Returns:
+            iterator: The rows, as pandas DataFrames.
+        """
+        return self._read(self._table(table_name), columns, chunk_size)
+
+    def load(self, table_name, columns=None):
+        """Load a table, or some of its columns, from the cache or its file.
+
+        Args:
+            table_name (str): The name of the table.
+            columns (list, optional): Load only these columns.
+
+        Returns:
+            pandas.DataFrame: The rows. It is a shallow copy of the cached
+            one, so changing its columns doesn't change the cache.
+
+        Raises:
+            ValueError: If the table doesn't exist.
+        """
+        table = self._table(table_name)
+        path = os.path.join(self.path_to_dataset, table_path(table))
+        stat = os.stat(path)
+        version = (path, stat.st_mtime_ns, stat.st_size)
+
+        keys = [(table_name, None)]
+        if columns is not None:
+            keys.append((table_name, tuple(columns)))
+        for key in keys:
+            if key in self._cache and self._cache[key][0] == version:
+                self._cache.move_to_end(key)
+                dataframe = self._cache[key][1]
+                if columns is not None:
+                    dataframe = dataframe[columns]
+                return dataframe.copy(deep=False)
+
+        dataframe = next(self._read(table, columns, None))
+        self._store(keys[-1], version, dataframe)
+        return dataframe.copy(deep=False)
+
+    def _store(self, key, version, dataframe):
+        self._evict(key)
+        # only the Python objects need to be measured one by one
+        deep = any(dtype == object for dtype in dataframe.dtypes)
+        size = int(dataframe.memory_usage(deep=deep).sum())
+        if size > self.memory_budget:
+            return
+        self._cache[key] = (version, dataframe, size)
+        self.memory_usage += size
+        while self.memory_usage > self.memory_budget:
+            self._evict(next(iter(self._cache)))
+
+    def _evict(self, key):
+        if key in self._cache:
+            self.memory_usage -= self._cache.pop(key)[2]
+
+    def clear(self):
+        """Remove every table from the cache."""
+        self._cache.clear()
+        self.memory_usage = 0
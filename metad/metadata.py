@@ -1,13 +1,26 @@
+import contextlib
 import copy
-import json
 import os
+from collections import defaultdict
 
-import fastjsonschema
+from metad import jsonio
+from metad.model import Dataset
+from metad.schema import get_validator
+from metad.views import read_only
 
-base_directory = os.path.dirname(__file__)
-path_to_schema = os.path.join(base_directory, "schema.json")
-with open(path_to_schema, "rt") as fin:
-    validate = fastjsonschema.compile(json.load(fin))
+
+@contextlib.contextmanager
+def _json_path(path):
+    """Prefix the message of the assertions raised in the block with a JSON path."""
+    try:
+        yield
+    except AssertionError as error:
+        raise AssertionError("%s: %s" % (path, error)) from None
+
+
+def _is_edge(foreign_key):
+    return isinstance(foreign_key.get("table"), str) \
+        and isinstance(foreign_key.get("ref_table"), str)
 
 
 class MetaData():
@@ -20,12 +33,28 @@ class MetaData():
     """
 
     def __init__(self):
+        self._batch = None
         self.data = {
             "tables": [],
             "foreign_keys": [],
             "constraints": []
         }
 
+    @property
+    def data(self):
+        """dict: The metadata as a JSON-serializable dictionary.
+
+        Assigning a new dictionary rebuilds the lookup indexes. They are
+        also rebuilt when the lists of tables or foreign keys are replaced
+        or change length in place, and when a table is not found by name.
+        """
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._reindex()
+
     def __str__(self):
         text = ""
         text += "Number of Tables: %s\n" % len(self.data["tables"])
@@ -48,32 +77,85 @@ class MetaData():
             text += "\n"
         return text
 
-    def to_json(self, path_to_json=None):
+    def to_json(self, path_to_json=None, compact=False):
         """Export the MetaData object to a JSON file.
 
+        The metadata is serialized only once, with the backend chosen in
+        `metad.jsonio`. The indented output is always identical to the one
+        of `json.dumps(data, indent=2)`.
+
         Args:
             path_to_json (str, optional): The path to the JSON file
             which should be created. If set to None, the JSON object
             is returned as a string.
+            compact (bool): If True, the JSON is written without any
+            whitespace, for machine consumers. Defaults to False.
+
+        Returns:
+            str: The JSON document.
         """
+        content = jsonio.dumps(self.data, compact=compact)
         if path_to_json:
-            with open(path_to_json, "wt") as fp:
-                json.dump(self.data, fp, indent=2)
-        return json.dumps(self.data, indent=2)
+            with open(path_to_json, "wt", encoding="utf-8") as fp:
+                fp.write(content)
+        return content
 
     @staticmethod
-    def from_json(path_to_json):
+    def from_json(path_to_json, cache=False):
         """Load a MetaData object from a JSON file.
 
         Args:
             path_to_json (str): The path to the JSON file.
+            cache (bool): If True, the metadata is validated and stored in a
+                binary sidecar file next to the JSON file, and the following
+                calls load it from there, skipping both the parsing and the
+                validation, until the JSON file or the schema change. See
+                `metad.sidecar`. Defaults to False.
 
         Returns:
             MetaData: An instance of the MetaData object.
+
+        Raises:
+            AssertionError: If `cache` is True and the metadata is not valid.
         """
         metadata = MetaData()
-        with open(path_to_json, "rt") as fp:
-            metadata.data = json.load(fp)
+        if cache:
+            from metad import sidecar
+
+            data = sidecar.read(path_to_json)
+            if data is not None:
+                metadata.data = data
+                return metadata
+
+        with open(path_to_json, "rb") as fp:
+            stat = os.fstat(fp.fileno())
+            content = fp.read()
+        metadata.data = jsonio.loads(content)
+        if cache:
+            metadata.validate()
+            sidecar.write(path_to_json, stat, content, metadata.data)
+        return metadata
+
+    def to_model(self):
+        """Convert the MetaData object to the compact object model.
+
+        Returns:
+            metad.model.Dataset: The root object of the model.
+        """
+        return Dataset.from_dict(self.data)
+
+    @staticmethod
+    def from_model(dataset):
+        """Load a MetaData object from the compact object model.
+
+        Args:
+            dataset (metad.model.Dataset): The root object of the model.
+
+        Returns:
+            MetaData: An instance of the MetaData object.
+        """
+        metadata = MetaData()
+        metadata.data = dataset.to_dict()
         return metadata
 
     def validate(self):
@@ -83,111 +165,476 @@ class MetaData():
         additional logic checks (i.e. that table/field names are unique) to
         ensure that the metadata is valid.
 
+        The logic checks are the same ones which the `add_*` methods apply
+        incrementally, so a metadata object built through those methods is
+        valid if and only if this method succeeds.
+
         Raises:
-            AssertionError: If the metadata is not valid.
+            AssertionError: If the metadata is not valid. The message starts
+            with the JSON path of the offending object.
         """
-        validate(self.data)
+        get_validator("metadata")(self.data)
+
+        self._reset_index()
+        self._indexed = self._signature()
+        try:
+            for position, table in enumerate(self.data["tables"]):
+                with _json_path("data.tables[%s]" % position):
+                    self._check_table(table)
+                self._index_table(table)
+            for position, key in enumerate(self.data.get("foreign_keys", [])):
+                with _json_path("data.foreign_keys[%s]" % position):
+                    self._check_foreign_key(key)
+                self._index_foreign_key(position, key)
+            for position, constraint in enumerate(self.data.get("constraints", [])):
+                with _json_path("data.constraints[%s]" % position):
+                    self._check_constraint(constraint)
+        except Exception:
+            self._reindex()
+            raise
+
+    def validate_data(self, path_to_dataset=None, chunk_size=None, max_workers=1):
+        """Check the referential integrity of the data of the tables.
+
+        The files of the tables are streamed chunk by chunk to find the rows
+        with a null or duplicate primary key and the orphan rows, whose
+        foreign key references no row of the parent table. The file of a
+        table without a `path` is `<name>.csv`. See `metad.integrity`. The
+        metadata itself should be valid.
 
-        # Assert that field names are unique
-        table_ids, field_names = [], []
-        for table in self.data["tables"]:
-            table_ids.append(table["id"])
-            for field in table["fields"]:
-                field_names.append((table["id"], field["name"]))
-        assert len(table_ids) == len(set(table_ids))
-        assert len(field_names) == len(set(field_names))
-
-        # Assert that the foreign key fields exist
-        if "foreign_keys" in self.data:
-            for key in self.data["foreign_keys"]:
-                if isinstance(key["field"], str):
-                    assert (key["table"], key["field"]) in field_names
-                    assert (key["ref_table"], key["ref_field"]) in field_names
-                else:
-                    for field in key["field"]:
-                        assert (key["table"], field) in field_names
-                    for ref_field in key["ref_field"]:
-                        assert (key["ref_table"], ref_field) in field_names
-
-        # Assert that the constraint fields exist
-        if "constraints" in self.data:
-            for constraint in self.data["constraints"]:
-                for field in constraint["fields_under_consideration"]:
-                    assert (field["table"], field["field"]) in field_names, field
-                for field in constraint["related_fields"]:
-                    assert (field["table"], field["field"]) in field_names, field
-
-    def add_table(self, table):
+        Args:
+            path_to_dataset (str, optional): The directory which the `path`
+            of the tables are relative to. Defaults to the `path` of the
+            dataset, or else the current directory.
+            chunk_size (int, optional): The number of rows read at a time.
+            Defaults to `metad.integrity.CHUNK_SIZE`.
+            max_workers (int): The number of processes which read the
+            tables concurrently (default: 1).
+
+        Returns:
+            list: The problems found, as dictionaries with a `message`. The
+            data is consistent if the list is empty.
+        """
+        from metad import integrity
+
+        if path_to_dataset is None:
+            path_to_dataset = self.data.get("path", "")
+        return integrity.check(self, path_to_dataset, chunk_size or integrity.CHUNK_SIZE,
+                               max_workers)
+
+    def count_rows(self, path_to_dataset=None, max_workers=None):
+        """Count the rows of the files of the tables and store them.
+
+        The files are counted concurrently with `metad.formats.count_rows`,
+        which doesn't parse them, and the count of each table is stored in
+        its `number_of_rows`. The file of a table without a `path` is
+        `<name>.csv`.
+
+        Args:
+            path_to_dataset (str, optional): The directory which the `path`
+            of the tables are relative to. Defaults to the `path` of the
+            dataset, or else the current directory.
+            max_workers (int, optional): The number of files counted
+            concurrently. Defaults to the number of CPUs.
+
+        Returns:
+            dict: The number of rows of each table, by name.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        from metad.formats import count_rows
+        from metad.integrity import table_path
+
+        if path_to_dataset is None:
+            path_to_dataset = self.data.get("path", "")
+        tables = self.data["tables"]
+
+        def count(table):
+            return count_rows(os.path.join(path_to_dataset, table_path(table)),
+                              table.get("compression"), table.get("headers", True))
+
+        # the files are scanned by numpy, which releases the GIL
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            counts = list(executor.map(count, tables))
+        for table, number_of_rows in zip(tables, counts):
+            table["number_of_rows"] = number_of_rows
+        return {table["name"]: table["number_of_rows"] for table in tables}
+
+    def get_loader(self, path_to_dataset=None, memory_budget=None):
+        """Get a loader of the data of the tables, typed by their fields.
+
+        The loader reads the file of a table when it is requested by name,
+        with the dtypes derived from the `data_type` and `data_subtype` of
+        its fields, and caches the tables it loads. See `metad.loader`.
+
+        Example:
+            loader = metadata.get_loader("path/to/dataset")
+            users = loader.load("users", columns=["user_id", "total"])
+            for chunk in loader.iter_chunks("transactions"):
+                ...
+
+        Args:
+            path_to_dataset (str, optional): The directory which the `path`
+            of the tables are relative to. Defaults to the `path` of the
+            dataset, or else the current directory.
+            memory_budget (int, optional): The number of bytes of the cached
+            tables. Defaults to `metad.loader.MEMORY_BUDGET`.
+
+        Returns:
+            TableLoader: The loader.
+        """
+        from metad import loader
+
+        if path_to_dataset is None:
+            path_to_dataset = self.data.get("path", "")
+        return loader.TableLoader(self, path_to_dataset, memory_budget or loader.MEMORY_BUDGET)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Defer validation until the end of a block of mutations.
+
+        Inside the block, the `add_*` and `set_*` methods store their objects
+        without checking them. When the block exits, the whole metadata is
+        validated once. If the validation fails, or the block raises an
+        exception, every change made inside the block is rolled back. Nested
+        blocks are merged into the outermost one.
+
+        Example:
+            with metadata.batch():
+                for table in tables:
+                    metadata.add_table(table)
+
+        Raises:
+            AssertionError: If the metadata is not valid at the end of the block.
+        """
+        if self._batch is not None:
+            yield self
+            return
+
+        snapshot = {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in self.data.items()
+        }
+        fields = [(table, len(table["fields"])) for table in self.data["tables"]]
+        self._batch = 0
+        try:
+            yield self
+            if self._batch:
+                self.validate()
+        except BaseException:
+            self.data.clear()
+            self.data.update(snapshot)
+            for table, length in fields:
+                del table["fields"][length:]
+            self._reindex()
+            raise
+        finally:
+            self._batch = None
+
+    def _reset_index(self):
+        self._tables_by_id = {}
+        self._tables_by_name = defaultdict(list)
+        self._fields = {}
+        self._foreign_keys_by_table = defaultdict(list)
+        self._foreign_keys_by_ref_table = defaultdict(list)
+        self._graph = None
+
+    def _reindex(self):
+        """Rebuild the lookup indexes from `self.data`.
+
+        The indexes map table ids and names to tables, (table id, field name)
+        pairs to fields and table ids to the positions of the foreign keys in
+        which they take part. They are used by the getters and by the `add_*`
+        methods to check only the object which is being added instead of
+        re-validating the whole metadata.
+        """
+        self._reset_index()
+        self._indexed = self._signature()
+        for table in self.data.get("tables", []):
+            self._index_table(table)
+        for position, key in enumerate(self.data.get("foreign_keys", [])):
+            self._index_foreign_key(position, key)
+
+    def _signature(self):
+        # the indexed lists and their lengths, which change when tables or
+        # foreign keys are added or removed in place
+        tables = self._data.get("tables")
+        foreign_keys = self._data.get("foreign_keys")
+        return (id(tables), len(tables) if isinstance(tables, list) else None,
+                id(foreign_keys), len(foreign_keys) if isinstance(foreign_keys, list) else None)
+
+    def _sync(self):
+        if self._indexed != self._signature():
+            self._reindex()
+
+    def _index_table(self, table):
+        table_id = table.get("id")
+        if not isinstance(table_id, str):
+            return
+
+        self._tables_by_id.setdefault(table_id, table)
+        if self._graph is not None:
+            self._graph.add_table(table_id)
+        if isinstance(table.get("name"), str):
+            self._tables_by_name[table["name"]].append(table)
+        for field in table.get("fields", []):
+            self._index_field(table_id, field)
+
+    def _index_field(self, table_id, field):
+        if isinstance(field.get("name"), str):
+            self._fields.setdefault((table_id, field["name"]), field)
+
+    def _index_foreign_key(self, position, key):
+        if isinstance(key.get("table"), str):
+            self._foreign_keys_by_table[key["table"]].append(position)
+        if isinstance(key.get("ref_table"), str):
+            self._foreign_keys_by_ref_table[key["ref_table"]].append(position)
+        if self._graph is not None and _is_edge(key):
+            self._graph.add_foreign_key(key)
+
+    def _check_table(self, table):
+        assert table["id"] not in self._tables_by_id, "Duplicate table id %s" % table["id"]
+        field_names = set()
+        for field in table["fields"]:
+            assert field["name"] not in field_names, "Duplicate field %s in table %s" % (
+                field["name"], table["id"])
+            field_names.add(field["name"])
+
+    def _check_field(self, table_id, field_name):
+        assert isinstance(field_name, str), "Invalid field %r" % (field_name, )
+        assert (table_id, field_name) in self._fields, "Unknown field %s.%s" % (
+            table_id, field_name)
+
+    def _check_foreign_key(self, key):
+        if isinstance(key["field"], str):
+            self._check_field(key["table"], key["field"])
+            self._check_field(key["ref_table"], key["ref_field"])
+        else:
+            for field in key["field"]:
+                self._check_field(key["table"], field)
+            for ref_field in key["ref_field"]:
+                self._check_field(key["ref_table"], ref_field)
+
+    def _check_constraint(self, constraint):
+        for field in constraint["fields_under_consideration"]:
+            self._check_field(field["table"], field["field"])
+        for field in constraint.get("related_fields", []):
+            self._check_field(field["table"], field["field"])
+
+    def add_table(self, table, deepcopy=True):
         """Add the table object to the metadata.
 
         The table object must conform the the JSON schema specification.
+        Only the new table is validated; the rest of the metadata is assumed
+        to be valid already.
 
         Args:
             table (dict): A dictionary representing the table.
-        """
-        self.data["tables"].append(copy.deepcopy(table))
-        self.validate()
+            deepcopy (bool): Whether to store a copy of the table. If False,
+            the dictionary itself is stored and must not be modified by the
+            caller afterwards. Defaults to True.
 
-    def add_foreign_key(self, foreign_key):
+        Raises:
+            AssertionError: If the table is not valid. The metadata is left
+            unchanged in that case.
+        """
+        if deepcopy:
+            table = copy.deepcopy(table)
+        self._sync()
+        if self._batch is None:
+            get_validator("table")(table)
+            self._check_table(table)
+        else:
+            self._batch += 1
+        self.data["tables"].append(table)
+        self._index_table(table)
+        self._indexed = self._signature()
+
+    def add_foreign_key(self, foreign_key, deepcopy=True):
         """Add the foreign key object to the metadata.
 
         The foreign key object must conform the the JSON schema specification.
+        Only the new foreign key is validated; the rest of the metadata is
+        assumed to be valid already.
 
         Args:
             foreign_key (dict): A dictionary representing the foreign key relationship.
+            deepcopy (bool): Whether to store a copy of the foreign key. If
+            False, the dictionary itself is stored and must not be modified
+            by the caller afterwards. Defaults to True.
+
+        Raises:
+            AssertionError: If the foreign key is not valid. The metadata is
+            left unchanged in that case.
         """
+        if deepcopy:
+            foreign_key = copy.deepcopy(foreign_key)
+        self._sync()
+        if self._batch is None:
+            get_validator("foreign_key")(foreign_key)
+            assert self.data["tables"], "The metadata has no tables"
+            self._check_foreign_key(foreign_key)
+        else:
+            self._batch += 1
         if "foreign_keys" not in self.data:
             self.data["foreign_keys"] = []
-        self.data["foreign_keys"].append(copy.deepcopy(foreign_key))
-        self.validate()
+        self._index_foreign_key(len(self.data["foreign_keys"]), foreign_key)
+        self.data["foreign_keys"].append(foreign_key)
+        self._indexed = self._signature()
 
-    def add_constraint(self, constraint):
+    def add_constraint(self, constraint, deepcopy=True):
         """Add the constraint object to the metadata.
 
         The constraint table object must conform the the JSON schema specification.
+        Only the new constraint is validated; the rest of the metadata is
+        assumed to be valid already.
 
         Args:
             constraint (dict): A dictionary representing the constraint relationship.
+            deepcopy (bool): Whether to store a copy of the constraint. If
+            False, the dictionary itself is stored and must not be modified
+            by the caller afterwards. Defaults to True.
+
+        Raises:
+            AssertionError: If the constraint is not valid. The metadata is
+            left unchanged in that case.
         """
+        if deepcopy:
+            constraint = copy.deepcopy(constraint)
+        self._sync()
+        if self._batch is None:
+            get_validator("constraint")(constraint)
+            assert self.data["tables"], "The metadata has no tables"
+            self._check_constraint(constraint)
+        else:
+            self._batch += 1
         if "constraints" not in self.data:
             self.data["constraints"] = []
-        self.data["constraints"].append(copy.deepcopy(constraint))
-        self.validate()
+        self.data["constraints"].append(constraint)
 
     def set_tables(self, tables):
-        for table in tables:
-            self.add_table(table)
-            self.validate()
+        with self.batch():
+            for table in tables:
+                self.add_table(table)
 
     def set_foreign_keys(self, foreign_keys):
-        for foreign_key in foreign_keys:
-            self.add_foreign_key(foreign_key)
-            self.validate()
+        with self.batch():
+            for foreign_key in foreign_keys:
+                self.add_foreign_key(foreign_key)
+
+    def get_tables(self, view=False):
+        """Get the tables.
 
-    def get_tables(self):
+        Args:
+            view (bool): If True, return a read-only view of the tables
+            instead of a deep copy. Defaults to False.
+
+        Returns:
+            list or ReadOnlyList: The table dictionaries.
+        """
+        if view:
+            return read_only(self.data["tables"])
         return copy.deepcopy(self.data["tables"])
 
-    def get_table(self, table_name):
-        for table in self.data["tables"]:
-            if table["name"] == table_name:
-                return table
+    def get_table(self, table_name, view=False):
+        """Get the first table with the given name.
+
+        Args:
+            table_name (str): The name of the table.
+            view (bool): If True, return a read-only view of the table
+            instead of the table dictionary itself. Defaults to False.
+
+        Returns:
+            dict or ReadOnlyDict: The table, or None if there is no such table.
+        """
+        self._sync()
+        tables = self._tables_by_name.get(table_name)
+        if not tables:
+            # the table may have been renamed or replaced in place
+            self._reindex()
+            tables = self._tables_by_name.get(table_name)
+        if tables:
+            return read_only(tables[0]) if view else tables[0]
+
+    def get_graph(self):
+        """Get the graph of the relationships between the tables.
+
+        The graph is built from the foreign keys the first time it is
+        requested, and then kept up to date by `add_table` and
+        `add_foreign_key`. See `metad.graph`.
+
+        Example:
+            graph = metadata.get_graph()
+            for table_id in graph.topological_order():
+                ...
+            path = graph.join_path("transactions", "users")
+
+        Returns:
+            RelationshipGraph: The graph, whose nodes are the table ids.
+        """
+        self._sync()
+        if self._graph is None:
+            from metad.graph import RelationshipGraph
+
+            graph = RelationshipGraph()
+            for table in self.data.get("tables", []):
+                if isinstance(table.get("id"), str):
+                    graph.add_table(table["id"])
+            for foreign_key in self.data.get("foreign_keys", []):
+                if _is_edge(foreign_key):
+                    graph.add_foreign_key(foreign_key)
+            self._graph = graph
+        return self._graph
+
+    def get_table_names(self, view=False):
+        """Get the table names.
+
+        Args:
+            view (bool): If True, return the names as a tuple instead of a
+            deep copy of the list. Defaults to False.
 
-    def get_table_names(self):
+        Returns:
+            list or tuple: The table names.
+        """
+        if view:
+            return tuple(table["name"] for table in self.data["tables"])
         return copy.deepcopy([table["name"] for table in self.data["tables"]])
 
     def add_field(self, table_name, field):
-        for table in self.data["tables"]:
-            if table["name"] == table_name:
-                table["fields"].append(field)
-        self.validate()
+        self._sync()
+        tables = self._tables_by_name.get(table_name, [])
+        if self._batch is None:
+            get_validator("field")(field)
+            for table in tables:
+                assert (table["id"], field["name"]) not in self._fields, \
+                    "Duplicate field %s in table %s" % (field["name"], table["id"])
+        else:
+            self._batch += 1
+        for table in tables:
+            table["fields"].append(field)
+            self._index_field(table["id"], field)
+
+    def get_foreign_keys(self, table_name=None, view=False):
+        """Get the foreign keys.
+
+        Args:
+            table_name (str, optional): If given, only the foreign keys in
+            which this table is the child or the parent are returned.
+            view (bool): If True, return a read-only view of the foreign
+            keys instead of a deep copy. Defaults to False.
 
-    def get_foreign_keys(self, table_name=None):
+        Returns:
+            list or ReadOnlyList: The foreign key dictionaries.
+        """
+        foreign_keys = self.data["foreign_keys"]
         if table_name:
-            foreign_keys = []
-            for foreign_key in self.data["foreign_keys"]:
-                if foreign_key["table"] == table_name:
-                    foreign_keys.append(foreign_key)
-                if foreign_key["ref_table"] == table_name:
-                    foreign_keys.append(foreign_key)
-            return copy.deepcopy(foreign_keys)
-        return copy.deepcopy(self.data["foreign_keys"])
+            self._sync()
+            # a self-referencing foreign key is returned twice
+            positions = sorted(
+                self._foreign_keys_by_table.get(table_name, [])
+                + self._foreign_keys_by_ref_table.get(table_name, [])
+            )
+            foreign_keys = [foreign_keys[position] for position in positions]
+        if view:
+            return read_only(foreign_keys)
+        return copy.deepcopy(foreign_keys)
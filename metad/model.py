@@ -0,0 +1,153 @@
+"""Compact object model for the metadata.
+
+The classes in this module hold the same information as the dictionaries in
+`MetaData.data`, but use `__slots__` instead of a per-object dictionary,
+store lists as tuples and intern strings, so that large schemas take much
+less memory. Keys which are not part of the JSON schema are kept in a
+separate dictionary and the original key order is kept in a tuple which is
+shared by all the objects with the same layout, so converting an object back
+with `to_dict` gives exactly the dictionary it was created from.
+"""
+import sys
+
+_LAYOUTS = {}
+
+
+def _layout(keys):
+    keys = tuple(keys)
+    return _LAYOUTS.setdefault(keys, keys)
+
+
+def _compact(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(_compact(item) for item in value)
+    return value
+
+
+def _expand(value):
+    if isinstance(value, tuple):
+        return [_expand(item) for item in value]
+    return value
+
+
+class _Record():
+    """Base class for the objects of the model.
+
+    Subclasses list the keys defined by the JSON schema in `__slots__` and
+    map the keys which hold nested objects to their classes in `_CHILDREN`.
+    """
+
+    __slots__ = ("_keys", "_extra")
+    _CHILDREN = {}
+
+    def __init__(self, **values):
+        self._keys = _layout(values)
+        self._extra = None
+        for key, value in values.items():
+            if key in self._CHILDREN:
+                child = self._CHILDREN[key]
+                value = tuple(
+                    item if isinstance(item, child) else child.from_dict(item)
+                    for item in value
+                )
+            else:
+                value = _compact(value)
+
+            if key in self.__slots__:
+                setattr(self, key, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    def __getattr__(self, name):
+        # slots defined by the schema but missing in the dictionary
+        if name in type(self).__slots__:
+            return None
+        raise AttributeError(name)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create an object from its JSON dictionary.
+
+        Args:
+            data (dict): The dictionary, as found in `MetaData.data`.
+
+        Returns:
+            The new object.
+        """
+        return cls(**data)
+
+    def to_dict(self):
+        """Convert the object back to its JSON dictionary.
+
+        Returns:
+            dict: A new dictionary equal to the one the object was created from.
+        """
+        data = {}
+        for key in self._keys:
+            if key in self.__slots__:
+                value = getattr(self, key)
+            else:
+                value = self._extra[key]
+
+            if key in self._CHILDREN:
+                data[key] = [item.to_dict() for item in value]
+            else:
+                data[key] = _expand(value)
+        return data
+
+
+class Field(_Record):
+    """A field (column) of a table."""
+
+    __slots__ = ("name", "data_type", "data_subtype", "number_of_uniques", "stats")
+
+
+class Table(_Record):
+    """A table of the dataset."""
+
+    __slots__ = ("id", "path", "name", "primary_key", "time_index", "headers",
+                 "compression", "number_of_rows", "fields", "system", "application")
+    _CHILDREN = {"fields": Field}
+
+
+class ForeignKey(_Record):
+    """A foreign key relationship between two tables."""
+
+    __slots__ = ("table", "field", "ref_table", "ref_field", "confidence")
+
+
+class ConstraintField(_Record):
+    """A field referenced by a constraint."""
+
+    __slots__ = ("table", "field")
+
+
+class Constraint(_Record):
+    """A constraint between fields of the dataset."""
+
+    __slots__ = ("constraint_type", "fields_under_consideration", "related_fields")
+    _CHILDREN = {
+        "fields_under_consideration": ConstraintField,
+        "related_fields": ConstraintField,
+    }
+
+
+class Dataset(_Record):
+    """The root object of the metadata."""
+
+    __slots__ = ("path", "tables", "foreign_keys", "constraints")
+    _CHILDREN = {
+        "tables": Table,
+        "foreign_keys": ForeignKey,
+        "constraints": Constraint,
+    }
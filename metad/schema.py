@@ -0,0 +1,120 @@
+"""Validators for the JSON schema.
+
+The validators are generated by `fastjsonschema` the first time they are
+used rather than when `metad` is imported. The generated code is cached on
+disk, keyed on the hash of `schema.json` and the version of fastjsonschema,
+and loaded as a regular Python module so that its bytecode is cached too.
+The cache lives in `$METAD_CACHE_DIR` or, by default, in `metad` under
+`$XDG_CACHE_HOME` (`~/.cache`). If the cache can't be written, the
+validators are compiled in memory.
+
+The modules needed to generate, hash and cache the validators are imported
+when the first validator is requested, to keep `import metad` fast.
+"""
+import json
+import os
+
+base_directory = os.path.dirname(__file__)
+path_to_schema = os.path.join(base_directory, "schema.json")
+
+_SUBSCHEMAS = {
+    "metadata": (),
+    "table": ("properties", "tables", "items"),
+    "field": ("properties", "tables", "items", "properties", "fields", "items"),
+    "foreign_key": ("properties", "foreign_keys", "items"),
+    "constraint": ("properties", "constraints", "items"),
+}
+
+_validators = {}
+_schema = {}
+
+
+def _cache_directory():
+    if os.environ.get("METAD_CACHE_DIR"):
+        return os.environ["METAD_CACHE_DIR"]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "metad")
+
+
+def _load_module(name, path):
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _compile(name, schema, digest):
+    import re
+    import tempfile
+
+    import fastjsonschema
+
+    definition = schema
+    for key in _SUBSCHEMAS[name]:
+        definition = definition[key]
+
+    path_to_module = os.path.join(_cache_directory(), "%s_%s.py" % (name, digest))
+    module_name = "metad_schema_%s_%s" % (name, digest)
+    if os.path.exists(path_to_module):
+        try:
+            return _load_module(module_name, path_to_module).metad_validate
+        except Exception:
+            pass
+
+    code = fastjsonschema.compile_to_code(definition)
+    entry_point = re.search(r"^def (\w+)\(", code, re.MULTILINE).group(1)
+    code += "\n\nmetad_validate = %s\n" % entry_point
+    try:
+        os.makedirs(os.path.dirname(path_to_module), exist_ok=True)
+        fd, path_to_temp = tempfile.mkstemp(dir=os.path.dirname(path_to_module), suffix=".tmp")
+        with os.fdopen(fd, "wt") as fout:
+            fout.write(code)
+        os.replace(path_to_temp, path_to_module)
+        return _load_module(module_name, path_to_module).metad_validate
+    except OSError:
+        namespace = {}
+        exec(compile(code, "<%s>" % module_name, "exec"), namespace)
+        return namespace["metad_validate"]
+
+
+def _load_schema():
+    if not _schema:
+        import hashlib
+
+        import fastjsonschema
+
+        with open(path_to_schema, "rb") as fin:
+            content = fin.read()
+        _schema["digest"] = hashlib.sha256(
+            content + fastjsonschema.VERSION.encode()).hexdigest()[:16]
+        _schema["definition"] = json.loads(content.decode("utf-8"))
+    return _schema
+
+
+def schema_digest():
+    """Get a digest which changes whenever the validation rules change.
+
+    Returns:
+        str: The hash of `schema.json` and the version of fastjsonschema.
+    """
+    return _load_schema()["digest"]
+
+
+def get_validator(name):
+    """Get the validator for the metadata or one of its objects.
+
+    Args:
+        name (str): One of `metadata`, `table`, `field`, `foreign_key` or
+            `constraint`.
+
+    Returns:
+        callable: A function which takes the object and raises a
+        `fastjsonschema.JsonSchemaException` if it is not valid.
+    """
+    if name not in _validators:
+        schema = _load_schema()
+        _validators[name] = _compile(name, schema["definition"], schema["digest"])
+    return _validators[name]
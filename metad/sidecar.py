@@ -0,0 +1,107 @@
+"""Binary sidecar cache of parsed and validated metadata files.
+
+The sidecar of `metadata.json` is `metadata.json.cache`, a pickle which
+holds the metadata dictionary together with the size, modification time
+and SHA-256 hash of the JSON file it was created from, and the digest of
+the schema it was validated against. It is used only while the JSON file
+and the schema are unchanged: when the size and modification time match it
+is loaded right away, and when only the modification time differs (the file
+was touched or copied) the hash of the file decides.
+
+Sidecars are unpickled, so they must be kept where only trusted users can
+write, like the JSON files themselves.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+from metad.schema import schema_digest
+
+EXTENSION = ".cache"
+
+_VERSION = 1
+
+
+def path_to_sidecar(path_to_json):
+    """Get the path to the sidecar of a JSON file."""
+    return path_to_json + EXTENSION
+
+
+def _stat_key(stat):
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(2 ** 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def read(path_to_json):
+    """Load the metadata of a JSON file from its sidecar.
+
+    Args:
+        path_to_json (str): The path to the JSON file.
+
+    Returns:
+        dict: The metadata, or None if there is no usable sidecar.
+    """
+    try:
+        with open(path_to_sidecar(path_to_json), "rb") as fin:
+            entry = pickle.load(fin)
+        stat = os.stat(path_to_json)
+    except Exception:
+        # a truncated or stale sidecar fails in many ways while unpickling
+        return None
+
+    if not isinstance(entry, dict) or entry.get("version") != _VERSION:
+        return None
+    if entry.get("schema") != schema_digest():
+        return None
+
+    if entry["stat"] != _stat_key(stat):
+        if entry["size"] != stat.st_size or entry["sha256"] != _hash(path_to_json):
+            return None
+        entry["stat"] = _stat_key(stat)
+        _write(path_to_json, entry)
+
+    return entry["data"]
+
+
+def write(path_to_json, stat, content, data):
+    """Store the metadata of a JSON file in its sidecar.
+
+    Errors are ignored, since the sidecar is only an optimization.
+
+    Args:
+        path_to_json (str): The path to the JSON file.
+        stat (os.stat_result): The status of the file before it was read.
+        content (bytes): The content of the file.
+        data (dict): The validated metadata.
+    """
+    _write(path_to_json, {
+        "version": _VERSION,
+        "schema": schema_digest(),
+        "stat": _stat_key(stat),
+        "size": len(content),
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "data": data,
+    })
+
+
+def _write(path_to_json, entry):
+    path = path_to_sidecar(path_to_json)
+    try:
+        fd, path_to_temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                pickle.dump(entry, fout, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path_to_temp, path)
+        except BaseException:
+            os.remove(path_to_temp)
+            raise
+    except OSError:
+        pass
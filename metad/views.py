@@ -0,0 +1,93 @@
+"""Read-only views over the metadata dictionaries.
+
+The views wrap the dictionaries and lists stored in `MetaData.data` without
+copying them. Nested values are wrapped lazily when they are accessed, so
+creating a view costs the same regardless of the size of the metadata. The
+views reflect later changes to the metadata; use `copy.deepcopy` on a view
+to get a plain, mutable snapshot.
+"""
+import copy
+from collections.abc import Mapping, Sequence
+
+
+def read_only(value):
+    """Wrap a value from the metadata in a read-only view.
+
+    Args:
+        value: A dictionary, list or scalar value.
+
+    Returns:
+        ReadOnlyDict, ReadOnlyList or the scalar value itself.
+    """
+    if isinstance(value, dict):
+        return ReadOnlyDict(value)
+    if isinstance(value, list):
+        return ReadOnlyList(value)
+    return value
+
+
+class ReadOnlyDict(Mapping):
+    """Read-only view of a dictionary."""
+
+    __slots__ = ("_data", )
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return read_only(self._data[key])
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __eq__(self, other):
+        if isinstance(other, ReadOnlyDict):
+            other = other._data
+        return self._data == other
+
+    def __repr__(self):
+        return "ReadOnlyDict(%r)" % (self._data, )
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self._data, memo)
+
+
+class ReadOnlyList(Sequence):
+    """Read-only view of a list."""
+
+    __slots__ = ("_data", )
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ReadOnlyList(self._data[index])
+        return read_only(self._data[index])
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, value):
+        if isinstance(value, (ReadOnlyDict, ReadOnlyList)):
+            value = value._data
+        return value in self._data
+
+    def __eq__(self, other):
+        if isinstance(other, ReadOnlyList):
+            other = other._data
+        elif isinstance(other, tuple):
+            other = list(other)
+        return self._data == other
+
+    def __repr__(self):
+        return "ReadOnlyList(%r)" % (self._data, )
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self._data, memo)
@@ -19,6 +19,19 @@ install_requires = [
     'parameterized',
 ]
 
+arrow_requires = [
+    'pyarrow>=1.0',
+]
+
+compression_requires = [
+    'zstandard>=0.15',
+    'lz4>=3.0',
+]
+
+json_requires = [
+    'orjson>=3.0',
+]
+
 setup_requires = [
     'pytest-runner>=2.11.1',
 ]
@@ -27,7 +40,7 @@ tests_require = [
     'pytest>=3.4.2',
     'pytest-cov>=2.6.0',
     'rundoc>=0.4.3,<0.5',
-]
+] + arrow_requires + compression_requires + json_requires
 
 development_requires = [
     # general
@@ -74,6 +87,9 @@ setup(
     ],
     description='A hierarchical representation for the structure of a relational database.',
     extras_require={
+        'arrow': arrow_requires,
+        'compression': compression_requires,
+        'json': json_requires,
         'test': tests_require,
         'dev': development_requires + tests_require,
     },
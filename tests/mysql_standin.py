@@ -0,0 +1,214 @@
+"""A DB-API stand-in for the MySQL connector, used by the tests and the benchmarks.
+
+The stand-in answers the `INFORMATION_SCHEMA` queries issued by the
+`MySQLConnector` from an in-memory description of a schema, counts the
+queries and optionally sleeps on each one to simulate the round-trip
+latency of a remote server. Table data is served from lists of tuples,
+filtered by the conditions of the primary key ranges and of the subsets:
+seeded `rand` samples, `IN` lists and `BETWEEN` ranges.
+"""
+import ast
+import random
+import re
+import time
+import zlib
+
+from metad.connectors import MySQLConnector
+
+
+def _checksum(rows):
+    # stands for the checksum of the rows: it changes when the rows of the
+    # table are replaced, added or removed
+    return zlib.crc32(repr((id(rows), len(rows))).encode("utf-8"))
+
+
+def _sample(rows, seed, fraction=None, size=None):
+    # like RAND(seed), the same seed draws the same sequence
+    generator = random.Random(seed)
+    draws = [generator.random() for _ in rows]
+    if fraction is not None:
+        return [row for row, draw in zip(rows, draws) if draw < fraction]
+    order = sorted(range(len(rows)), key=draws.__getitem__)[:size]
+    return [rows[position] for position in order]
+
+
+def _where(columns, rows, condition):
+    match = re.match(r"\(?((?:`[^`]*`(?:, )?)+)\)? in \((.*)\)$", condition)
+    if match:
+        positions = [columns.index(name) for name in re.findall(r"`([^`]*)`", match.group(1))]
+        keys = set(ast.literal_eval("[%s]" % match.group(2)))
+        if len(positions) == 1:
+            return [row for row in rows if row[positions[0]] in keys]
+        return [row for row in rows if tuple(row[position] for position in positions) in keys]
+
+    match = re.match(r"`([^`]*)` >= (\S+) and `\1` < (\S+)$", condition)
+    if match:
+        position = columns.index(match.group(1))
+        low, high = ast.literal_eval(match.group(2)), ast.literal_eval(match.group(3))
+        return [
+            row for row in rows
+            if row[position] is not None and low <= row[position] < high
+        ]
+
+    ranges = re.findall(r"`([^`]*)` between (\S+) and (\S+)", condition)
+    if ranges:
+        position = columns.index(ranges[0][0])
+        bounds = [(ast.literal_eval(low), ast.literal_eval(high)) for _, low, high in ranges]
+        return [
+            row for row in rows
+            if any(low <= row[position] <= high for low, high in bounds)
+        ]
+
+    raise ValueError("Unsupported condition: %s" % condition)
+
+
+class StandInCursor():
+
+    def __init__(self, connection, dictionary):
+        self.connection = connection
+        self.dictionary = dictionary
+        self.description = None
+        self._rows = []
+
+    def execute(self, query, args=None):
+        self.connection.queries += 1
+        if self.connection.latency:
+            time.sleep(self.connection.latency)
+
+        if args:
+            query = query % tuple(repr(arg) for arg in args)
+        columns, rows = self.connection.answer(" ".join(query.split()))
+        self.description = [(column, ) for column in columns]
+        if self.dictionary:
+            rows = [dict(zip(columns, row)) for row in rows]
+        self._rows = rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def close(self):
+        pass
+
+
+class StandInConnection():
+    """In-memory stand-in for a `pymysql` connection.
+
+    Args:
+        database (str): The name of the database.
+        tables (dict): Mapping from table names to dictionaries with the
+            `columns` (list of (name, MySQL column type, column key)
+            tuples, like `("flag", "bit(1)", "")`) and
+            the `rows` (list of tuples) of the table, and optionally its
+            `update_time` (datetime).
+        foreign_keys (list): Tuples of (constraint name, table, column,
+            referenced table, referenced column).
+        latency (float): Seconds to sleep on each query.
+    """
+
+    def __init__(self, database, tables, foreign_keys=(), latency=0):
+        self.database = database
+        self.tables = tables
+        self.foreign_keys = list(foreign_keys)
+        self.latency = latency
+        self.queries = 0
+
+    def cursor(self, cursor_class=None):
+        dictionary = cursor_class is not None and "Dict" in cursor_class.__name__
+        return StandInCursor(self, dictionary)
+
+    def close(self):
+        pass
+
+    def answer(self, query):
+        if query.startswith("show tables"):
+            return ["Tables_in_%s" % self.database], [(name, ) for name in self.tables]
+
+        if "INFORMATION_SCHEMA.COLUMNS" in query:
+            match = re.search(r"table_name = '([^']*)'", query)
+            names = [match.group(1)] if match else sorted(self.tables)
+            rows = []
+            for name in names:
+                for column, column_type, key in self.tables[name]["columns"]:
+                    data_type = column_type.split("(")[0]
+                    rows.append((name, column, data_type, column_type, key))
+            return ["TABLE_NAME", "COLUMN_NAME", "DATA_TYPE", "COLUMN_TYPE", "COLUMN_KEY"], rows
+
+        if "INFORMATION_SCHEMA.KEY_COLUMN_USAGE" in query:
+            return [
+                "CONSTRAINT_NAME", "TABLE_NAME", "COLUMN_NAME",
+                "REFERENCED_TABLE_NAME", "REFERENCED_COLUMN_NAME"
+            ], self.foreign_keys
+
+        if "UPDATE_TIME" in query:
+            return ["TABLE_NAME", "UPDATE_TIME"], [
+                (name, table.get("update_time")) for name, table in self.tables.items()
+            ]
+
+        if query.startswith("CHECKSUM TABLE"):
+            names = re.findall(r"`([^`]*)`", query)
+            return ["Table", "Checksum"], [
+                ("%s.%s" % (self.database, name), _checksum(self.tables[name]["rows"]))
+                for name in names
+            ]
+
+        if "INFORMATION_SCHEMA.TABLES" in query:
+            return ["TABLE_NAME", "DATA_LENGTH", "TABLE_ROWS"], [
+                (name, len(table["rows"]) * len(table["columns"]), len(table["rows"]))
+                for name, table in self.tables.items()
+            ]
+
+        match = re.match(r"select \* from `([^`]*)`", query)
+        if match:
+            table = self.tables[match.group(1)]
+            columns = [column[0] for column in table["columns"]]
+            rows = list(table["rows"])
+            sample = re.search(r"where rand\((\d+)\) < (\S+);$", query)
+            if sample:
+                seed, fraction = int(sample.group(1)), float(sample.group(2))
+                return columns, _sample(rows, seed, fraction=fraction)
+            sample = re.search(r"order by rand\((\d+)\) limit (\d+);$", query)
+            if sample:
+                seed, size = int(sample.group(1)), int(sample.group(2))
+                return columns, _sample(rows, seed, size=size)
+            condition = re.search(r"where (.*?)(?: order by `([^`]*)`)?;$", query)
+            if condition:
+                rows = _where(columns, rows, condition.group(1))
+                if condition.group(2):
+                    position = columns.index(condition.group(2))
+                    rows.sort(key=lambda row: row[position])
+            return columns, rows
+
+        match = re.match(r"select min\(`([^`]*)`\), max\(`\1`\) from `([^`]*)`;$", query)
+        if match:
+            table = self.tables[match.group(2)]
+            position = [column[0] for column in table["columns"]].index(match.group(1))
+            values = [row[position] for row in table["rows"] if row[position] is not None]
+            return ["min", "max"], [(min(values), max(values)) if values else (None, None)]
+
+        raise ValueError("Unsupported query: %s" % query)
+
+
+def connect(connection, connector_class=MySQLConnector, **kwargs):
+    """Create a connector which talks to the given stand-in connection.
+
+    Args:
+        connection (StandInConnection): The stand-in connection, shared by
+            all the connections which the connector opens.
+        connector_class (type): The connector class to instantiate.
+        **kwargs: The other arguments of the connector (e.g. `chunk_size`).
+
+    Returns:
+        MySQLConnector: The connector, with its metadata already loaded.
+    """
+    return connector_class(
+        host=None, port=None, user=None, password=None, database=connection.database,
+        connection_factory=lambda: connection, **kwargs)
@@ -0,0 +1,657 @@
+"""Tests for `metad.connectors` package."""
+
+import datetime
+import decimal
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from mysql_standin import StandInConnection, StandInCursor, connect
+from parameterized import parameterized
+
+from metad import MetaData
+from metad.connectors import DataFrameConnector, MySQLConnector, profiling
+from metad.connectors.manifest import ExportManifest, file_hash
+from metad.formats import FORMATS, count_rows, open_text, read_table
+from metad.loader import convert
+
+
+def _standin(number_of_users=30):
+    """Serve a database of users and their orders through the MySQL stand-in."""
+    tables = {
+        "users": {
+            "columns": [("user_id", "int", "PRI"), ("name", "varchar", ""), ("age", "int", ""),
+                        ("signup", "datetime", "")],
+            "rows": [
+                # the first users have no age or signed up at midnight
+                (i, "user %s" % i, None if i % 7 == 0 else 20 + i % 50,
+                 datetime.datetime(2020, 1, i % 28 + 1, 0 if i < 12 else i % 24))
+                for i in range(1, number_of_users + 1)
+            ],
+        },
+        "orders": {
+            "columns": [("order_id", "int", "PRI"), ("user_id", "int", "MUL"),
+                        ("total", "double", "")],
+            "rows": [
+                (1000 + i, i % number_of_users + 1, i / 4) for i in range(2 * number_of_users)
+            ],
+        },
+    }
+    foreign_keys = [("fk_orders_users", "orders", "user_id", "users", "user_id")]
+    return StandInConnection("shop", tables, foreign_keys)
+
+
+class TestDataFrameConnector(TestCase):
+
+    def setUp(self):
+        self.tables = {
+            "users": pd.DataFrame({
+                "user_id": [1, 2, 3],
+                "name": ["a", "b", None],
+                "birthday": pd.to_datetime(["2000-01-01", "2001-02-03", "2002-03-04"]),
+            }),
+            "sessions": pd.DataFrame({
+                "session_id": [1, 2],
+                "user_id": [1, 3],
+                "duration": [1.5, 2.0],
+            })
+        }
+
+    @parameterized.expand([("csv", pd.read_csv), ("parquet", pd.read_parquet),
+                           ("feather", pd.read_feather)])
+    def test_export(self, format, read):
+        connector = DataFrameConnector(self.tables)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output, format=format)
+
+            metadata = MetaData.from_json(os.path.join(path_to_output, "metadata.json"))
+            metadata.validate()
+            for table in metadata.get_tables():
+                assert table["path"] == "%s.%s" % (table["name"], format)
+                dataframe = read(os.path.join(path_to_output, table["path"]))
+                assert list(dataframe.columns) == list(self.tables[table["name"]].columns)
+                assert len(dataframe) == len(self.tables[table["name"]])
+                assert table["number_of_rows"] == len(dataframe)
+                assert count_rows(os.path.join(path_to_output, table["path"])) == len(dataframe)
+
+    def test_export_types(self):
+        connector = DataFrameConnector(self.tables)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output, format="parquet")
+            with open(os.path.join(path_to_output, "metadata.json")) as fin:
+                assert json.load(fin)["tables"][0]["path"] == "users.parquet"
+
+            dataframe = pd.read_parquet(os.path.join(path_to_output, "users.parquet"))
+            assert dataframe["user_id"].dtype.kind == "i"
+            assert dataframe["birthday"].dtype.kind == "M"
+            assert dataframe["name"].isnull().sum() == 1
+
+    def test_infer_types(self):
+        rows = 1000
+        dataframe = pd.DataFrame({
+            "id": range(rows),
+            "account_id": ["%08x-0000-0000-0000-000000000000" % i for i in range(rows)],
+            "paid": [True, False] * (rows // 2),
+            "valid": ["TRUE", "false"] * (rows // 2),
+            "count": pd.Series(range(rows), dtype="uint32"),
+            "score": [1.0, None] * (rows // 2),
+            "ratio": [0.5] * rows,
+            "amount": ["12.5", "3"] * (rows // 2),
+            "zip": ["02139", "94305"] * (rows // 2),
+            "created": ["2020-01-%02d 10:00" % (i % 28 + 1) for i in range(rows)],
+            "delay": pd.to_timedelta(range(rows), unit="s"),
+            "color": ["red", "green", "blue", "red"] * (rows // 4),
+            "comment": ["comment number %s is free text" % i for i in range(rows)],
+            "empty": [None] * rows,
+        })
+        connector = DataFrameConnector({"table": dataframe}, sample_size=100)
+        connector.metadata.validate()
+        fields = {
+            field["name"]: (field["data_type"], field.get("data_subtype"))
+            for field in connector.metadata.get_table("table")["fields"]
+        }
+        assert fields == {
+            "id": ("id", "integer"),
+            "account_id": ("id", None),
+            "paid": ("categorical", "boolean"),
+            "valid": ("categorical", "boolean"),
+            "count": ("numerical", "integer"),
+            "score": ("numerical", "integer"),
+            "ratio": ("numerical", "float"),
+            "amount": ("numerical", "float"),
+            "zip": ("categorical", None),
+            "created": ("datetime", None),
+            "delay": ("other", None),
+            "color": ("categorical", None),
+            "comment": ("text", None),
+            "empty": ("categorical", None),
+        }
+
+    def test_discover_keys(self):
+        tables = {
+            "users": pd.DataFrame({
+                "user_id": range(1, 21),
+                "name": ["user %s" % i for i in range(20)],
+            }),
+            "orders": pd.DataFrame({
+                "order_id": range(1000, 1041),
+                "user_id": list(range(1, 21)) * 2 + [99],
+            }),
+            "order_lines": pd.DataFrame({
+                "order_id": [1000, 1000, 1001, 1002],
+                "line": [0, 1, 0, 0],
+                "price": [1.5, 2.5, 3.5, 4.5],
+            }),
+            "returns": pd.DataFrame({
+                "return_id": [1, 2],
+                "order_id": [1000, 1000],
+                "line": [0, 1],
+            }),
+        }
+        connector = DataFrameConnector(tables, discover_keys=True)
+        metadata = connector.metadata
+        metadata.validate()
+
+        primary_keys = {table["name"]: table["primary_key"] for table in metadata.get_tables()}
+        assert primary_keys == {
+            "users": "user_id",
+            "orders": "order_id",
+            "order_lines": ["order_id", "line"],
+            "returns": "return_id",
+        }
+
+        names = {table["id"]: table["name"] for table in metadata.get_tables()}
+        foreign_keys = {
+            (names[key["table"]], str(key["field"]), names[key["ref_table"]],
+             str(key["ref_field"])): key["confidence"]
+            for key in metadata.get_foreign_keys()
+        }
+        assert foreign_keys == {
+            ("orders", "user_id", "users", "user_id"): 0.9524,
+            ("order_lines", "order_id", "orders", "order_id"): 1.0,
+            ("returns", "['order_id', 'line']", "order_lines", "['order_id', 'line']"): 1.0,
+        }
+
+        fields = {field["name"]: field for field in metadata.get_table("orders")["fields"]}
+        assert fields["user_id"]["data_type"] == "id"
+
+        # a column named after a table doesn't reference the keys of the others
+        tables = {
+            "b": pd.DataFrame({"b_id": [1, 2], "a_id": [1, 2]}),
+            "a": pd.DataFrame({"a_id": pd.Series([], dtype=int)}),
+        }
+        assert DataFrameConnector(tables, discover_keys=True).metadata.get_foreign_keys() == []
+        # nor when the table has no key
+        tables["a"] = pd.DataFrame({"score": pd.Series([], dtype=float)})
+        tables["c"] = pd.DataFrame({"c_id": [1, 2]})
+        tables["b"]["c_id"] = [2, 1]
+        foreign_keys = DataFrameConnector(tables, discover_keys=True).metadata.get_foreign_keys()
+        assert [(key["field"], key["ref_field"]) for key in foreign_keys] == [("c_id", "c_id")]
+
+    def test_profile(self):
+        self.tables["users"]["name"] = ["a", "bcd", None]
+        connector = DataFrameConnector(self.tables, profile=True)
+        connector.metadata.validate()
+
+        table = connector.metadata.get_table("users")
+        fields = {field["name"]: field for field in table["fields"]}
+        assert fields["user_id"]["stats"] == {
+            "count": 3, "null_count": 0, "distinct_count": 3, "min": 1, "max": 3,
+            "top_values": []}
+        assert fields["name"]["stats"]["null_count"] == 1
+        assert fields["name"]["stats"]["length"] == {"min": 1, "max": 3, "mean": 2.0}
+        assert fields["birthday"]["stats"]["min"] == "2000-01-01T00:00:00"
+
+        rows = 10000
+        values = pd.Series(np.arange(rows) % 7, dtype=float)
+        values[::10] = None
+        whole = profiling.ColumnProfile()
+        whole.update(values)
+        merged = profiling.ColumnProfile()
+        for start in range(0, rows, 999):
+            part = profiling.ColumnProfile()
+            part.update(values[start:start + 999])
+            merged.merge(part)
+        merged, whole = merged.to_dict(), whole.to_dict()
+        for stats in (merged, whole):
+            stats["top_values"].sort(key=lambda top: (-top["count"], top["value"]))
+        assert merged == whole
+        nullable = profiling.ColumnProfile()
+        nullable.update(values.astype("Int64"))
+        nullable = nullable.to_dict()
+        nullable["top_values"].sort(key=lambda top: (-top["count"], top["value"]))
+        assert nullable == whole
+        assert whole["distinct_count"] == 7
+        assert whole["top_values"][0] == {"value": 0, "count": 1286}
+
+        # integers beyond int64 and infinite values
+        large = profiling.ColumnProfile()
+        large.update(pd.Series([1e20, 2e20, 2e20, None]))
+        assert large.to_dict() == {
+            "count": 3, "null_count": 1, "distinct_count": 2, "min": 1e20, "max": 2e20,
+            "top_values": [{"value": 2e20, "count": 2}]}
+        infinite = profiling.ColumnProfile()
+        infinite.update(pd.Series([1.5, np.inf, -np.inf, None]))
+        stats = infinite.to_dict()
+        assert (stats["count"], stats["min"], stats["max"]) == (3, 1.5, 1.5)
+        json.dumps(stats, allow_nan=False)
+
+        many = profiling.ColumnProfile()
+        many.update(pd.Series(np.arange(100000).astype(str)))
+        assert abs(many.to_dict()["distinct_count"] - 100000) < 5000
+
+    @parameterized.expand([("gzip", "csv.gz"), ("zstd", "csv.zst"), ("lz4", "csv.lz4")])
+    def test_export_compression(self, compression, extension):
+        connector = DataFrameConnector(self.tables)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output, compression=compression)
+
+            metadata = MetaData.from_json(os.path.join(path_to_output, "metadata.json"))
+            metadata.validate()
+            for table in metadata.get_tables():
+                assert table["path"] == "%s.%s" % (table["name"], extension)
+                assert table["compression"] == compression
+                with open_text(os.path.join(path_to_output, table["path"]), "rt",
+                               compression) as fin:
+                    assert fin.read() == self.tables[table["name"]].to_csv(index=False)
+
+    @parameterized.expand([(None, ), ("gzip", ), ("lz4", )])
+    def test_count_rows(self, compression):
+        self.tables["users"]["name"] = ['quoted "name"', "two\nlines", '"\n\n"']
+        connector = DataFrameConnector(self.tables)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output, compression=compression)
+
+            path_to_json = os.path.join(path_to_output, "metadata.json")
+            metadata = MetaData.from_json(path_to_json)
+            for table in metadata.get_tables():
+                table["number_of_rows"] = len(self.tables[table["name"]])
+            expected = metadata.get_tables()
+            assert metadata.count_rows(path_to_output, max_workers=2) == {
+                "users": 3, "sessions": 2}
+            assert metadata.get_tables() == expected
+
+            path_to_file = os.path.join(path_to_output, "no_header.csv")
+            with open(path_to_file, "wt") as fout:
+                fout.write('1,"a\r\nb"\r\n2,c')
+            assert count_rows(path_to_file, header=False) == 2
+
+    @parameterized.expand([("csv", ), ("parquet", )])
+    def test_get_loader(self, format):
+        self.tables["users"]["country"] = ["fr", "us", "fr"]
+        connector = DataFrameConnector(self.tables, discover_keys=True)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output, format=format)
+            metadata = MetaData.from_json(os.path.join(path_to_output, "metadata.json"))
+            loader = metadata.get_loader(path_to_output)
+
+            users = loader.load("users")
+            assert users["user_id"].dtype == np.uint8
+            assert users["birthday"].dtype.kind == "M"
+            assert isinstance(users["country"].dtype, pd.CategoricalDtype)
+            assert users["user_id"].tolist() == [1, 2, 3]
+
+            # the projection is served by the cached table
+            assert loader.load("users", ["country", "user_id"]).columns.tolist() == [
+                "country", "user_id"]
+            assert list(loader._cache) == [("users", None)]
+
+            chunks = list(loader.iter_chunks("sessions", ["duration"], chunk_size=1))
+            assert [chunk["duration"].tolist() for chunk in chunks] == [[1.5], [2.0]]
+
+            loader.memory_budget = loader.memory_usage
+            loader.load("sessions")
+            assert list(loader._cache) == [("sessions", None)]
+            with self.assertRaises(ValueError):
+                loader.load("unknown")
+
+    @parameterized.expand([(False, ), (True, )])
+    def test_loader_types(self, profile):
+        tables = {"items": pd.DataFrame({
+            "item_id": [1, 2, None, 300],
+            "count": [1.0, 2.0, 3.0, 4.5],
+            "flag": [b"\x01", b"\x00", None, b"\x01"],
+            "code": [b"a", b"b", b"\xff", None],
+        })}
+        connector = DataFrameConnector(tables, profile=profile)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output)
+            metadata = MetaData.from_json(os.path.join(path_to_output, "metadata.json"))
+            # the subtype of the field was inferred from a sample without fractions
+            metadata.get_table("items")["fields"][1]["data_subtype"] = "integer"
+            loader = metadata.get_loader(path_to_output)
+
+            # every chunk of an id gets the same type
+            chunks = list(loader.iter_chunks("items", ["item_id", "count"], chunk_size=2))
+            assert [str(chunk["item_id"].dtype) for chunk in chunks] == [
+                "UInt16" if profile else "Int64"] * 2
+            assert chunks[1]["count"].tolist() == [3.0, 4.5]
+            assert loader.load("items")["count"].dtype == np.float64
+
+        flag = convert(tables["items"]["flag"], {
+            "data_type": "categorical", "data_subtype": "boolean"})
+        assert flag.tolist() == [True, False, pd.NA, True]
+        code = convert(tables["items"]["code"], {"data_type": "categorical"})
+        assert code.tolist()[:3] == ["a", "b", "\\xff"]
+
+    def test_export_manifest(self):
+        table = {"name": "users", "fields": [{"name": "id", "stats": {"count": 2}}],
+                 "number_of_rows": 2}
+        fingerprint = {"checksum": 1}
+        with tempfile.TemporaryDirectory() as path_to_output:
+            with open(os.path.join(path_to_output, "users.csv"), "wt") as fout:
+                fout.write("id\n1\n2\n")
+            ExportManifest(path_to_output).record(table, fingerprint, "users.csv")
+            manifest = ExportManifest(path_to_output)
+            assert manifest.tables["users"]["sha256"] == file_hash(
+                os.path.join(path_to_output, "users.csv"))
+
+            restored = {"name": "users", "fields": [{"name": "id"}]}
+            assert manifest.restore(restored, fingerprint, "users.csv", profile=True)
+            assert restored == table
+            assert not manifest.restore(restored, {"checksum": 2}, "users.csv")
+            assert not manifest.restore(restored, None, "users.csv")
+            assert not manifest.restore(restored, fingerprint, "users.csv.gz")
+
+            # a file modified in place keeps its size but not its hash
+            with open(os.path.join(path_to_output, "users.csv"), "wt") as fout:
+                fout.write("id\n1\n3\n")
+            assert not manifest.restore(restored, fingerprint, "users.csv")
+
+            # the parts of a table which changed are exported again
+            manifest.record_part("users", fingerprint, (0, 10), 5)
+            path_to_part = os.path.join(path_to_output, "users.csv")
+            assert manifest.part("users", fingerprint, (0, 10), path_to_part) == 5
+            assert manifest.part("users", {"checksum": 2}, (0, 10), path_to_part) is None
+
+    def test_export_subset(self):
+        tables = {
+            "users": pd.DataFrame({
+                "user_id": range(1, 21),
+                "name": ["user %s" % i for i in range(20)],
+            }),
+            "orders": pd.DataFrame({
+                "order_id": range(1000, 1040),
+                "user_id": list(range(1, 21)) * 2,
+            }),
+            "order_lines": pd.DataFrame({
+                "order_id": [order_id for order_id in range(1000, 1040) for _ in range(3)],
+                "line": [0, 1, 2] * 40,
+                "price": np.arange(120) / 2,
+            }),
+        }
+        connector = DataFrameConnector(tables, discover_keys=True)
+        assert len(connector.metadata.get_foreign_keys()) == 2
+        with tempfile.TemporaryDirectory() as path_to_output:
+            counts = connector.export_subset(path_to_output, size=5, seed=1)
+            metadata = MetaData.from_json(os.path.join(path_to_output, "metadata.json"))
+            assert metadata.validate_data(path_to_output) == []
+            assert counts["order_lines"] == 5
+            assert 0 < counts["users"] <= counts["orders"] <= 5
+            assert counts == {
+                table["name"]: table["number_of_rows"] for table in metadata.get_tables()}
+
+        with tempfile.TemporaryDirectory() as path_to_output:
+            counts = connector.export_subset(path_to_output, tables=["users"], fraction=0.1,
+                                             children=True)
+            metadata = MetaData.from_json(os.path.join(path_to_output, "metadata.json"))
+            assert metadata.validate_data(path_to_output) == []
+            assert counts == {"users": 2, "orders": 4, "order_lines": 12}
+
+            orders = pd.read_csv(os.path.join(path_to_output, "orders.csv"))
+            users = pd.read_csv(os.path.join(path_to_output, "users.csv"))
+            assert set(orders["user_id"]) == set(users["user_id"])
+
+        with tempfile.TemporaryDirectory() as path_to_output:
+            counts = connector.export_subset(path_to_output, tables=["users"], size=2)
+            assert counts == {"users": 2, "orders": 0, "order_lines": 0}
+
+    def test_export_compression_format(self):
+        connector = DataFrameConnector(self.tables)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            with self.assertRaises(ValueError):
+                connector.export(path_to_output, format="parquet", compression="gzip")
+
+
+class TestMySQLConnector(TestCase):
+
+    def _export(self, connection=None, **kwargs):
+        connector = connect(connection or _standin(), **kwargs)
+        files = {}
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output)
+            for name in os.listdir(path_to_output):
+                with open(os.path.join(path_to_output, name), "rb") as fin:
+                    files[name] = fin.read()
+        return files
+
+    def test_introspection(self):
+        connection = _standin()
+        metadata = connect(connection).metadata
+        metadata.validate()
+        fields = {
+            field["name"]: (field["data_type"], field.get("data_subtype"))
+            for field in metadata.get_table("users")["fields"]
+        }
+        assert fields == {
+            "user_id": ("numerical", "integer"),
+            "name": ("categorical", None),
+            "age": ("numerical", "integer"),
+            "signup": ("datetime", None),
+        }
+        assert metadata.get_table("orders")["primary_key"] == "order_id"
+        assert metadata.get_foreign_keys() == [{
+            "table": "orders", "field": "user_id", "ref_table": "users", "ref_field": "user_id"}]
+
+        # the columns and foreign keys of all the tables are read at once
+        tables = {
+            "table_%s" % i: {"columns": [("id", "int", "PRI"), ("parent_id", "int", "")],
+                             "rows": []}
+            for i in range(50)
+        }
+        foreign_keys = [
+            ("fk_%s" % i, "table_%s" % i, "parent_id", "table_%s" % (i // 2), "id")
+            for i in range(1, 50)
+        ]
+        large = StandInConnection("large", tables, foreign_keys)
+        assert len(connect(large).metadata.get_foreign_keys()) == 49
+        assert large.queries == connection.queries == 3
+
+    def test_export_concurrently(self):
+        serial = self._export()
+        assert sorted(serial) == ["metadata.json", "orders.csv", "users.csv"]
+        assert serial["users.csv"].startswith(
+            b"user_id,name,age,signup\n1,user 1,21,2020-01-02 00:00:00\n")
+        assert self._export(max_workers=3) == serial
+
+    def test_export_partitions(self):
+        connector = connect(_standin(), max_workers=2, partition_rows=7)
+        users = connector.metadata.get_table("users")
+        assert connector._key_ranges(users, 30) == [
+            (1, 7), (7, 13), (13, 19), (19, 25), (25, 31)]
+        assert connector._key_ranges(users, 7) is None
+
+        serial = self._export()
+        assert self._export(max_workers=2, partition_rows=7) == serial
+        assert self._export(max_workers=3, partition_rows=7, chunk_size=4) == serial
+        with self.assertRaises(ValueError):
+            connect(_standin(), partition_rows=7)
+
+    def test_export_chunks(self):
+        whole = self._export()
+        assert b"\n7,user 7,,2020-01-08 00:00:00\n" in whole["users.csv"]
+        assert b"\n8,user 8,28,2020-01-09 00:00:00\n" in whole["users.csv"]
+        assert self._export(chunk_size=5) == whole
+        assert self._export(chunk_size=5, profile=True)["users.csv"] == whole["users.csv"]
+
+    def test_export_subset(self):
+        # the subsets are written like the exports, integers with missing
+        # values and datetimes at midnight included
+        whole = self._export()
+        connector = connect(_standin())
+        with tempfile.TemporaryDirectory() as path_to_output:
+            counts = connector.export_subset(path_to_output, tables=["users"], fraction=1.0,
+                                             children=True)
+            assert counts == {"users": 30, "orders": 60}
+            for name in ("users.csv", "orders.csv"):
+                with open(os.path.join(path_to_output, name), "rb") as fin:
+                    lines = fin.read().splitlines()
+                assert sorted(lines) == sorted(whole[name].splitlines())
+
+    def test_export_failure(self):
+        # a failure while streaming closes the cursor and removes the file
+        connector = connect(_standin(), chunk_size=5)
+        chunks = []
+
+        def write(writer, dataframe):
+            chunks.append(dataframe)
+            if len(chunks) == 2:
+                raise RuntimeError("disconnected")
+
+        with tempfile.TemporaryDirectory() as path_to_output, \
+                patch.object(StandInCursor, "close", autospec=True) as close, \
+                patch.object(FORMATS["csv"], "write", write):
+            with self.assertRaises(RuntimeError):
+                connector.export(path_to_output)
+            assert close.called
+            assert not [name for name in os.listdir(path_to_output) if name.endswith(".tmp")]
+
+    def test_export_incremental(self):
+        connection = _standin()
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connect(connection, incremental=True).export(path_to_output)
+            with open(os.path.join(path_to_output, "users.csv"), "rb") as fin:
+                users = fin.read()
+
+            # the tables which didn't change are not read again
+            connector = connect(connection, incremental=True)
+            queries = connection.queries
+            with patch.object(MySQLConnector, "_export_table") as export_table:
+                connector.export(path_to_output)
+            assert not export_table.called
+            assert connection.queries - queries == 1
+
+            # only the tables which changed are exported again
+            connection.tables["orders"]["rows"] = connection.tables["orders"]["rows"][:10]
+            connector = connect(connection, incremental=True)
+            connector.export(path_to_output)
+            assert connector.metadata.get_table("orders")["number_of_rows"] == 10
+            with open(os.path.join(path_to_output, "users.csv"), "rb") as fin:
+                assert fin.read() == users
+
+    def test_export_resume(self):
+        connection = _standin()
+        export_table = MySQLConnector._export_table
+        exported = []
+
+        def interrupted(connector, db, output_format, table, path, key_range=None,
+                        header=True):
+            if key_range == (13, 19):
+                raise KeyboardInterrupt()
+            return export_table(connector, db, output_format, table, path, key_range, header)
+
+        def resumed(connector, db, output_format, table, path, key_range=None, header=True):
+            exported.append((table["name"], key_range))
+            return export_table(connector, db, output_format, table, path, key_range, header)
+
+        with tempfile.TemporaryDirectory() as path_to_output:
+            kwargs = {"incremental": True, "max_workers": 2, "partition_rows": 7}
+            with patch.object(MySQLConnector, "_export_table", interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    connect(connection, **kwargs).export(path_to_output)
+            manifest = ExportManifest(path_to_output)
+            done = [
+                tuple(int(key) for key in key_range.split("-"))
+                for key_range in manifest.tables["users"]["parts"]
+            ]
+            assert (13, 19) not in done
+
+            # the estimate of the number of rows changes, not the key ranges
+            connector = connect(connection, **kwargs)
+            statistics = {"users": (0, 60), "orders": (0, 60)}
+            with patch.object(MySQLConnector, "_export_table", resumed), \
+                    patch.object(MySQLConnector, "_table_statistics", return_value=statistics):
+                connector.export(path_to_output)
+            users = [key_range for name, key_range in exported if name == "users"]
+            assert (13, 19) in users
+            assert not set(users) & set(done)
+
+            files = {}
+            for name in os.listdir(path_to_output):
+                with open(os.path.join(path_to_output, name), "rb") as fin:
+                    files[name] = fin.read()
+
+        serial = self._export()
+        assert files["users.csv"] == serial["users.csv"]
+        assert files["orders.csv"] == serial["orders.csv"]
+
+    @parameterized.expand([("parquet", ), ("feather", )])
+    def test_export_arrow(self, format):
+        # the first chunk of some columns only has missing values
+        rows = [(i, None, None, None, None, None) for i in range(1, 4)] + [
+            (4, decimal.Decimal("12.50"), b"\x01", datetime.date(2020, 1, 2),
+             datetime.timedelta(hours=10), b"data"),
+            (5, decimal.Decimal("3.25"), b"\x00", None, None, None),
+        ]
+        connection = StandInConnection("shop", {"items": {
+            "columns": [("item_id", "int", "PRI"), ("price", "decimal", ""),
+                        ("flag", "bit(1)", ""), ("day", "date", ""), ("at", "time", ""),
+                        ("data", "blob", "")],
+            "rows": rows,
+        }}, [])
+        connector = connect(connection, chunk_size=3)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connector.export(path_to_output, format=format)
+            path = os.path.join(path_to_output, "items.%s" % format)
+            items = next(read_table(path))
+
+        assert items["item_id"].tolist() == [1, 2, 3, 4, 5]
+        assert items["price"].tolist()[3:] == [12.5, 3.25]
+        assert items["flag"].tolist()[3:] == [True, False]
+        assert items["day"].tolist()[3] == pd.Timestamp("2020-01-02")
+        assert items["at"].tolist()[3] == pd.Timestamp("1970-01-01 10:00")
+        assert items["data"].tolist()[3] == "data"
+        assert items.iloc[:3, 1:].isnull().all().all()
+
+        # the ids without a subtype are strings, whatever their values
+        table = {"fields": [{"name": "item_id", "data_type": "id"}]}
+        with tempfile.TemporaryDirectory() as path_to_output:
+            path = os.path.join(path_to_output, "items.%s" % format)
+            writer = FORMATS[format](path, table)
+            writer.write(pd.DataFrame({"item_id": [None, None]}, dtype=object))
+            writer.write(pd.DataFrame({"item_id": [1, 2]}))
+            writer.close()
+            assert next(read_table(path))["item_id"].tolist()[2:] == ["1", "2"]
+
+    def test_export_bits(self):
+        # only bit(1) columns are flags, binary and wider bit columns are bytes
+        uuid = bytes(range(16))
+        connection = StandInConnection("shop", {"items": {
+            "columns": [("item_id", "int", "PRI"), ("flag", "bit(1)", ""),
+                        ("uuid", "binary(16)", ""), ("mask", "bit(8)", "")],
+            "rows": [(1, b"\x01", uuid, b"\x05"), (2, b"\x00", None, b"\x00")],
+        }}, [])
+        fields = {
+            field["name"]: (field["data_type"], field.get("data_subtype"))
+            for field in connect(connection).metadata.get_table("items")["fields"]
+        }
+        assert fields["flag"] == ("categorical", "boolean")
+        assert fields["uuid"] == ("other", None)
+        assert fields["mask"] == ("other", None)
+
+        items = pd.read_csv(io.BytesIO(self._export(connection)["items.csv"]))
+        assert items["flag"].tolist() == [True, False]
+        assert items["uuid"].tolist()[0] == str(uuid)
+        assert items["mask"].tolist() == [str(b"\x05"), str(b"\x00")]
+
+        with tempfile.TemporaryDirectory() as path_to_output:
+            connect(connection).export(path_to_output, format="parquet")
+            items = next(read_table(os.path.join(path_to_output, "items.parquet")))
+        assert items["flag"].tolist() == [True, False]
+        assert items["uuid"].tolist()[0] == uuid.decode("utf-8", "backslashreplace")
+        assert items["mask"].tolist() == ["\x05", "\x00"]
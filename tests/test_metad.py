@@ -1,11 +1,22 @@
 """Tests for `metad` package."""
 
+import contextlib
+import copy
+import io
+import json
+import math
+import os
+import tempfile
 from glob import glob
 from unittest import TestCase
+from unittest.mock import patch
 
+import pandas as pd
+from fastjsonschema import JsonSchemaException
 from parameterized import parameterized
 
-from metad import MetaData
+from metad import MetaData, jsonio, schema
+from metad.model import Table
 
 
 class TestMetaData(TestCase):
@@ -32,3 +43,428 @@ class TestMetaData(TestCase):
         })
         assert len(metadata.get_table_names()) == 1
         assert "users" in metadata.get_table_names()
+
+    def test_incremental_validation(self):
+        metadata = MetaData()
+        metadata.add_table({
+            "id": "users",
+            "name": "users",
+            "fields": [{"name": "user_id", "data_type": "id"}]
+        })
+        with self.assertRaises(AssertionError):
+            metadata.add_table({"id": "users", "name": "users", "fields": []})
+        with self.assertRaises(AssertionError):
+            metadata.add_table({
+                "id": "sessions",
+                "name": "sessions",
+                "fields": [{"name": "session_id"}, {"name": "session_id"}]
+            })
+        with self.assertRaises(AssertionError):
+            metadata.add_foreign_key({
+                "table": "users",
+                "field": "user_id",
+                "ref_table": "sessions",
+                "ref_field": "session_id"
+            })
+        with self.assertRaises(AssertionError):
+            metadata.add_field("users", {"name": "user_id"})
+
+        # rejected objects are not added
+        assert len(metadata.data["tables"]) == 1
+        assert len(metadata.data["foreign_keys"]) == 0
+        assert len(metadata.data["tables"][0]["fields"]) == 1
+        metadata.validate()
+
+    @parameterized.expand(glob("examples/**/metadata.json"))
+    def test_incremental_validation_equivalence(self, path_to_example):
+        expected = MetaData.from_json(path_to_example)
+        expected.validate()
+
+        metadata = MetaData()
+        metadata.set_tables(expected.data["tables"])
+        metadata.set_foreign_keys(expected.data.get("foreign_keys", []))
+        for constraint in expected.data.get("constraints", []):
+            metadata.add_constraint(constraint)
+        metadata.validate()
+        assert metadata.data["tables"] == expected.data["tables"]
+
+        # every prefix of the foreign keys applied to a single table is
+        # accepted or rejected by both validation paths
+        for table in expected.data["tables"]:
+            partial = MetaData()
+            partial.add_table(table)
+            for foreign_key in expected.data.get("foreign_keys", []):
+                previous = list(partial.data["foreign_keys"])
+                try:
+                    partial.add_foreign_key(foreign_key)
+                    incremental = True
+                except AssertionError:
+                    incremental = False
+
+                full = MetaData()
+                full.data["tables"] = [table]
+                full.data["foreign_keys"] = previous + [foreign_key]
+                try:
+                    full.validate()
+                    complete = True
+                except AssertionError:
+                    complete = False
+
+                assert incremental == complete
+
+    def test_batch(self):
+        metadata = MetaData()
+        with metadata.batch():
+            metadata.add_table({"id": "users", "name": "users", "fields": []})
+            metadata.add_field("users", {"name": "user_id", "data_type": "id"})
+            metadata.add_table({
+                "id": "sessions",
+                "name": "sessions",
+                "fields": [{"name": "user_id", "data_type": "id"}]
+            })
+            # checks are deferred until the end of the block
+            metadata.add_foreign_key({
+                "table": "sessions",
+                "field": "user_id",
+                "ref_table": "users",
+                "ref_field": "user_id"
+            })
+        assert metadata.get_table_names() == ["users", "sessions"]
+        assert len(metadata.get_foreign_keys("users")) == 1
+
+    def test_batch_rollback(self):
+        metadata = MetaData()
+        metadata.add_table({"id": "users", "name": "users", "fields": [{"name": "user_id"}]})
+        expected = metadata.to_json()
+
+        with self.assertRaises(AssertionError):
+            with metadata.batch():
+                metadata.add_table({"id": "sessions", "name": "sessions", "fields": []})
+                metadata.add_field("users", {"name": "name"})
+                metadata.add_foreign_key({
+                    "table": "sessions",
+                    "field": "user_id",
+                    "ref_table": "users",
+                    "ref_field": "user_id"
+                })
+
+        assert metadata.to_json() == expected
+        metadata.add_table({"id": "sessions", "name": "sessions", "fields": []})
+
+    @parameterized.expand(glob("examples/**/metadata.json"))
+    def test_lookups(self, path_to_example):
+        metadata = MetaData.from_json(path_to_example)
+        expected_name = metadata.data["tables"][0]["name"]
+        for table in metadata.data["tables"]:
+            expected = [t for t in metadata.data["tables"] if t["name"] == table["name"]][0]
+            assert metadata.get_table(table["name"]) is expected
+
+            expected = []
+            for foreign_key in metadata.data["foreign_keys"]:
+                if foreign_key["table"] == table["id"]:
+                    expected.append(foreign_key)
+                if foreign_key["ref_table"] == table["id"]:
+                    expected.append(foreign_key)
+            assert metadata.get_foreign_keys(table["id"]) == expected
+
+        assert metadata.get_table("missing") is None
+        assert metadata.get_foreign_keys("missing") == []
+
+        # the changes made to the data in place are found too
+        table = {"id": "added", "name": "added", "fields": [{"name": "id"}]}
+        metadata.data["tables"].append(table)
+        assert metadata.get_table("added") is table
+        metadata.data["foreign_keys"].append(
+            {"table": "added", "field": "id", "ref_table": "added", "ref_field": "id"})
+        assert len(metadata.get_foreign_keys("added")) == 2
+        table["name"] = "renamed"
+        assert metadata.get_table("renamed") is table
+        metadata.data["tables"] = [table]
+        assert metadata.get_table(expected_name) is None
+
+    def test_views(self):
+        metadata = MetaData.from_json("examples/hello_world/metadata.json")
+
+        tables = metadata.get_tables(view=True)
+        assert tables == metadata.get_tables()
+        with self.assertRaises(TypeError):
+            tables[0]["name"] = "renamed"
+        with self.assertRaises(AttributeError):
+            tables[0]["fields"].append({"name": "extra"})
+
+        # views share the underlying data and deepcopy returns plain objects
+        table = copy.deepcopy(tables[0])
+        table["id"] = table["name"] = "copy"
+        metadata.add_table(table)
+        assert len(tables) == len(metadata.data["tables"])
+        assert isinstance(copy.deepcopy(tables[0]), dict)
+
+        assert metadata.get_table_names(view=True) == tuple(metadata.get_table_names())
+        assert metadata.get_foreign_keys("users", view=True) == \
+            metadata.get_foreign_keys("users")
+
+    def test_graph(self):
+        metadata = MetaData()
+        for name in ["lines", "orders", "users", "products"]:
+            metadata.add_table({"id": name, "name": name, "fields": [
+                {"name": "id"}, {"name": "parent_id"}, {"name": "order_id"}, {"name": "line"}]})
+
+        def add_foreign_key(table, ref_table, field="id", ref_field="id"):
+            metadata.add_foreign_key({"table": table, "field": field,
+                                      "ref_table": ref_table, "ref_field": ref_field})
+
+        add_foreign_key("orders", "users")
+        add_foreign_key("lines", "orders", ["order_id", "line"], ["id", "line"])
+        add_foreign_key("lines", "products")
+        graph = metadata.get_graph()
+        assert graph.topological_order() == ["users", "orders", "products", "lines"]
+        assert graph.ancestors("lines") == {"orders", "users", "products"}
+        assert graph.descendants("users") == {"orders", "lines"}
+        assert graph.neighbors("lines") == ["orders", "products"]
+        assert graph.cycles() == []
+
+        path = graph.join_path("users", "products")
+        assert [(step[0], step[1]) for step in path] == [
+            ("users", "orders"), ("orders", "lines"), ("lines", "products")]
+        assert path[1][2]["field"] == ["order_id", "line"]
+        assert graph.join_path("users", "users") == []
+
+        # the graph and its cached answers follow the changes of the metadata
+        metadata.add_table({"id": "logs", "name": "logs", "fields": [{"name": "id"}]})
+        assert graph.join_path("users", "logs") is None
+        add_foreign_key("users", "lines")
+        add_foreign_key("products", "products", "parent_id")
+        assert graph.cycles() == [["products"], ["lines", "orders", "users"]]
+        assert graph.topological_order() == ["products", "lines", "orders", "users", "logs"]
+        assert "users" in graph.ancestors("users")
+        assert len(graph.join_path("users", "products")) == 2
+
+        metadata.data = copy.deepcopy(metadata.data)
+        assert metadata.get_graph() is not graph
+        assert metadata.get_graph().cycles() == graph.cycles()
+
+    @parameterized.expand(glob("examples/**/metadata.json"))
+    def test_model(self, path_to_example):
+        metadata = MetaData.from_json(path_to_example)
+        dataset = metadata.to_model()
+        assert dataset.tables[0].fields[0].name == metadata.data["tables"][0]["fields"][0]["name"]
+        assert MetaData.from_model(dataset).to_json() == metadata.to_json()
+
+    def test_model_extra_keys(self):
+        table = Table.from_dict({
+            "name": "users",
+            "fields": [{"data_type": "id", "name": "user_id", "custom": {"a": [1, 2]}}],
+            "id": "users",
+            "tags": ["a", "b"],
+        })
+        assert table.primary_key is None
+        assert table.fields[0].data_type == "id"
+        assert list(table.to_dict()) == ["name", "fields", "id", "tags"]
+        assert table.to_dict()["fields"][0] == {
+            "data_type": "id", "name": "user_id", "custom": {"a": [1, 2]}}
+
+    def test_validation_error_path(self):
+        metadata = MetaData.from_json("examples/hello_world/metadata.json")
+        metadata.data["foreign_keys"][1]["ref_field"] = ["firstname", "middlename"]
+        with self.assertRaisesRegex(AssertionError, r"^data\.foreign_keys\[1\]: "):
+            metadata.validate()
+
+    def test_validator_cache(self):
+        with tempfile.TemporaryDirectory() as cache_directory:
+            with patch.dict(os.environ, {"METAD_CACHE_DIR": cache_directory}), \
+                    patch.dict(schema._validators, clear=True):
+                validate_table = schema.get_validator("table")
+                assert os.listdir(cache_directory)
+
+            with patch.dict(os.environ, {"METAD_CACHE_DIR": cache_directory}), \
+                    patch.dict(schema._validators, clear=True):
+                cached_validate_table = schema.get_validator("table")
+
+        for validator in (validate_table, cached_validate_table):
+            validator({"id": "users", "fields": []})
+            with self.assertRaises(JsonSchemaException):
+                validator({"id": "users"})
+
+    def test_from_json_cache(self):
+        path_to_example = glob("examples/*/metadata.json")[0]
+        expected = MetaData.from_json(path_to_example)
+        with tempfile.TemporaryDirectory() as path_to_output:
+            path_to_json = os.path.join(path_to_output, "metadata.json")
+            expected.to_json(path_to_json)
+
+            metadata = MetaData.from_json(path_to_json, cache=True)
+            assert os.path.exists(path_to_json + ".cache")
+            assert metadata.data == expected.data
+
+            with patch("metad.jsonio.loads") as loads:
+                metadata = MetaData.from_json(path_to_json, cache=True)
+                assert not loads.called
+            assert metadata.data == expected.data
+            assert metadata.get_table(expected.get_table_names()[0])
+
+            # the sidecars which can't be unpickled are ignored
+            for content in (b"\x80\x09", b"cmissing_module\nThing\n.", b"\x80\x04}"):
+                with open(path_to_json + ".cache", "wb") as fout:
+                    fout.write(content)
+                assert MetaData.from_json(path_to_json, cache=True).data == expected.data
+
+            expected.data["tables"].append({"id": "extra", "name": "extra", "fields": []})
+            expected.to_json(path_to_json)
+            assert MetaData.from_json(path_to_json, cache=True).data == expected.data
+
+            expected.data["tables"][0]["id"] = expected.data["tables"][-1]["id"]
+            expected.to_json(path_to_json)
+            with self.assertRaises(AssertionError):
+                MetaData.from_json(path_to_json, cache=True)
+
+    def test_count_rows(self):
+        # the tables without a path are read from <name>.csv
+        metadata = MetaData.from_json("examples/nba/metadata.json")
+        expected = {
+            name: len(pd.read_csv("examples/nba/%s.csv" % name))
+            for name in metadata.get_table_names()
+        }
+        assert metadata.count_rows("examples/nba") == expected
+        assert metadata.get_table("Team")["number_of_rows"] == expected["Team"]
+
+    def test_get_loader(self):
+        # the tables without a path are read from <name>.csv
+        metadata = MetaData.from_json("examples/nba/metadata.json")
+        team = metadata.get_loader("examples/nba").load("Team")
+        assert team.columns.tolist() == pd.read_csv("examples/nba/Team.csv").columns.tolist()
+        assert len(team) == 30
+
+    def test_validate_data(self):
+        # the tables without a path are read from <name>.csv
+        metadata = MetaData.from_json("examples/pyrimidine/metadata.json")
+        assert metadata.validate_data("examples/pyrimidine", chunk_size=10, max_workers=2) == []
+        molecule = metadata.get_table("molecule")
+        molecule["primary_key"] = "activity"
+        assert metadata.validate_data("examples/pyrimidine")[0]["check"] == "duplicate_keys"
+        molecule["name"] = "unknown"
+        with self.assertRaises(OSError):
+            metadata.validate_data("examples/pyrimidine")
+
+        metadata = MetaData()
+        metadata.data = {
+            "tables": [
+                {"id": "users", "name": "users", "path": "users.csv", "primary_key": "id",
+                 "fields": [{"name": "id"}]},
+                {"id": "orders", "name": "orders", "path": "orders.csv", "primary_key": "id",
+                 "fields": [{"name": "id"}, {"name": "user_id"}]},
+                {"id": "lines", "name": "lines", "path": "lines.csv",
+                 "primary_key": ["order_id", "line"],
+                 "fields": [{"name": "order_id"}, {"name": "line"}]},
+                {"id": "returns", "name": "returns", "path": "returns.csv", "headers": False,
+                 "fields": [{"name": "order_id"}, {"name": "line"}]},
+            ],
+            "foreign_keys": [
+                {"table": "orders", "field": "user_id", "ref_table": "users", "ref_field": "id"},
+                {"table": "lines", "field": "order_id", "ref_table": "orders", "ref_field": "id"},
+                {"table": "returns", "field": ["order_id", "line"], "ref_table": "lines",
+                 "ref_field": ["order_id", "line"]},
+            ],
+            "constraints": [],
+        }
+        files = {
+            "users.csv": "id\n1\n2\n3\n",
+            # user_id is written as a float because of the missing value
+            "orders.csv": "id,user_id\n10,1.0\n11,\n12,4.0\n12,2.0\n,3.0\n",
+            "lines.csv": "order_id,line\n10,1\n10,2\n11,1\n13,1\n",
+            "returns.csv": "10,2\n11,2\n",
+        }
+        with tempfile.TemporaryDirectory() as path_to_dataset:
+            for name, content in files.items():
+                with open(os.path.join(path_to_dataset, name), "wt") as fout:
+                    fout.write(content)
+            problems = metadata.validate_data(path_to_dataset, chunk_size=2)
+
+        problems = {(problem["table"], problem["check"]): problem for problem in problems}
+        assert sorted(problems) == [
+            ("lines", "orphans"), ("orders", "duplicate_keys"), ("orders", "null_keys"),
+            ("orders", "orphans"), ("returns", "orphans")]
+        assert problems[("orders", "orphans")]["examples"] == ["4.0"]
+        assert problems[("orders", "duplicate_keys")]["rows"] == 1
+        assert problems[("lines", "orphans")]["ref_table"] == "orders"
+        assert problems[("returns", "orphans")]["examples"] == [["11", "2"]]
+
+    def test_cli_usage(self):
+        from docopt import docopt
+
+        from metad import __main__
+
+        args = docopt(__main__.__doc__, [
+            "mysql", "--host=localhost", "--port=3306", "--user=root", "--password=",
+            "--database=shop", "--max-workers=4", "--partition-rows=1000"])
+        assert args["--max-workers"] == "4"
+        assert args["--partition-rows"] == "1000"
+
+    @parameterized.expand([("1", ), ("2", )])
+    def test_cli_validate(self, processes):
+        from metad import __main__
+
+        with tempfile.TemporaryDirectory() as path_to_output:
+            path_to_invalid = os.path.join(path_to_output, "metadata.json")
+            with open(path_to_invalid, "wt") as fout:
+                json.dump({"tables": [{"name": "users"}]}, fout)
+
+            path_to_valid = "examples/hello_world/metadata.json"
+            argv = ["metad", "validate", "--processes=%s" % processes,
+                    path_to_valid, path_to_invalid]
+            stdout = io.StringIO()
+            with patch("sys.argv", argv), contextlib.redirect_stdout(stdout):
+                with self.assertRaises(SystemExit) as context:
+                    __main__.main()
+
+        assert context.exception.code == 1
+        lines = stdout.getvalue().splitlines()
+        assert len(lines) == 3
+        assert "PASS %s" % path_to_valid in lines
+        assert [line for line in lines if line.startswith("FAIL %s: " % path_to_invalid)]
+        assert lines[-1] == "2 files validated, 1 failed."
+
+        stdout = io.StringIO()
+        with patch("sys.argv", argv[:-1]), contextlib.redirect_stdout(stdout):
+            __main__.main()
+        assert stdout.getvalue().splitlines() == [
+            "PASS %s" % path_to_valid, "1 files validated, 0 failed."]
+
+    @parameterized.expand([(backend, ) for backend in jsonio.BACKENDS])
+    def test_json_backends(self, backend):
+        try:
+            jsonio.set_backend(backend)
+        except ImportError:
+            self.skipTest("%s is not installed" % backend)
+
+        data = {
+            "tables": [{"name": "caf\u00e9\x7f", "fields": [], "number_of_rows": 2 ** 70}],
+            "values": [1e16, 1e-05, 0.0001, 1.5, -0.0, 2 ** 63, None, True, {}, []],
+            "nan": float("nan"),
+        }
+        try:
+            for value in (data, {"values": data["values"][:-4]}, {"nested": [[{"a": 1}]]}):
+                assert jsonio.dumps(value) == json.dumps(value, indent=2)
+                compact = jsonio.dumps(value, compact=True)
+                assert "\n" not in compact
+                loaded, expected = jsonio.loads(compact.encode("utf-8")), jsonio.loads(compact)
+                # NaN is not equal to itself, so it is compared apart
+                if "nan" in expected:
+                    assert math.isnan(loaded.pop("nan")) and math.isnan(expected.pop("nan"))
+                assert loaded == expected
+
+            loaded = jsonio.loads(json.dumps(data))
+            assert math.isnan(loaded.pop("nan"))
+            assert loaded == {key: value for key, value in data.items() if key != "nan"}
+
+            for path_to_example in glob("examples/*/metadata.json"):
+                metadata = MetaData.from_json(path_to_example)
+                with tempfile.TemporaryDirectory() as path_to_output:
+                    path_to_json = os.path.join(path_to_output, "metadata.json")
+                    content = metadata.to_json(path_to_json)
+                    with open(path_to_json, "rt") as fp:
+                        assert fp.read() == content == json.dumps(metadata.data, indent=2)
+                    compact = metadata.to_json(path_to_json, compact=True)
+                    assert MetaData.from_json(path_to_json).data == metadata.data
+                    assert len(compact) < len(content)
+        finally:
+            jsonio.set_backend()